@@ -1,14 +1,28 @@
 import os
+import json
+import time
+import asyncio
+import importlib.util
+import hashlib
 import requests
-from typing import Optional
+import httpx
+from typing import Optional, List, Tuple, Dict, Any, AsyncIterator
+import difflib
 import dotenv
 from fastapi import HTTPException
 from enum import Enum
 import re
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.helpers.review_cache import git_blob_sha, get_cached_review, store_review
+from app.helpers.diff_utils import build_hunk_excerpt
+from app.helpers.llm_router import llm_router, local_codellama_backend
+from app.helpers.llm_resilience import llm_call_policy, LLMDeadlineExceeded, LLM_CALL_DEADLINE_SECONDS
+from app.helpers.prompt_budget import estimate_tokens, get_token_budget, split_code_into_chunks, split_hunk_excerpt
+
 dotenv.load_dotenv(override=True)
 
 import urllib3
@@ -16,31 +30,51 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 API_KEY=os.getenv("API_KEY")
 API_HEADER=os.getenv("API_HEADER")
-class LLM:
-    def __init__(self):
-        self.api_header=API_HEADER
-        self.api_key = API_KEY
-        if not self.api_key:
-            raise ValueError("MODEL_API_KEY is missing. Please ensure it's set.")
-
-        self.api_url = f"{self.api_header}{self.api_key}"
-        self.headers = {
-            "Content-Type": "application/json",
-        }
-
-    def _build_prompt(self, code_snippet: str, original_code: Optional[str] = None) -> str:
-        code_section_header = ""
-        code_content_for_prompt = ""
 
-        if original_code:
-            code_section_header = "### Code Analysis (Original vs. Changed):"
-            code_content_for_prompt = f"### Original Code:\n```\n{original_code}\n```\n\n### Changed Code / New Code:\n```\n{code_snippet}\n```"
-        else:
-            code_section_header = "### Code or Query:"
-            code_content_for_prompt = f"```\n{code_snippet}\n```"
-
-
-        prompt = f"""### If the provided input below is a greeting (e.g., "Hello", "Hi Assistant"), respond with an appropriate greeting. Otherwise, skip pleasantries and proceed directly to a structured code review.
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", 5))
+LLM_READ_TIMEOUT_SECONDS = float(os.getenv("LLM_READ_TIMEOUT_SECONDS", 120))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 10))
+LLM_VERIFY_SSL = os.getenv("LLM_VERIFY_SSL", "false").lower() == "true"
+
+REVIEW_DIFF_CONTEXT_LINES = int(os.getenv("REVIEW_DIFF_CONTEXT_LINES", 10))
+REVIEW_DIFF_ENCLOSING_SCOPE = os.getenv("REVIEW_DIFF_ENCLOSING_SCOPE", "true").lower() == "true"
+LLM_CHUNK_CONCURRENCY = max(1, int(os.getenv("LLM_CHUNK_CONCURRENCY", 4)))
+# Small files are reviewed several per LLM call: files up to REVIEW_BATCH_FILE_MAX_TOKENS are grouped
+# until a group reaches REVIEW_BATCH_MAX_TOKENS of code or REVIEW_BATCH_MAX_FILES files.
+REVIEW_BATCH_ENABLED = os.getenv("REVIEW_BATCH_ENABLED", "true").lower() == "true"
+REVIEW_BATCH_FILE_MAX_TOKENS = int(os.getenv("REVIEW_BATCH_FILE_MAX_TOKENS", 1500))
+REVIEW_BATCH_MAX_TOKENS = int(os.getenv("REVIEW_BATCH_MAX_TOKENS", 6000))
+REVIEW_BATCH_MAX_FILES = max(2, int(os.getenv("REVIEW_BATCH_MAX_FILES", 8)))
+
+_llm_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_llm_http_client() -> httpx.AsyncClient:
+    """Returns the process-wide keep-alive client used for every LLM call (HTTP/2 when h2 is installed)."""
+    global _llm_http_client
+    if _llm_http_client is None or _llm_http_client.is_closed:
+        _llm_http_client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            verify=LLM_VERIFY_SSL,
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS),
+        )
+    return _llm_http_client
+
+
+async def close_llm_http_client():
+    global _llm_http_client
+    if _llm_http_client is not None:
+        await _llm_http_client.aclose()
+        _llm_http_client = None
+
+
+# Static instruction block shared by every review prompt. It comes first and the code last so that
+# identical prefixes line up across files: the remote provider's implicit prompt caching and the local
+# model's persisted prefix cache can then reuse it. No explicit provider cache is created, since the
+# prefix is well below the provider's minimum size for one.
+REVIEW_PROMPT_PREFIX = """### If the provided input below is a greeting (e.g., "Hello", "Hi Assistant"), respond with an appropriate greeting. Otherwise, skip pleasantries and proceed directly to a structured code review.
 
 ### Instructions:
 You are a professional Code Review Assistant trained on industry-standard practices. Your task is to perform a **comprehensive and formal code analysis**. Specifically:
@@ -68,20 +102,97 @@ You are a professional Code Review Assistant trained on industry-standard practi
    - Present actionable suggestions in bullet-point format or code blocks.
    - Reference specific conventions or tools where appropriate (e.g., "Use `black` for formatting").
 
-{code_section_header}
+"""
+
+REVIEW_PROMPT_BODY_TEMPLATE = """{code_section_header}
 {code_content_for_prompt}
 
 ### RESPONSE:
 """
+
+REVIEW_PROMPT_TEMPLATE = REVIEW_PROMPT_PREFIX + REVIEW_PROMPT_BODY_TEMPLATE
+
+# Several small files in one request; the answer is a JSON object mapping each file path to its review.
+BATCH_REVIEW_PROMPT_BODY_TEMPLATE = """### Batched Review:
+The {file_count} files below are reviewed together. Review each file on its own, following the instructions above.
+Respond with a single JSON object and nothing else (no code fences, no text before or after it). Each key is a file path exactly as given in a "#### File:" heading below, and each value is that file's complete review in Markdown, as a JSON string.
+
+{file_sections}
+
+### RESPONSE:
+"""
+
+BATCH_REVIEW_PROMPT_TEMPLATE = REVIEW_PROMPT_PREFIX + BATCH_REVIEW_PROMPT_BODY_TEMPLATE
+
+# Part of the review cache key: editing the template invalidates previously cached reviews.
+PROMPT_TEMPLATE_HASH = hashlib.sha256(REVIEW_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:16]
+BATCH_PROMPT_TEMPLATE_HASH = hashlib.sha256(BATCH_REVIEW_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:16]
+
+
+def _model_id_from_api_url(api_url: Optional[str]) -> str:
+    match = re.search(r"models/([^:/?]+)", api_url or "")
+    return match.group(1) if match else "default"
+
+
+LLM_MODEL_ID = os.getenv("LLM_MODEL_ID") or _model_id_from_api_url(API_HEADER)
+
+
+class LLM:
+    def __init__(self):
+        self.api_header=API_HEADER
+        self.api_key = API_KEY
+        if not self.api_key:
+            raise ValueError("MODEL_API_KEY is missing. Please ensure it's set.")
+
+        self.api_url = f"{self.api_header}{self.api_key}"
+        self.model_id = LLM_MODEL_ID
+        self.prompt_template_hash = PROMPT_TEMPLATE_HASH
+        self.headers = {
+            "Content-Type": "application/json",
+        }
+        llm_router.register_remote(self.model_id, self._get_remote_llm_response, LLM_MAX_CONNECTIONS)
+        local_codellama_backend.set_prompt_prefix(REVIEW_PROMPT_PREFIX)
+
+    def _code_section(self, code_snippet: str, original_code: Optional[str] = None, hunk_excerpt: Optional[str] = None) -> Tuple[str, str]:
+        """Returns (section header, section content) describing the code under review."""
+        code_section_header = ""
+        code_content_for_prompt = ""
+
+        if hunk_excerpt:
+            code_section_header = "### Code Analysis (Changed Hunks with Surrounding Context):"
+            code_content_for_prompt = (
+                "Only the changed regions of the file are shown, with new-file line numbers. "
+                "Lines marked `+` were added, lines marked `-` were removed and unmarked lines are unchanged context. "
+                "Focus the review on the added and removed lines.\n\n"
+                f"```diff\n{hunk_excerpt}\n```"
+            )
+        elif original_code:
+            code_section_header = "### Code Analysis (Original vs. Changed):"
+            code_content_for_prompt = f"### Original Code:\n```\n{original_code}\n```\n\n### Changed Code / New Code:\n```\n{code_snippet}\n```"
+        else:
+            code_section_header = "### Code or Query:"
+            code_content_for_prompt = f"```\n{code_snippet}\n```"
+        return code_section_header, code_content_for_prompt
+
+    def _build_prompt(self, code_snippet: str, original_code: Optional[str] = None, hunk_excerpt: Optional[str] = None) -> str:
+        code_section_header, code_content_for_prompt = self._code_section(code_snippet, original_code, hunk_excerpt)
+        prompt = REVIEW_PROMPT_TEMPLATE.format(
+            code_section_header=code_section_header,
+            code_content_for_prompt=code_content_for_prompt,
+        )
         return prompt
 
-    def _get_llm_response(self, prompt: str):
-        payload = {
+    def _remote_payload(self, prompt: str) -> dict:
+        return {
             "contents": [{"parts": [{"text": prompt}]}],
         }
 
+    async def _get_remote_llm_response(self, prompt: str) -> str:
         try:
-            response = requests.post(self.api_url, headers=self.headers, json=payload, verify=False)
+            payload = self._remote_payload(prompt)
+            response = await llm_call_policy.call(
+                lambda: get_llm_http_client().post(self.api_url, headers=self.headers, json=payload)
+            )
             response.raise_for_status()
             data = response.json()
 
@@ -116,12 +227,18 @@ You are a professional Code Review Assistant trained on industry-standard practi
             response_text = "".join(response_text_parts)
             return response_text
 
-        except requests.exceptions.HTTPError as e:
+        except httpx.HTTPStatusError as e:
             error_body = e.response.text
             print(f"Error calling LLM API (HTTPError {e.response.status_code}): {e}. Response body: {error_body}")
             raise HTTPException(status_code=e.response.status_code, detail=f"Error communicating with LLM API: {error_body}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error calling LLM API (RequestException): {e}")
+        except LLMDeadlineExceeded as e:
+            print(f"Error calling LLM API (Deadline): {e}")
+            raise HTTPException(status_code=504, detail=str(e))
+        except httpx.TimeoutException as e:
+            print(f"Error calling LLM API (Timeout): {e!r}")
+            raise HTTPException(status_code=504, detail="Timed out waiting for the LLM API.")
+        except httpx.RequestError as e:
+            print(f"Error calling LLM API (RequestError): {e!r}")
             raise HTTPException(status_code=502, detail=f"Network error communicating with LLM API: {str(e)}")
         except (KeyError, IndexError, TypeError) as e:
              data_for_error = locals().get('data', 'not available')
@@ -130,26 +247,402 @@ You are a professional Code Review Assistant trained on industry-standard practi
         except HTTPException:
              raise
         except Exception as e:
-             print(f"An unexpected error occurred in _get_llm_response: {e}")
+             print(f"An unexpected error occurred in _get_remote_llm_response: {e}")
              raise HTTPException(status_code=500, detail="An internal server error occurred.")
 
 
-    def analyze_source_file(self, changes, file_name):
+    async def _route_llm_response(self, prompt: str) -> Tuple[str, str]:
+        """Gets a review from whichever backend llm_router picks. Returns (review text, backend model id)."""
+        review_text, backend = await llm_router.generate(prompt)
+        return review_text, backend.model_id
+
+    async def _get_llm_response(self, prompt: str) -> str:
+        review_text, _ = await self._route_llm_response(prompt)
+        return review_text
+
+    def _stream_api_url(self) -> Optional[str]:
+        """The streamGenerateContent (SSE) variant of the configured generateContent URL, if it has one."""
+        if ":generateContent" not in self.api_url:
+            return None
+        stream_url = self.api_url.replace(":generateContent", ":streamGenerateContent", 1)
+        return f"{stream_url}{'&' if '?' in stream_url else '?'}alt=sse"
+
+    async def _open_llm_stream(self, stream_url: str, prompt: str) -> Tuple[httpx.Response, AsyncIterator[Tuple[str, Optional[str]]], Tuple[str, Optional[str]]]:
+        """Opens the SSE stream and waits for its first piece, within one llm_call_policy deadline.
+
+        Returns (response, remaining pieces, first piece). The response is closed again on failure.
+        """
+        client = get_llm_http_client()
+        payload = self._remote_payload(prompt)
+        deadline = time.monotonic() + LLM_CALL_DEADLINE_SECONDS
+        response = await llm_call_policy.call(
+            lambda: client.send(client.build_request("POST", stream_url, headers=self.headers, json=payload), stream=True)
+        )
+        try:
+            if response.status_code >= 400:
+                error_body = (await response.aread()).decode("utf-8", errors="replace")
+                print(f"Error calling LLM streaming API (HTTPError {response.status_code}). Response body: {error_body}")
+                raise HTTPException(status_code=response.status_code, detail=f"Error communicating with LLM API: {error_body}")
+            pieces = self._stream_pieces(response)
+            try:
+                first_piece = await asyncio.wait_for(anext(pieces, None), timeout=max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError as e_deadline:
+                raise LLMDeadlineExceeded(f"LLM stream sent nothing within {LLM_CALL_DEADLINE_SECONDS:.0f}s.") from e_deadline
+            if first_piece is None:
+                raise HTTPException(status_code=502, detail="LLM streaming API closed the stream without a response.")
+        except BaseException:
+            await response.aclose()
+            raise
+        return response, pieces, first_piece
+
+    async def _stream_pieces(self, response: httpx.Response) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """Parses the SSE body into (text, finishReason) pieces."""
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = json.loads(line[len("data:"):])
+            candidates = data.get("candidates") or []
+            if not candidates:
+                if data.get("promptFeedback", {}).get("blockReason"):
+                    raise HTTPException(status_code=400, detail=f"Content blocked due to safety reasons. Prompt Feedback: {data['promptFeedback']}")
+                continue
+            parts = (candidates[0].get("content") or {}).get("parts") or []
+            text = "".join(part.get("text") or "" for part in parts)
+            finish_reason = candidates[0].get("finishReason")
+            if finish_reason == "SAFETY":
+                raise HTTPException(status_code=400, detail="Content blocked due to safety reasons.")
+            if text or finish_reason:
+                yield text, finish_reason
+
+    async def _stream_llm_response(self, prompt: str) -> AsyncIterator[Tuple[str, str, Optional[str]]]:
+        """Yields (text, backend model id, finishReason) pieces of the review as they are generated.
+
+        Opening the stream and waiting for the first piece run under llm_call_policy. When that fails,
+        when the API URL has no streaming variant or when llm_router has the remote backend cooling
+        down, the review comes from _route_llm_response as a single piece instead. Errors after the
+        first piece are raised as HTTPException, as in _get_llm_response.
+        """
+        stream_url = self._stream_api_url()
+        remote_backend = llm_router.backends.get("remote")
+        stream_opened = False
+        if stream_url is not None and (remote_backend is None or remote_backend.is_healthy()):
+            try:
+                response, pieces, first_piece = await self._open_llm_stream(stream_url, prompt)
+                stream_opened = True
+            except HTTPException as e_stream:
+                if e_stream.status_code in (400, 413):
+                    raise
+                print(f"WARNING: LLM stream failed before its first token ({e_stream.status_code}); falling back to llm_router.")
+            except (LLMDeadlineExceeded, httpx.HTTPError, ValueError) as e_stream:
+                print(f"WARNING: LLM stream failed before its first token ({type(e_stream).__name__} - {e_stream}); falling back to llm_router.")
+        if not stream_opened:
+            review_text, backend_model_id = await self._route_llm_response(prompt)
+            # The non-streaming path validates the whole response, so a routed review counts as finished.
+            yield review_text, backend_model_id, "STOP"
+            return
+
+        try:
+            yield first_piece[0], self.model_id, first_piece[1]
+            async for text, finish_reason in pieces:
+                yield text, self.model_id, finish_reason
+        except httpx.TimeoutException as e:
+            print(f"Error calling LLM streaming API (Timeout): {e!r}")
+            raise HTTPException(status_code=504, detail="Timed out waiting for the LLM API.")
+        except httpx.RequestError as e:
+            print(f"Error calling LLM streaming API (RequestError): {e!r}")
+            raise HTTPException(status_code=502, detail=f"Network error communicating with LLM API: {str(e)}")
+        except (ValueError, AttributeError) as e:
+            print(f"Error parsing LLM streaming response: {e}")
+            raise HTTPException(status_code=500, detail="Error parsing LLM API response.")
+        finally:
+            await response.aclose()
+
+    def _code_token_budget(self) -> int:
+        """Tokens left for code in one prompt once the fixed instruction template is accounted for."""
+        return max(512, get_token_budget(self.model_id) - estimate_tokens(REVIEW_PROMPT_TEMPLATE) - 256)
+
+    def _exceeds_token_budget(self, prompt: str) -> bool:
+        return estimate_tokens(prompt) > get_token_budget(self.model_id)
+
+    async def _get_chunked_llm_response(self, file_name: str, chunk_prompts: List[Tuple[str, str]]) -> Tuple[str, bool, List[str]]:
+        """Reviews budget-sized pieces of one file concurrently and merges them into a single review.
+
+        Returns (merged review, whether every chunk was reviewed, model ids of the backends that answered).
+        """
+        total_chunks = len(chunk_prompts)
+        for chunk_index, (chunk_label, chunk_prompt) in enumerate(chunk_prompts, start=1):
+            print(f"INFO: Reviewing {file_name} in chunks: chunk {chunk_index}/{total_chunks} ({chunk_label}) ~{estimate_tokens(chunk_prompt)} prompt tokens.")
+
+        chunk_slots = asyncio.Semaphore(LLM_CHUNK_CONCURRENCY)
+
+        async def review_chunk(chunk_prompt: str) -> Tuple[str, str]:
+            async with chunk_slots:
+                return await self._route_llm_response(chunk_prompt)
+
+        chunk_reviews = await asyncio.gather(*(review_chunk(chunk_prompt) for _, chunk_prompt in chunk_prompts), return_exceptions=True)
+        if all(isinstance(chunk_review, BaseException) for chunk_review in chunk_reviews):
+            raise chunk_reviews[0]
+
+        merged_sections = []
+        backend_model_ids: List[str] = []
+        complete = True
+        for chunk_index, ((chunk_label, _), chunk_result) in enumerate(zip(chunk_prompts, chunk_reviews), start=1):
+            if isinstance(chunk_result, BaseException):
+                print(f"ERROR: Review of {file_name} chunk {chunk_index}/{total_chunks} failed: {type(chunk_result).__name__} - {chunk_result}")
+                chunk_review = "⚠️ This part of the file could not be analyzed."
+                complete = False
+            else:
+                chunk_review, backend_model_id = chunk_result
+                backend_model_ids.append(backend_model_id)
+            merged_sections.append(f"#### Part {chunk_index} of {total_chunks} ({chunk_label})\n\n{chunk_review}")
+        return "\n\n---\n\n".join(merged_sections), complete, backend_model_ids
+
+    def _is_cacheable_chunked_review(self, complete: bool, backend_model_ids: List[str]) -> bool:
+        """Partial reviews, or ones with chunks from a fallback backend, are not cached so a later run retries them."""
+        return complete and all(backend_model_id == self.model_id for backend_model_id in backend_model_ids)
+
+    def _review_cache_keys(self, new_content: str, old_content: Optional[str], new_blob_sha: Optional[str],
+                           old_blob_sha: Optional[str], prompt_variant: str,
+                           chunk_prompts: Optional[List[Tuple[str, str]]]) -> Tuple[str, Optional[str], str]:
+        new_blob_sha = new_blob_sha or git_blob_sha(new_content)
+        old_blob_sha = old_blob_sha or (git_blob_sha(old_content) if old_content else None)
+        if chunk_prompts:
+            prompt_variant = f"{prompt_variant}:chunked-{get_token_budget(self.model_id)}"
+        return new_blob_sha, old_blob_sha, f"{self.prompt_template_hash}:{prompt_variant}"
+
+    async def _get_cached_llm_response(self, prompt: str, new_content: str, old_content: Optional[str] = None,
+                                       new_blob_sha: Optional[str] = None, old_blob_sha: Optional[str] = None,
+                                       prompt_variant: str = "full", file_name: str = "",
+                                       chunk_prompts: Optional[List[Tuple[str, str]]] = None) -> str:
+        """Serves a review from the content-addressed cache, calling the LLM only on a miss.
+
+        When chunk_prompts is given the prompt was over the token budget and the chunks are reviewed instead.
+        """
+        new_blob_sha, old_blob_sha, prompt_hash = self._review_cache_keys(
+            new_content, old_content, new_blob_sha, old_blob_sha, prompt_variant, chunk_prompts
+        )
+        cached_review = await get_cached_review(new_blob_sha, old_blob_sha, prompt_hash, self.model_id)
+        if cached_review is not None:
+            return cached_review
+        if chunk_prompts:
+            review_text, complete, backend_model_ids = await self._get_chunked_llm_response(file_name, chunk_prompts)
+            if self._is_cacheable_chunked_review(complete, backend_model_ids):
+                await store_review(new_blob_sha, old_blob_sha, prompt_hash, self.model_id, review_text)
+            return review_text
+        review_text, backend_model_id = await self._route_llm_response(prompt)
+        # Reviews from a fallback backend are not cached, so a later run can get the primary model's review.
+        if backend_model_id == self.model_id:
+            await store_review(new_blob_sha, old_blob_sha, prompt_hash, self.model_id, review_text)
+        return review_text
+
+    async def stream_cached_llm_response(self, prompt: str, new_content: str, old_content: Optional[str] = None,
+                                         file_name: str = "",
+                                         chunk_prompts: Optional[List[Tuple[str, str]]] = None) -> AsyncIterator[Tuple[str, bool]]:
+        """Streaming counterpart of _get_cached_llm_response. Yields (text, from_cache) pieces.
+
+        Cache hits and over-budget (chunked) reviews arrive as one piece; otherwise the tokens are
+        forwarded as the LLM produces them. The review is cached at the end under the same rules as
+        _get_cached_llm_response (complete, and from the primary model); a streamed review also has
+        to have finished with finishReason STOP.
+        """
+        new_blob_sha, old_blob_sha, prompt_hash = self._review_cache_keys(
+            new_content, old_content, None, None, "full", chunk_prompts
+        )
+        cached_review = await get_cached_review(new_blob_sha, old_blob_sha, prompt_hash, self.model_id)
+        if cached_review is not None:
+            yield cached_review, True
+            return
+        if chunk_prompts:
+            review_text, complete, backend_model_ids = await self._get_chunked_llm_response(file_name, chunk_prompts)
+            yield review_text, False
+            cacheable = self._is_cacheable_chunked_review(complete, backend_model_ids)
+        else:
+            review_parts: List[str] = []
+            backend_model_id, finish_reason = self.model_id, None
+            async for text, backend_model_id, finish_reason in self._stream_llm_response(prompt):
+                if text:
+                    review_parts.append(text)
+                    yield text, False
+            review_text = "".join(review_parts)
+            # A stream cut short (MAX_TOKENS, RECITATION, no final reason) is shown but not cached.
+            cacheable = backend_model_id == self.model_id and finish_reason == "STOP"
+        if cacheable:
+            await store_review(new_blob_sha, old_blob_sha, prompt_hash, self.model_id, review_text)
+
+    def _hunk_chunk_prompts(self, hunk_excerpt: str) -> List[Tuple[str, str]]:
+        return [
+            (f"lines {start_line}-{end_line}", self._build_prompt(code_snippet=chunk_text, hunk_excerpt=chunk_text))
+            for start_line, end_line, chunk_text in split_hunk_excerpt(hunk_excerpt, self._code_token_budget())
+        ]
+
+    def _source_chunk_prompts(self, source: str) -> List[Tuple[str, str]]:
+        return [
+            (f"lines {start_line}-{end_line}", self._build_prompt(code_snippet=chunk_text))
+            for start_line, end_line, chunk_text in split_code_into_chunks(source, self._code_token_budget())
+        ]
+
+    def _source_prompts(self, changes: str) -> Tuple[str, Optional[List[Tuple[str, str]]]]:
         prompt = self._build_prompt(code_snippet=changes)
-        review_text = self._get_llm_response(prompt)
+        chunk_prompts = self._source_chunk_prompts(changes) if self._exceeds_token_budget(prompt) else None
+        return prompt, chunk_prompts
+
+    def _source_and_target_prompts(self, original_content: Optional[str], changes: str) -> Tuple[str, Optional[List[Tuple[str, str]]]]:
+        prompt = self._build_prompt(code_snippet=changes, original_code=original_content)
+        chunk_prompts = None
+        if self._exceeds_token_budget(prompt):
+            # Both full copies do not fit: review the computed diff hunks in budget-sized pieces instead.
+            patch = "\n".join(difflib.unified_diff(
+                (original_content or "").splitlines(), changes.splitlines(), lineterm="", n=0
+            ))
+            hunk_excerpt = build_hunk_excerpt(
+                patch, changes, context_lines=REVIEW_DIFF_CONTEXT_LINES, include_enclosing_scope=REVIEW_DIFF_ENCLOSING_SCOPE
+            ) if patch else ""
+            chunk_prompts = self._hunk_chunk_prompts(hunk_excerpt) if hunk_excerpt else self._source_chunk_prompts(changes)
+        return prompt, chunk_prompts
+
+    async def analyze_source_file(self, changes, file_name, new_blob_sha: Optional[str] = None):
+        prompt, chunk_prompts = self._source_prompts(changes)
+        review_text = await self._get_cached_llm_response(
+            prompt, changes, new_blob_sha=new_blob_sha, file_name=file_name, chunk_prompts=chunk_prompts
+        )
         return {
             "response": review_text,
             "file_name": file_name
         }
 
-    def analyze_source_and_target_file(self, original_content, changes, file_name):
-        prompt = self._build_prompt(code_snippet=changes, original_code=original_content)
-        review_text = self._get_llm_response(prompt)
+    async def analyze_source_and_target_file(self, original_content, changes, file_name,
+                                             new_blob_sha: Optional[str] = None, old_blob_sha: Optional[str] = None):
+        prompt, chunk_prompts = self._source_and_target_prompts(original_content, changes)
+        review_text = await self._get_cached_llm_response(
+            prompt, changes, original_content, new_blob_sha=new_blob_sha, old_blob_sha=old_blob_sha,
+            file_name=file_name, chunk_prompts=chunk_prompts
+        )
+        return {
+            "response": review_text,
+            "file_name": file_name
+        }
+
+    async def analyze_file_changes(self, patch: str, new_content: Optional[str], file_name: str,
+                                   new_blob_sha: Optional[str] = None):
+        """Reviews only the changed hunks of a modified file plus REVIEW_DIFF_CONTEXT_LINES of context."""
+        hunk_excerpt = build_hunk_excerpt(
+            patch, new_content, context_lines=REVIEW_DIFF_CONTEXT_LINES, include_enclosing_scope=REVIEW_DIFF_ENCLOSING_SCOPE
+        )
+        prompt = self._build_prompt(code_snippet=hunk_excerpt, hunk_excerpt=hunk_excerpt)
+        chunk_prompts = self._hunk_chunk_prompts(hunk_excerpt) if self._exceeds_token_budget(prompt) else None
+        # The patch stands in for the old blob: together with the new blob it pins down the excerpt.
+        review_text = await self._get_cached_llm_response(
+            prompt, new_content or patch, new_blob_sha=new_blob_sha, old_blob_sha=f"patch-{git_blob_sha(patch)}",
+            prompt_variant=f"hunks-{REVIEW_DIFF_CONTEXT_LINES}-{int(REVIEW_DIFF_ENCLOSING_SCOPE)}",
+            file_name=file_name, chunk_prompts=chunk_prompts
+        )
         return {
             "response": review_text,
             "file_name": file_name
         }
 
+    def batch_item(self, file_name: str, changes: str, original_content: Optional[str] = None,
+                   patch: Optional[str] = None, new_blob_sha: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Describes one file for analyze_files_batch, or None if it is too large to share a request.
+
+        The arguments select the same prompt as analyze_file_changes (patch), analyze_source_and_target_file
+        (original_content) or analyze_source_file (neither).
+        """
+        if not REVIEW_BATCH_ENABLED:
+            return None
+        old_blob_sha = None
+        prompt_variant = "full"
+        if patch:
+            hunk_excerpt = build_hunk_excerpt(
+                patch, changes, context_lines=REVIEW_DIFF_CONTEXT_LINES, include_enclosing_scope=REVIEW_DIFF_ENCLOSING_SCOPE
+            )
+            code_section = self._code_section(hunk_excerpt, hunk_excerpt=hunk_excerpt)
+            old_blob_sha = f"patch-{git_blob_sha(patch)}"
+            prompt_variant = f"hunks-{REVIEW_DIFF_CONTEXT_LINES}-{int(REVIEW_DIFF_ENCLOSING_SCOPE)}"
+        else:
+            code_section = self._code_section(changes, original_code=original_content)
+        section_tokens = estimate_tokens(code_section[0]) + estimate_tokens(code_section[1])
+        if section_tokens > REVIEW_BATCH_FILE_MAX_TOKENS:
+            return None
+        new_blob_sha, old_blob_sha, _ = self._review_cache_keys(changes, original_content, new_blob_sha, old_blob_sha, prompt_variant, None)
+        return {
+            "file_name": file_name,
+            "code_section": code_section,
+            "tokens": section_tokens,
+            "cache_keys": (new_blob_sha, old_blob_sha, f"{BATCH_PROMPT_TEMPLATE_HASH}:{prompt_variant}"),
+        }
+
+    def group_batch_items(self, items: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Packs items, in order, into groups of at least two that fit one request."""
+        max_tokens = min(REVIEW_BATCH_MAX_TOKENS, self._code_token_budget())
+        groups: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        current_tokens = 0
+        for item in items:
+            if current and (current_tokens + item["tokens"] > max_tokens or len(current) >= REVIEW_BATCH_MAX_FILES):
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(item)
+            current_tokens += item["tokens"]
+        if current:
+            groups.append(current)
+        return [group for group in groups if len(group) > 1]
+
+    def _build_batch_prompt(self, items: List[Dict[str, Any]]) -> str:
+        file_sections = "\n\n".join(
+            f"#### File: {item['file_name']}\n{item['code_section'][0]}\n{item['code_section'][1]}" for item in items
+        )
+        return BATCH_REVIEW_PROMPT_TEMPLATE.format(file_count=len(items), file_sections=file_sections)
+
+    @staticmethod
+    def _parse_batch_response(response_text: str, file_names: List[str]) -> Optional[Dict[str, str]]:
+        """Extracts {file path: review} from the model's JSON answer. None if it is not a JSON object."""
+        match = re.search(r"\{.*\}", response_text, re.DOTALL)
+        if not match:
+            return None
+        try:
+            reviews = json.loads(match.group(0))
+        except ValueError:
+            return None
+        if not isinstance(reviews, dict):
+            return None
+        return {
+            file_name: reviews[file_name].strip() for file_name in file_names
+            if isinstance(reviews.get(file_name), str) and reviews[file_name].strip()
+        }
+
+    async def analyze_files_batch(self, items: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Reviews the batch_item()s in one LLM call. Returns {file path: review}.
+
+        Files missing from the result (the answer could not be parsed or skipped them) should be
+        reviewed one by one instead. Reviews are cached per file, so a hit never enters the request.
+        """
+        cached_reviews = await asyncio.gather(*(
+            get_cached_review(*item["cache_keys"], self.model_id) for item in items
+        ))
+        reviews = {item["file_name"]: cached for item, cached in zip(items, cached_reviews) if cached is not None}
+        pending = [item for item in items if item["file_name"] not in reviews]
+        if len(pending) < 2:
+            return reviews
+
+        response_text, backend_model_id = await self._route_llm_response(self._build_batch_prompt(pending))
+        file_names = [item["file_name"] for item in pending]
+        batch_reviews = self._parse_batch_response(response_text, file_names)
+        if batch_reviews is None:
+            print(f"WARNING: Batched review of {len(pending)} files did not return a JSON object; reviewing them one by one.")
+            return reviews
+        if len(batch_reviews) < len(pending):
+            print(f"WARNING: Batched review returned {len(batch_reviews)}/{len(pending)} file reviews; the rest are reviewed one by one.")
+        for item in pending:
+            review_text = batch_reviews.get(item["file_name"])
+            if review_text is None:
+                continue
+            reviews[item["file_name"]] = review_text
+            if backend_model_id == self.model_id:
+                new_blob_sha, old_blob_sha, prompt_hash = item["cache_keys"]
+                await store_review(new_blob_sha, old_blob_sha, prompt_hash, self.model_id, review_text)
+        return reviews
+
 class Vulnerability:
     def parse_requirement_line(self, line: str) -> tuple[Optional[str], Optional[str]]:
         line = line.split('#')[0].strip()
@@ -306,16 +799,16 @@ def read_root():
 async def chat(request: ChatRequest):
     try:
         if request.file_name == "requirements.txt":
-            response_data = vuln.check_vulnerabilities(request.changes)
+            response_data = await asyncio.to_thread(vuln.check_vulnerabilities, request.changes)
             response_data["file_name"] = request.file_name
             return response_data
 
         if request.request_type == RequestTypeEnum.SOURCE_AND_TARGET:
-            response = llm.analyze_source_and_target_file(
+            response = await llm.analyze_source_and_target_file(
                 request.original_content, request.changes, request.file_name
             )
         else:
-            response = llm.analyze_source_file(
+            response = await llm.analyze_source_file(
                 request.changes, request.file_name
             )
 
@@ -327,4 +820,53 @@ async def chat(request: ChatRequest):
         print(f"Error in /mergechat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {str(e)}")
 
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/mergechat/stream")
+async def chat_stream(request: ChatRequest):
+    """Same review as /mergechat, sent as Server-Sent Events while the LLM generates it.
+
+    Events: "delta" ({"text"}) for each piece of the review, "first_token" ({"ttft_ms"}) once, then
+    "done" ({"ttft_ms", "total_ms", "cached"}) or "error" ({"detail", "status_code"}).
+    requirements.txt gets the vulnerability report as a single "result" event.
+    """
+    async def event_stream():
+        started = time.perf_counter()
+        ttft_ms: Optional[float] = None
+        cached = False
+        try:
+            if request.file_name == "requirements.txt":
+                response_data = await asyncio.to_thread(vuln.check_vulnerabilities, request.changes)
+                response_data["file_name"] = request.file_name
+                yield _sse_event("result", response_data)
+            else:
+                if request.request_type == RequestTypeEnum.SOURCE_AND_TARGET:
+                    prompt, chunk_prompts = llm._source_and_target_prompts(request.original_content, request.changes)
+                    original_content = request.original_content
+                else:
+                    prompt, chunk_prompts = llm._source_prompts(request.changes)
+                    original_content = None
+                async for text, from_cache in llm.stream_cached_llm_response(
+                    prompt, request.changes, original_content, file_name=request.file_name, chunk_prompts=chunk_prompts
+                ):
+                    if ttft_ms is None:
+                        ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                        cached = from_cache
+                        yield _sse_event("first_token", {"ttft_ms": ttft_ms})
+                    yield _sse_event("delta", {"text": text})
+            total_ms = round((time.perf_counter() - started) * 1000, 1)
+            print(f"INFO: /mergechat/stream for {request.file_name}: first token {ttft_ms} ms, total {total_ms} ms{' (cached)' if cached else ''}.")
+            yield _sse_event("done", {"ttft_ms": ttft_ms, "total_ms": total_ms, "cached": cached, "file_name": request.file_name})
+        except HTTPException as e:
+            yield _sse_event("error", {"detail": e.detail, "status_code": e.status_code})
+        except Exception as e:
+            print(f"Error in /mergechat/stream endpoint: {e}")
+            yield _sse_event("error", {"detail": f"An internal server error occurred: {str(e)}", "status_code": 500})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 app.include_router(router)
\ No newline at end of file
@@ -0,0 +1,70 @@
+from fastapi import APIRouter, HTTPException
+import redis
+
+from app.helpers.review_cache import get_review_cache_stats
+from app.helpers.webhook_payload import get_webhook_decode_stats
+from app.helpers.github_helper import get_github_helper_cache_stats
+from app.helpers.github_http import get_github_http_cache_stats
+from app.helpers.github_rate_limit import github_rate_limiter
+from app.helpers.git_mirror_cache import git_mirror_cache
+from app.helpers.llm_resilience import llm_call_policy
+from app.helpers.llm_router import llm_router, local_codellama_backend
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics APIs"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/review-cache")
+async def review_cache_metrics():
+    try:
+        return await get_review_cache_stats()
+    except redis.exceptions.RedisError as e_redis:
+        print(f"Error reading review cache metrics: {e_redis}")
+        raise HTTPException(status_code=503, detail="Review cache temporarily unavailable.")
+
+
+@router.get("/webhook-decoding")
+async def webhook_decoding_metrics():
+    return get_webhook_decode_stats()
+
+
+@router.get("/github-helpers")
+async def github_helper_cache_metrics():
+    return get_github_helper_cache_stats()
+
+
+@router.get("/github-http-cache")
+async def github_http_cache_metrics():
+    try:
+        return get_github_http_cache_stats()
+    except redis.exceptions.RedisError as e_redis:
+        print(f"Error reading GitHub HTTP cache metrics: {e_redis}")
+        raise HTTPException(status_code=503, detail="GitHub HTTP cache temporarily unavailable.")
+
+
+@router.get("/github-rate-limit")
+async def github_rate_limit_metrics():
+    return github_rate_limiter.get_stats()
+
+
+@router.get("/git-mirror-cache")
+async def git_mirror_cache_metrics():
+    return git_mirror_cache.get_stats()
+
+
+@router.get("/llm-calls")
+async def llm_call_metrics():
+    return llm_call_policy.get_stats()
+
+
+@router.get("/llm-router")
+async def llm_router_metrics():
+    return llm_router.get_stats()
+
+
+@router.get("/llm-prompt-cache")
+async def llm_prompt_cache_metrics():
+    return local_codellama_backend.get_prefix_cache_stats()
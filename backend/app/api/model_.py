@@ -1,15 +1,8 @@
 from fastapi import FastAPI, HTTPException, APIRouter
 from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
-from accelerate import dispatch_model
 
-MODEL_NAME = "codellama/CodeLlama-7b-Instruct-hf"
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, padding_side="left")
-tokenizer.pad_token = tokenizer.eos_token
+from app.helpers.llm_router import local_codellama_backend
 
-model = AutoModelForCausalLM.from_pretrained(MODEL_NAME,torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,device_map={"": "cpu"})
-dispatch_model(model, offload_to_cpu=True)
 router = APIRouter()
 # FastAPI app
 app = FastAPI()
@@ -36,15 +29,7 @@ async def review_code(input_data: CodeInput):
     ### Review:
     """
     
-    inputs = tokenizer(prompt, return_tensors="pt").to("cuda")
-    output = model.generate(
-        inputs["input_ids"],
-        max_new_tokens=1024,
-        temperature=0.7,
-        top_p=0.9,
-        do_sample=True,
-        repetition_penalty=1.2,
-        eos_token_id=tokenizer.eos_token_id
-    )
-    
-    return {"review": tokenizer.decode(output[0], skip_special_tokens=True)}
+    if not local_codellama_backend.is_available():
+        raise HTTPException(status_code=503, detail="The local model is not enabled (LOCAL_LLM_ENABLED) or failed to load.")
+    review_text = await local_codellama_backend.generate(prompt)
+    return {"review": review_text}
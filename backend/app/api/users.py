@@ -1,17 +1,23 @@
 import os
 import traceback
 import json
+import asyncio
 from app.api.webhook import BOT_GITHUB_PERMANENT_TOKEN
 import redis
+import requests
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
 from fastapi import APIRouter, Cookie, Depends, HTTPException, Request, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, ValidationError as PydanticValidationError # Import Pydantic's own ValidationError
 from github import GithubException, BadCredentialsException
 
-from app.helpers.github_helper import GitHubHelper
+from app.helpers.github_helper import GitHubHelper, GitHubRepositoryNotFound, get_github_helper, invalidate_github_helper
+from app.helpers.project_status_cache import (
+    ProjectStatusSweeper, get_cached_project_statuses, store_project_statuses, invalidate_project_status
+)
+from app.helpers.pr_counters import get_pr_counters, reconcile_pr_counters
 from app.schemas.users_schema import ProjectDetailsResponse, BotAddSchema
 
 from dotenv import load_dotenv
@@ -27,6 +33,12 @@ BOT_GITHUB_USERNAME = os.getenv("BOT_GITHUB_USERNAME")
 APP_WEBHOOK_PAYLOAD_URL = os.getenv("APP_WEBHOOK_PAYLOAD_URL")
 GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
 INTERNAL_SERVICE_TOKEN_ENV = os.getenv("INTERNAL_SERVICE_TOKEN")
+# member, repository and meta events invalidate the cached bot/webhook status of a project.
+APP_WEBHOOK_EVENTS = ["pull_request", "member", "repository", "meta"]
+# Repositories whose bot/webhook status is checked against GitHub at the same time in /projects.
+PROJECT_STATUS_CONCURRENCY = max(1, int(os.getenv("PROJECT_STATUS_CONCURRENCY", 8)))
+# GitHub listing pages streamed per /projects/stream request before the client has to ask for more.
+PROJECTS_STREAM_MAX_PAGES = max(1, int(os.getenv("PROJECTS_STREAM_MAX_PAGES", 10)))
 
 router = APIRouter(
     prefix="/users",
@@ -114,13 +126,50 @@ def store_project_data_in_redis(project_data: ProjectModel) -> bool:
         print(f"Error storing project data for {project_data.name_with_namespace} in Redis: {e}")
     return False
 
+def get_projects_data_from_redis(project_full_names: List[str]) -> Dict[str, Optional[ProjectModel]]:
+    """Reads several projects with a single HMGET. Missing or unreadable entries map to None."""
+    projects: Dict[str, Optional[ProjectModel]] = {name: None for name in project_full_names}
+    if not redis_client_projects or not project_full_names:
+        return projects
+    try:
+        for project_full_name, project_json in zip(project_full_names, redis_client_projects.hmget(PROJECT_DATA_DB_KEY, project_full_names)):
+            if not project_json:
+                continue
+            try:
+                projects[project_full_name] = ProjectModel(**json.loads(project_json))
+            except (json.JSONDecodeError, PydanticValidationError):
+                print(f"Error decoding JSON for project {project_full_name} from Redis.")
+    except redis.exceptions.RedisError as e:
+        print(f"RedisError in get_projects_data_from_redis ({len(project_full_names)} projects): {e}")
+    return projects
+
+def store_projects_data_in_redis(projects_data: List[ProjectModel]) -> bool:
+    """Writes several projects with a single HSET."""
+    if not redis_client_projects:
+        print("WARNING: Redis client for projects not available in store_projects_data_in_redis.")
+        return False
+    if not projects_data:
+        return True
+    try:
+        now_iso = datetime.utcnow().isoformat()
+        mapping = {}
+        for project_data in projects_data:
+            project_data.last_updated = now_iso
+            mapping[project_data.name_with_namespace] = project_data.model_dump_json()
+        redis_client_projects.hset(PROJECT_DATA_DB_KEY, mapping=mapping)
+        return True
+    except redis.exceptions.RedisError as e:
+        print(f"RedisError storing data for {len(projects_data)} projects: {e}")
+    return False
+
 def _determine_real_status(helper: GitHubHelper, repo_full_name: str) -> ProjectStatusModel:
     bot_status = "unknown" # Default status
     webhook_status = "unknown" # Default status
     current_repo_obj = None
 
     try:
-        current_repo_obj = helper.g.get_repo(repo_full_name)
+        # lazy: the collaborator and hook calls below only need the repo URL, not its metadata.
+        current_repo_obj = helper.g.get_repo(repo_full_name, lazy=True)
     except GithubException as ge_repo:
         print(f"WARNING (_determine_real_status): Could not fetch repo object for {repo_full_name}: {ge_repo.status} {ge_repo.data.get('message', '')}")
         return ProjectStatusModel(bot_status="unknown_repo_fetch_error", webhook_status="unknown_repo_fetch_error")
@@ -159,6 +208,104 @@ def _determine_real_status(helper: GitHubHelper, repo_full_name: str) -> Project
             
     return ProjectStatusModel(bot_status=bot_status, webhook_status=webhook_status)
 
+async def _determine_real_statuses(helper: GitHubHelper, repo_full_names: List[str]) -> Dict[str, ProjectStatusModel]:
+    """Runs _determine_real_status for many repos, at most PROJECT_STATUS_CONCURRENCY at a time."""
+    status_slots = asyncio.Semaphore(PROJECT_STATUS_CONCURRENCY)
+
+    async def determine_in_slot(repo_full_name: str) -> ProjectStatusModel:
+        async with status_slots:
+            return await asyncio.to_thread(_determine_real_status, helper, repo_full_name)
+
+    statuses = await asyncio.gather(*[determine_in_slot(repo_full_name) for repo_full_name in repo_full_names])
+    return dict(zip(repo_full_names, statuses))
+
+def _is_cacheable_status(status: ProjectStatusModel) -> bool:
+    """Statuses that only reflect a failed or misconfigured check are not cached."""
+    return not any(value.startswith(("unknown", "config_missing")) for value in (status.bot_status, status.webhook_status))
+
+def _determine_cacheable_status(helper: GitHubHelper, repo_full_name: str) -> Optional[Dict[str, Any]]:
+    status = _determine_real_status(helper, repo_full_name)
+    return status.model_dump() if _is_cacheable_status(status) else None
+
+project_status_sweeper = ProjectStatusSweeper(_determine_cacheable_status)
+
+async def _resolve_project_statuses(helper: GitHubHelper, repo_full_names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Returns {"status", "stale", "checked_at"} per repo, from the status cache where possible.
+
+    Repos missing from the cache are checked live and cached; stale cache entries are served as they
+    are (marked stale) and refreshed in the background by project_status_sweeper.
+    """
+    cached_statuses = await asyncio.to_thread(get_cached_project_statuses, repo_full_names)
+    names_to_check = [name for name in repo_full_names if cached_statuses[name] is None]
+    live_statuses = await _determine_real_statuses(helper, names_to_check)
+    await asyncio.to_thread(store_project_statuses, {
+        name: status.model_dump() for name, status in live_statuses.items() if _is_cacheable_status(status)
+    })
+    project_status_sweeper.track(repo_full_names, helper)
+    if names_to_check:
+        print(f"INFO: Project status cache: {len(repo_full_names) - len(names_to_check)} hit(s), {len(names_to_check)} checked live.")
+
+    now_iso = datetime.utcnow().isoformat()
+    resolved: Dict[str, Dict[str, Any]] = {}
+    for name in repo_full_names:
+        if name in live_statuses:
+            resolved[name] = {"status": live_statuses[name], "stale": False, "checked_at": now_iso}
+        else:
+            cached_entry = cached_statuses[name]
+            resolved[name] = {
+                "status": ProjectStatusModel(**cached_entry["status"]),
+                "stale": cached_entry["stale"],
+                "checked_at": datetime.utcfromtimestamp(float(cached_entry["checked_at"])).isoformat(),
+            }
+    return resolved
+
+async def _build_project_entries(helper: GitHubHelper, github_repos_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merges GitHub repo listings with stored project data and statuses, saving what changed in one write."""
+    project_full_names = [gh_repo_data['name_with_namespace'] for gh_repo_data in github_repos_list]
+    resolved_statuses = await _resolve_project_statuses(helper, project_full_names)
+    stored_projects = await asyncio.to_thread(get_projects_data_from_redis, project_full_names)
+    
+    projects_to_return = []
+    projects_to_store: List[ProjectModel] = []
+    for gh_repo_data in github_repos_list:
+        project_full_name = gh_repo_data['name_with_namespace']
+        current_real_status = resolved_statuses[project_full_name]["status"]
+        project_data_redis = stored_projects.get(project_full_name)
+        
+        if project_data_redis:
+            if (project_data_redis.status != current_real_status or
+                project_data_redis.html_url != gh_repo_data.get('html_url') or
+                project_data_redis.description != gh_repo_data.get('description')):
+                
+                print(f"INFO: Project data for {project_full_name} changed. Updating Redis.")
+                project_data_redis.status = current_real_status
+                project_data_redis.html_url = gh_repo_data.get('html_url', project_data_redis.html_url)
+                project_data_redis.description = gh_repo_data.get('description', project_data_redis.description)
+                projects_to_store.append(project_data_redis)
+            projects_to_return.append(project_data_redis)
+        else:
+            print(f"INFO: Project {project_full_name} not found in Redis. Initializing.")
+            new_project_entry = ProjectModel(
+                id=str(gh_repo_data['id']), 
+                name_with_namespace=project_full_name,
+                html_url=gh_repo_data.get('html_url'),
+                description=gh_repo_data.get('description'),
+                status=current_real_status,
+                metrics=ProjectMetricsModel()
+            )
+            projects_to_store.append(new_project_entry)
+            projects_to_return.append(new_project_entry)
+
+    await asyncio.to_thread(store_projects_data_in_redis, projects_to_store)
+    return [
+        {
+            **project.model_dump(),
+            "status_stale": resolved_statuses[project.name_with_namespace]["stale"],
+            "status_checked_at": resolved_statuses[project.name_with_namespace]["checked_at"],
+        }
+        for project in projects_to_return
+    ]
+
 def handle_github_exception(e: GithubException):
     """Handles PyGithub's GithubException and extracts details."""
     if hasattr(e, 'status') and hasattr(e, 'data') and isinstance(e.data, dict):
@@ -179,41 +326,12 @@ async def get_github_repositories(access_token: Optional[str] = Cookie(None)):
 
     helper: Optional[GitHubHelper] = None
     try:
-        helper = GitHubHelper(user_github_token=access_token)
+        helper = await asyncio.to_thread(get_github_helper, access_token)
         user_login = helper.user.login if helper.user else "unknown_user"
         print(f"Fetching GitHub repositories for user: {user_login}") # VERIFY THIS LOG
         
-        github_repos_list = helper.get_user_repositories()
-        
-        projects_to_return = []
-        for gh_repo_data in github_repos_list:
-            project_full_name = gh_repo_data['name_with_namespace']
-            current_real_status = _determine_real_status(helper, project_full_name)
-            project_data_redis = get_project_data_from_redis(project_full_name)
-            
-            if project_data_redis:
-                if (project_data_redis.status != current_real_status or
-                    project_data_redis.html_url != gh_repo_data.get('html_url') or
-                    project_data_redis.description != gh_repo_data.get('description')):
-                    
-                    print(f"INFO: Project data for {project_full_name} changed. Updating Redis.")
-                    project_data_redis.status = current_real_status
-                    project_data_redis.html_url = gh_repo_data.get('html_url', project_data_redis.html_url)
-                    project_data_redis.description = gh_repo_data.get('description', project_data_redis.description)
-                    store_project_data_in_redis(project_data_redis)
-                projects_to_return.append(project_data_redis.model_dump())
-            else:
-                print(f"INFO: Project {project_full_name} not found in Redis. Initializing.")
-                new_project_entry = ProjectModel(
-                    id=str(gh_repo_data['id']), 
-                    name_with_namespace=project_full_name,
-                    html_url=gh_repo_data.get('html_url'),
-                    description=gh_repo_data.get('description'),
-                    status=current_real_status,
-                    metrics=ProjectMetricsModel()
-                )
-                store_project_data_in_redis(new_project_entry)
-                projects_to_return.append(new_project_entry.model_dump())
+        github_repos_list = await asyncio.to_thread(helper.get_user_repositories)
+        projects_to_return = await _build_project_entries(helper, github_repos_list)
                 
         return JSONResponse(status_code=200, content={"status": "success", "projects": projects_to_return})
 
@@ -227,6 +345,7 @@ async def get_github_repositories(access_token: Optional[str] = Cookie(None)):
             raise HTTPException(status_code=400, detail=f"Invalid request data: {str(ve_helper_init)}")
             
     except BadCredentialsException as bce: 
+        invalidate_github_helper(access_token)
         user_login_for_log = helper.user.login if helper and helper.user else "unknown_user (token issue)"
         print(f"GitHub BadCredentialsException for user {user_login_for_log} in /projects: {bce.status} {bce.data.get('message','')}")
         raise HTTPException(status_code=401, detail="Invalid or expired GitHub token. Please reconnect GitHub.")
@@ -244,6 +363,75 @@ async def get_github_repositories(access_token: Optional[str] = Cookie(None)):
         raise HTTPException(status_code=500, detail=f"An unexpected server error occurred: {str(e)}")
 
 
+def _ndjson_line(message: Dict[str, Any]) -> bytes:
+    return (json.dumps(message) + "\n").encode("utf-8")
+
+@router.post('/projects/stream')
+async def stream_github_repositories(cursor: int = 1, max_pages: int = PROJECTS_STREAM_MAX_PAGES, access_token: Optional[str] = Cookie(None)):
+    """Streams the user's projects as NDJSON, one line per GitHub listing page.
+
+    Lines are {"type": "page", "page", "projects", "next_cursor"} followed by {"type": "end", "next_cursor"}.
+    A non-null next_cursor means there are more pages; pass it back as ?cursor= to continue.
+    Errors after the stream has started are sent as a {"type": "error", "message"} line.
+    """
+    if not access_token:
+        raise HTTPException(
+            status_code=401,
+            detail="GitHub access token missing in cookies. Please login."
+        )
+    if not redis_client_projects:
+        raise HTTPException(status_code=503, detail="Project data service temporarily unavailable (Redis connection).")
+    if cursor < 1:
+        raise HTTPException(status_code=400, detail="cursor must be 1 or greater.")
+    max_pages = min(max(1, max_pages), PROJECTS_STREAM_MAX_PAGES)
+
+    # Fail before the stream starts for bad tokens and the first page, so the client still gets a proper status code.
+    helper: Optional[GitHubHelper] = None
+    try:
+        helper = await asyncio.to_thread(get_github_helper, access_token)
+        first_page = await asyncio.to_thread(helper.get_user_repositories_page, cursor)
+    except ValueError as ve_helper_init:
+        print(f"GitHubHelper initialization failed for /projects/stream: {ve_helper_init}")
+        raise HTTPException(status_code=401, detail=f"Invalid or expired GitHub token. Please reconnect GitHub. Error: {ve_helper_init}")
+    except BadCredentialsException as bce:
+        invalidate_github_helper(access_token)
+        print(f"GitHub BadCredentialsException in /projects/stream: {bce.status} {bce.data.get('message','') if isinstance(bce.data, dict) else ''}")
+        raise HTTPException(status_code=401, detail="Invalid or expired GitHub token. Please reconnect GitHub.")
+    except GithubException as ge:
+        status_code, error_detail = handle_github_exception(ge)
+        print(f"GitHubException in /projects/stream: {status_code} {error_detail}")
+        raise HTTPException(status_code=status_code, detail=error_detail)
+    except requests.exceptions.RequestException as e_req:
+        print(f"Network error while fetching the first project page in /projects/stream: {e_req!r}")
+        raise HTTPException(status_code=502, detail="Could not reach GitHub to list repositories. Please try again.")
+
+    user_login = helper.user.login if helper.user else "unknown_user"
+    print(f"Streaming GitHub repositories for user: {user_login} from page {cursor} (up to {max_pages} page(s))")
+
+    async def page_stream():
+        page = cursor
+        github_repos_list, has_more = first_page
+        next_cursor: Optional[int] = None
+        try:
+            for pages_sent in range(1, max_pages + 1):
+                projects = await _build_project_entries(helper, github_repos_list)
+                next_cursor = page + 1 if has_more else None
+                yield _ndjson_line({"type": "page", "page": page, "projects": projects, "next_cursor": next_cursor})
+                if not has_more or pages_sent == max_pages:
+                    break
+                page += 1
+                github_repos_list, has_more = await asyncio.to_thread(helper.get_user_repositories_page, page)
+            yield _ndjson_line({"type": "end", "next_cursor": next_cursor})
+        except BadCredentialsException:
+            invalidate_github_helper(access_token)
+            yield _ndjson_line({"type": "error", "message": "Invalid or expired GitHub token. Please reconnect GitHub."})
+        except Exception as e:
+            print(f"Unexpected error for user {user_login} in /projects/stream (page {page}): {type(e).__name__} - {str(e)}")
+            traceback.print_exc()
+            yield _ndjson_line({"type": "error", "message": f"An unexpected server error occurred: {str(e)}", "next_cursor": page})
+
+    return StreamingResponse(page_stream(), media_type="application/x-ndjson", headers={"Cache-Control": "no-store"})
+
 @router.get('/projects/{owner}/{repo_name}/details', response_model=ProjectDetailsResponse)
 async def get_project_details_endpoint(
     owner: str,
@@ -258,29 +446,31 @@ async def get_project_details_endpoint(
     project_full_name = f"{owner}/{repo_name}"
     helper: Optional[GitHubHelper] = None
     try:
-        helper = GitHubHelper(user_github_token=access_token)
+        helper = await asyncio.to_thread(get_github_helper, access_token)
         user_login = helper.user.login if helper.user else "unknown_user"
         # **** CHECK THIS LOG IN YOUR SERVER OUTPUT ****
         print(f"LATEST CODE CHECKPOINT 1: Fetching details for {project_full_name} for user {user_login}.")
+
+        # Cached counters and metrics are shared by all users, so check this user can see the repo first (404 otherwise).
+        repo_obj = await asyncio.to_thread(helper.g.get_repo, project_full_name)
+
+        pr_counts = await asyncio.to_thread(get_pr_counters, project_full_name)
+        if pr_counts is None:
+            print(f"INFO: No PR counters for {project_full_name} yet. Reading live totals once.")
+            pr_counts = await asyncio.to_thread(reconcile_pr_counters, helper, project_full_name)
         
-        repo_obj = helper.g.get_repo(project_full_name)
-        
-        open_pr_count = repo_obj.get_pulls(state='open').totalCount
-        merged_pr_count = helper.g.search_issues(query=f"repo:{project_full_name} type:pr is:merged").totalCount
-        closed_unmerged_pr_count = helper.g.search_issues(query=f"repo:{project_full_name} type:pr is:closed is:unmerged").totalCount
-        
-        project_data_redis = get_project_data_from_redis(project_full_name)
+        project_data_redis = await asyncio.to_thread(get_project_data_from_redis, project_full_name)
         metrics_to_return: ProjectMetricsModel
 
         if project_data_redis:
-            project_data_redis.metrics.pull_requests_open = open_pr_count
-            project_data_redis.metrics.pull_requests_merged = merged_pr_count
-            project_data_redis.metrics.pull_requests_closed = closed_unmerged_pr_count
-            store_project_data_in_redis(project_data_redis)
+            project_data_redis.metrics.pull_requests_open = pr_counts["open"]
+            project_data_redis.metrics.pull_requests_merged = pr_counts["merged"]
+            project_data_redis.metrics.pull_requests_closed = pr_counts["closed"]
+            await asyncio.to_thread(store_project_data_in_redis, project_data_redis)
             metrics_to_return = project_data_redis.metrics
         else:
             print(f"INFO: Project {project_full_name} not in Redis during details fetch. Initializing with live metrics.")
-            project_status = _determine_real_status(helper, project_full_name)
+            project_status = await asyncio.to_thread(_determine_real_status, helper, project_full_name)
             new_project_entry = ProjectModel(
                  id=str(repo_obj.id), 
                  name_with_namespace=project_full_name,
@@ -288,14 +478,14 @@ async def get_project_details_endpoint(
                  description=repo_obj.description, 
                  status=project_status, 
                  metrics=ProjectMetricsModel( 
-                     pull_requests_open=open_pr_count,
-                     pull_requests_merged=merged_pr_count, 
-                     pull_requests_closed=closed_unmerged_pr_count,
+                     pull_requests_open=pr_counts["open"],
+                     pull_requests_merged=pr_counts["merged"], 
+                     pull_requests_closed=pr_counts["closed"],
                      files_analyzed=0,
                      pull_requests_analyzed=0
                  )
             )
-            store_project_data_in_redis(new_project_entry)
+            await asyncio.to_thread(store_project_data_in_redis, new_project_entry)
             metrics_to_return = new_project_entry.metrics
         
         print(f"LATEST CODE CHECKPOINT 2: metrics_to_return type is {type(metrics_to_return)}, value: {metrics_to_return!r}")
@@ -336,7 +526,12 @@ async def get_project_details_endpoint(
             traceback.print_exc()
             raise HTTPException(status_code=400, detail=f"Invalid request: {str(ve_helper_init)}")
 
+    except GitHubRepositoryNotFound:
+        print(f"Project {project_full_name} not found via GraphQL for the requesting user.")
+        raise HTTPException(status_code=404, detail=f"Project {project_full_name} not found or access denied.")
+
     except BadCredentialsException as bce:
+        invalidate_github_helper(access_token)
         user_login_for_log = helper.user.login if helper and helper.user else "unknown_user"
         print(f"GitHub BadCredentialsException for user {user_login_for_log} in /details ({project_full_name}): {bce.status} {bce.data.get('message','')}")
         raise HTTPException(status_code=401, detail="Invalid or expired GitHub token.")
@@ -378,16 +573,17 @@ async def add_bot_to_github_repository_endpoint(
     user_login = "unknown_user"
 
     try:
-        helper = GitHubHelper(user_github_token=access_token)
+        helper = await asyncio.to_thread(get_github_helper, access_token)
         user_login = helper.user.login if helper.user else "unknown_user_after_init_attempt"
         print(f"User {user_login} attempting to add bot to repository: {repo_full_name_to_add}")
+        await asyncio.to_thread(invalidate_project_status, repo_full_name_to_add)
 
         if not BOT_GITHUB_USERNAME:
             print("CRITICAL_SERVER_CONFIG_ERROR: BOT_GITHUB_USERNAME is not configured.")
             raise HTTPException(status_code=500, detail="Bot integration feature is not properly configured on the server (missing bot username).")
         
-        invite_success, invite_message, invitation_id = helper.add_user_as_collaborator(
-            repo_full_name=repo_full_name_to_add, username=BOT_GITHUB_USERNAME, permission="push"
+        invite_success, invite_message, invitation_id = await asyncio.to_thread(
+            helper.add_user_as_collaborator, repo_full_name=repo_full_name_to_add, username=BOT_GITHUB_USERNAME, permission="push"
         )
         current_overall_message = invite_message
         bot_on_repo_ok = False
@@ -396,14 +592,14 @@ async def add_bot_to_github_repository_endpoint(
             if invitation_id is not None:
                 if not BOT_GITHUB_PERMANENT_TOKEN:
                     current_overall_message += " Bot invitation sent. Auto-acceptance skipped (Bot PAT not configured on server)."
-                    temp_repo_obj = helper.g.get_repo(repo_full_name_to_add)
-                    if temp_repo_obj.has_in_collaborators(BOT_GITHUB_USERNAME):
+                    temp_repo_obj = await asyncio.to_thread(helper.g.get_repo, repo_full_name_to_add)
+                    if await asyncio.to_thread(temp_repo_obj.has_in_collaborators, BOT_GITHUB_USERNAME):
                         bot_on_repo_ok = True
                         current_overall_message = f"Bot ({BOT_GITHUB_USERNAME}) is now a collaborator on {repo_full_name_to_add}."
                 else:
                     try:
-                        bot_helper = GitHubHelper(user_github_token=BOT_GITHUB_PERMANENT_TOKEN)
-                        accept_success, accept_message = bot_helper.accept_repository_invitation(invitation_id)
+                        bot_helper = await asyncio.to_thread(get_github_helper, BOT_GITHUB_PERMANENT_TOKEN)
+                        accept_success, accept_message = await asyncio.to_thread(bot_helper.accept_repository_invitation, invitation_id)
                         if accept_success:
                             bot_on_repo_ok = True
                             current_overall_message = f"Bot successfully added to {repo_full_name_to_add} (invitation auto-accepted)."
@@ -420,11 +616,12 @@ async def add_bot_to_github_repository_endpoint(
         if bot_on_repo_ok: 
             if APP_WEBHOOK_PAYLOAD_URL and GITHUB_WEBHOOK_SECRET:
                 try:
-                    wh_success, wh_msg, _ = helper.create_repository_webhook( 
+                    wh_success, wh_msg, _ = await asyncio.to_thread(
+                        helper.create_repository_webhook,
                         repo_full_name=repo_full_name_to_add, 
                         webhook_payload_url=APP_WEBHOOK_PAYLOAD_URL,
                         webhook_secret=GITHUB_WEBHOOK_SECRET, 
-                        events=["pull_request"] 
+                        events=APP_WEBHOOK_EVENTS
                     )
                     if wh_success:
                         webhook_created_successfully = True
@@ -441,13 +638,17 @@ async def add_bot_to_github_repository_endpoint(
 
         gh_repo_obj = None
         try: 
-            gh_repo_obj = helper.g.get_repo(repo_full_name_to_add)
+            gh_repo_obj = await asyncio.to_thread(helper.g.get_repo, repo_full_name_to_add)
         except GithubException as e_gh_repo:
             print(f"WARNING (/bot/add): Could not fetch GitHub repo details for {repo_full_name_to_add} after operations: {e_gh_repo.status} {e_gh_repo.data.get('message','')}")
 
-        real_status_after_ops = _determine_real_status(helper, repo_full_name_to_add) 
+        real_status_after_ops = await asyncio.to_thread(_determine_real_status, helper, repo_full_name_to_add)
+        if _is_cacheable_status(real_status_after_ops):
+            await asyncio.to_thread(store_project_statuses, {repo_full_name_to_add: real_status_after_ops.model_dump()})
+        else:
+            await asyncio.to_thread(invalidate_project_status, repo_full_name_to_add)
         
-        project_data = get_project_data_from_redis(repo_full_name_to_add)
+        project_data = await asyncio.to_thread(get_project_data_from_redis, repo_full_name_to_add)
         if not project_data:
             project_id_for_new = str(gh_repo_obj.id) if gh_repo_obj else "unknown_id_" + repo_full_name_to_add.replace("/", "_")
             project_data = ProjectModel(
@@ -464,7 +665,7 @@ async def add_bot_to_github_repository_endpoint(
                 project_data.html_url = gh_repo_obj.html_url
                 project_data.description = gh_repo_obj.description
             
-        if not store_project_data_in_redis(project_data):
+        if not await asyncio.to_thread(store_project_data_in_redis, project_data):
             current_overall_message += " (Warning: Failed to update project data in Redis)"
         
         final_http_status_code = 400 
@@ -499,6 +700,7 @@ async def add_bot_to_github_repository_endpoint(
             raise HTTPException(status_code=400, detail=f"Invalid request or configuration error: {str(ve_helper_init)}")
 
     except BadCredentialsException as bce: 
+        invalidate_github_helper(access_token)
         print(f"GitHub BadCredentialsException for user {user_login} in /bot/add (repo: {repo_full_name_to_add}): {bce.status} {bce.data.get('message','')}")
         raise HTTPException(status_code=401, detail="Invalid or expired GitHub token (user or bot). Please check credentials.")
         
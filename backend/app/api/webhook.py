@@ -5,9 +5,10 @@ import os
 from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+import redis
 
 
-from app.helpers.github_helper import GitHubHelper 
+from app.helpers.review_queue import handle_github_webhook, get_review_job
 
 load_dotenv(override=True)
 
@@ -53,26 +54,35 @@ async def verify_github_signature(request: Request):
     if not hmac.compare_digest(calculated_hmac, signature):
         raise HTTPException(status_code=401, detail="Invalid GitHub webhook signature.")
     
-    return True
+    return payload_body
 
 
 @router.post("/webhook")
-async def handle_github_webhook_event(request: Request, verified: bool = Depends(verify_github_signature)):
+async def handle_github_webhook_event(request: Request, payload_body: bytes = Depends(verify_github_signature)):
     if not BOT_GITHUB_PERMANENT_TOKEN:
-        print("Error: BOT_GITHUB_PERMANENT_TOKEN is not set. Cannot initialize GitHubHelper for webhook.")
+        print("Error: BOT_GITHUB_PERMANENT_TOKEN is not set. Cannot queue reviews for webhook.")
         return JSONResponse(status_code=500, content={"message": "Webhook processing failed due to missing bot configuration."})
 
-    
-    
-    github_helper = GitHubHelper(user_github_token=BOT_GITHUB_PERMANENT_TOKEN)
-    
     try:
-        
-        status_code, message = await github_helper.handle_github_webhook(request=request)
-        return JSONResponse(status_code=status_code, content={"message": message})
+        status_code, message, job_id = await handle_github_webhook(request=request, payload_body=payload_body)
+        content = {"message": message}
+        if job_id:
+            content["job_id"] = job_id
+        return JSONResponse(status_code=status_code, content=content)
     except Exception as e:
         print(f"Error handling GitHub webhook: {e}")
         import traceback
         traceback.print_exc()
         return JSONResponse(status_code=500, content={"message": "Internal server error handling webhook"})
 
+
+@router.get("/webhook/jobs/{job_id}")
+async def get_review_job_status(job_id: str):
+    try:
+        job_data = await get_review_job(job_id)
+    except redis.exceptions.RedisError as e_redis:
+        print(f"Error reading review job {job_id}: {e_redis}")
+        raise HTTPException(status_code=503, detail="Review queue temporarily unavailable.")
+    if not job_data:
+        raise HTTPException(status_code=404, detail="Review job not found.")
+    return job_data
@@ -0,0 +1,170 @@
+import re
+from typing import Optional, List, Dict, Any, Tuple
+
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+# Lines that open a function, method or class in the languages we usually review.
+SCOPE_START_PATTERN = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?"
+    r"(?:def|class|function|func|fn|interface|struct|impl|module|"
+    r"(?:public|private|protected|internal|static|final|abstract|override|virtual)\s+[\w<>\[\],\s]*\()"
+)
+
+
+def parse_patch_hunks(patch: str) -> List[Dict[str, Any]]:
+    """Parses a GitHub file patch (unified diff without file headers) into hunks.
+
+    Each hunk has old_start, old_count, new_start, new_count, section (the text after the second @@)
+    and lines, a list of (marker, text) tuples where marker is ' ', '+' or '-'.
+    """
+    hunks: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    for raw_line in (patch or "").splitlines():
+        header_match = HUNK_HEADER_PATTERN.match(raw_line)
+        if header_match:
+            old_start, old_count, new_start, new_count, section = header_match.groups()
+            current = {
+                "old_start": int(old_start),
+                "old_count": int(old_count) if old_count is not None else 1,
+                "new_start": int(new_start),
+                "new_count": int(new_count) if new_count is not None else 1,
+                "section": section.strip(),
+                "lines": [],
+            }
+            hunks.append(current)
+            continue
+        if current is None or raw_line.startswith("\\"):
+            continue
+        marker, text = (raw_line[0], raw_line[1:]) if raw_line else (" ", "")
+        if marker not in (" ", "+", "-"):
+            marker, text = " ", raw_line
+        current["lines"].append((marker, text))
+    return hunks
+
+
+def _changed_line_map(hunks: List[Dict[str, Any]]) -> Tuple[set, Dict[int, List[str]], List[Tuple[int, int]]]:
+    """Returns (added new-line numbers, removed lines keyed by the new line they precede, per-hunk new ranges)."""
+    added_lines = set()
+    removed_before: Dict[int, List[str]] = {}
+    hunk_ranges: List[Tuple[int, int]] = []
+    for hunk in hunks:
+        new_line = hunk["new_start"]
+        first_changed: Optional[int] = None
+        last_changed: Optional[int] = None
+        for marker, text in hunk["lines"]:
+            if marker == "+":
+                added_lines.add(new_line)
+                first_changed = new_line if first_changed is None else first_changed
+                last_changed = new_line
+                new_line += 1
+            elif marker == "-":
+                removed_before.setdefault(new_line, []).append(text)
+                first_changed = new_line if first_changed is None else first_changed
+                last_changed = max(last_changed or new_line, new_line)
+            else:
+                new_line += 1
+        if first_changed is None:
+            first_changed, last_changed = hunk["new_start"], max(hunk["new_start"], new_line - 1)
+        hunk_ranges.append((first_changed, last_changed))
+    return added_lines, removed_before, hunk_ranges
+
+
+def _enclosing_scope_start(new_lines: List[str], line_number: int, max_lookback: int) -> Optional[int]:
+    """Finds the closest line above line_number that opens a function or class at a shallower indent."""
+    if not new_lines or line_number < 1:
+        return None
+    anchor_index = min(line_number, len(new_lines)) - 1
+    anchor_text = new_lines[anchor_index]
+    anchor_indent = len(anchor_text) - len(anchor_text.lstrip())
+    for index in range(anchor_index, max(-1, anchor_index - max_lookback), -1):
+        candidate = new_lines[index]
+        if not candidate.strip():
+            continue
+        indent = len(candidate) - len(candidate.lstrip())
+        if SCOPE_START_PATTERN.match(candidate) and (indent < anchor_indent or index == anchor_index):
+            return index + 1
+    return None
+
+
+def build_hunk_excerpt(patch: str, new_content: Optional[str], context_lines: int = 10,
+                       include_enclosing_scope: bool = True, max_scope_lookback: int = 200) -> str:
+    """Renders only the changed regions of a file for the review prompt.
+
+    Every hunk is widened by context_lines lines of the new file (and, when include_enclosing_scope is
+    set, up to the start of the enclosing function or class). Overlapping regions are merged. Lines are
+    prefixed with their new line number and a '+', '-' or ' ' marker. Without new_content the raw patch
+    is returned unchanged.
+    """
+    hunks = parse_patch_hunks(patch)
+    if not hunks or new_content is None:
+        return patch or ""
+
+    new_lines = new_content.splitlines()
+    total_lines = len(new_lines)
+    added_lines, removed_before, hunk_ranges = _changed_line_map(hunks)
+
+    regions: List[List[int]] = []
+    for first_changed, last_changed in hunk_ranges:
+        start = max(1, first_changed - context_lines)
+        if include_enclosing_scope:
+            scope_start = _enclosing_scope_start(new_lines, first_changed, max_scope_lookback)
+            if scope_start is not None:
+                start = min(start, scope_start)
+        end = min(max(total_lines, 1), last_changed + context_lines)
+        if regions and start <= regions[-1][1] + 1:
+            regions[-1][1] = max(regions[-1][1], end)
+        else:
+            regions.append([start, end])
+
+    number_width = len(str(max(total_lines, 1)))
+    rendered: List[str] = []
+    for start, end in regions:
+        rendered.append(f"@@ new lines {start}-{end} @@")
+        for line_number in range(start, end + 1):
+            for removed_text in removed_before.get(line_number, []):
+                rendered.append(f"{'':>{number_width}} -{removed_text}")
+            if line_number <= total_lines:
+                marker = "+" if line_number in added_lines else " "
+                rendered.append(f"{line_number:>{number_width}} {marker}{new_lines[line_number - 1]}")
+        if end >= total_lines:
+            for removed_text in removed_before.get(total_lines + 1, []):
+                rendered.append(f"{'':>{number_width}} -{removed_text}")
+    return "\n".join(rendered)
+
+
+LINE_REFERENCE_PATTERN = re.compile(r"\blines?\s+(\d+)", re.IGNORECASE)
+
+
+def right_side_lines(patch: str) -> Tuple[List[int], set]:
+    """Returns (added new-file lines in order, every new-file line visible in the diff).
+
+    Only lines visible in the diff can carry an inline pull request review comment.
+    """
+    added: List[int] = []
+    visible = set()
+    for hunk in parse_patch_hunks(patch):
+        new_line = hunk["new_start"]
+        for marker, _ in hunk["lines"]:
+            if marker == "-":
+                continue
+            visible.add(new_line)
+            if marker == "+":
+                added.append(new_line)
+            new_line += 1
+    return added, visible
+
+
+def find_review_anchor_line(patch: str, review_text: str) -> Optional[int]:
+    """Picks the new-file line an inline review comment should be attached to.
+
+    The first line number mentioned in the review that is visible in the diff wins, then the first
+    added line, then the first visible line. Returns None when the patch has no right-side lines.
+    """
+    added, visible = right_side_lines(patch)
+    for match in LINE_REFERENCE_PATTERN.finditer(review_text or ""):
+        referenced_line = int(match.group(1))
+        if referenced_line in visible:
+            return referenced_line
+    if added:
+        return added[0]
+    return min(visible) if visible else None
@@ -0,0 +1,295 @@
+import os
+import time
+import base64
+import shutil
+import threading
+import subprocess
+from typing import Optional, Dict, Any, List, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+GIT_MIRROR_CACHE_ENABLED = os.getenv("GIT_MIRROR_CACHE_ENABLED", "false").lower() == "true"
+GIT_MIRROR_CACHE_DIR = os.getenv("GIT_MIRROR_CACHE_DIR", "/tmp/code-review-mirrors")
+# Disk quota for all mirrors together; the least recently used mirrors are deleted beyond it.
+GIT_MIRROR_CACHE_MAX_BYTES = int(os.getenv("GIT_MIRROR_CACHE_MAX_BYTES", 10 * 1024 * 1024 * 1024))
+# Where mirrors fetch from. A file path or file:// URL (e.g. "file:///srv/git/{repo_full_name}.git")
+# can be used to test against local repositories.
+GIT_MIRROR_REMOTE_URL_TEMPLATE = os.getenv("GIT_MIRROR_REMOTE_URL_TEMPLATE", "https://github.com/{repo_full_name}.git")
+GIT_MIRROR_FETCH_TIMEOUT_SECONDS = int(os.getenv("GIT_MIRROR_FETCH_TIMEOUT_SECONDS", 300))
+GIT_MIRROR_MAX_FILE_BYTES = int(os.getenv("GIT_MIRROR_MAX_FILE_BYTES", 1024 * 1024))
+
+# git diff --raw status letters -> GitHub pull request file status
+_DIFF_STATUSES = {"A": "added", "D": "removed", "M": "modified", "R": "renamed", "C": "copied", "T": "changed"}
+_DIFF_OPTIONS = ["--no-color", "--no-ext-diff", "--find-renames", "--unified=3"]
+
+
+def _scrub(text: str, secrets: Tuple[str, ...]) -> str:
+    """Masks credentials in git output before it ends up in exceptions and logs."""
+    for secret in secrets:
+        if secret:
+            text = text.replace(secret, "***")
+    return text
+
+
+class GitMirrorError(RuntimeError):
+    """Raised when a mirror cannot be updated or read. Callers fall back to the GitHub API."""
+
+
+class GitMirrorCache:
+    """On-disk cache of bare mirrors, one per repository, used to compute pull request diffs locally.
+
+    A mirror is created on the first review of a repo and afterwards only fetches the refs of the pull
+    request being reviewed, and only when its commits are not present yet. Changed files, patches and
+    contents are then read with git instead of the GitHub API. Mirrors are evicted least recently used
+    first once their total size exceeds GIT_MIRROR_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, cache_dir: str = GIT_MIRROR_CACHE_DIR, max_bytes: int = GIT_MIRROR_CACHE_MAX_BYTES,
+                 remote_url_template: str = GIT_MIRROR_REMOTE_URL_TEMPLATE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.remote_url_template = remote_url_template
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        # Guards the size bookkeeping; held while measuring mirrors, never while a repo lock is awaited.
+        self._quota_lock = threading.Lock()
+        self._sizes: Optional[Dict[str, int]] = None
+        self._size_totals: Tuple[Optional[int], Optional[int]] = (None, None)
+        self._stats = {"requests": 0, "local_hits": 0, "fetches": 0, "clones": 0, "failures": 0, "evictions": 0}
+
+    def _mirror_path(self, repo_full_name: str) -> str:
+        return os.path.join(self.cache_dir, repo_full_name.replace("/", "__") + ".git")
+
+    def _repo_lock(self, repo_full_name: str) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._locks.get(repo_full_name)
+            if lock is None:
+                lock = self._locks[repo_full_name] = threading.Lock()
+            return lock
+
+    def _bump(self, stat: str):
+        with self._locks_lock:
+            self._stats[stat] += 1
+
+    def _remote_url(self, repo_full_name: str) -> str:
+        return self.remote_url_template.format(repo_full_name=repo_full_name)
+
+    def _run_git(self, args: List[str], git_dir: Optional[str] = None, input_data: Optional[bytes] = None,
+                 timeout: int = GIT_MIRROR_FETCH_TIMEOUT_SECONDS, check: bool = True,
+                 extra_env: Optional[Dict[str, str]] = None, secrets: Tuple[str, ...] = ()) -> bytes:
+        command = ["git"] + (["--git-dir", git_dir] if git_dir else []) + args
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0", **(extra_env or {}))
+        try:
+            result = subprocess.run(command, input=input_data, capture_output=True, timeout=timeout, env=env)
+        except (OSError, subprocess.TimeoutExpired) as e_git:
+            raise GitMirrorError(_scrub(f"git {args[0]} failed: {e_git}", secrets)) from e_git
+        if check and result.returncode != 0:
+            stderr = _scrub(result.stderr.decode("utf-8", errors="replace"), secrets)
+            raise GitMirrorError(f"git {args[0]} failed ({result.returncode}): {stderr.strip()[:500]}")
+        return result.stdout
+
+    def _has_commit(self, git_dir: str, sha: str) -> bool:
+        result = subprocess.run(["git", "--git-dir", git_dir, "cat-file", "-e", f"{sha}^{{commit}}"], capture_output=True)
+        return result.returncode == 0
+
+    def _fetch(self, repo_full_name: str, git_dir: str, token: Optional[str], refspecs: List[str]):
+        auth_env: Dict[str, str] = {}
+        secrets: Tuple[str, ...] = ()
+        remote_url = self._remote_url(repo_full_name)
+        if token and remote_url.startswith("https://"):
+            # Passed through the environment so the token shows up neither in the process list nor in
+            # the mirror's config.
+            basic = base64.b64encode(f"x-access-token:{token}".encode("utf-8")).decode("ascii")
+            auth_env = {
+                "GIT_CONFIG_COUNT": "1",
+                "GIT_CONFIG_KEY_0": "http.extraHeader",
+                "GIT_CONFIG_VALUE_0": f"Authorization: Basic {basic}",
+            }
+            secrets = (token, basic)
+        self._run_git(["fetch", "--quiet", "--no-tags", "--force", remote_url] + refspecs, git_dir=git_dir,
+                      extra_env=auth_env, secrets=secrets)
+
+    def _ensure_commits(self, repo_full_name: str, token: Optional[str], pull_number: int,
+                        base_ref: str, base_sha: str, head_sha: str) -> str:
+        git_dir = self._mirror_path(repo_full_name)
+        if not os.path.isdir(git_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._run_git(["init", "--quiet", "--bare", git_dir])
+            self._bump("clones")
+            print(f"INFO: Created git mirror for {repo_full_name} at {git_dir}.")
+        if self._has_commit(git_dir, base_sha) and self._has_commit(git_dir, head_sha):
+            self._bump("local_hits")
+            return git_dir
+        started = time.time()
+        self._fetch(repo_full_name, git_dir, token, [
+            f"+refs/heads/{base_ref}:refs/heads/{base_ref}",
+            f"+refs/pull/{pull_number}/head:refs/pull/{pull_number}/head",
+        ])
+        self._bump("fetches")
+        if not (self._has_commit(git_dir, base_sha) and self._has_commit(git_dir, head_sha)):
+            raise GitMirrorError(f"Mirror of {repo_full_name} is missing {base_sha[:7]} or {head_sha[:7]} after fetching PR #{pull_number}.")
+        print(f"INFO: Fetched PR #{pull_number} refs into mirror of {repo_full_name} in {time.time() - started:.1f}s.")
+        return git_dir
+
+    def _diff_files(self, git_dir: str, merge_base: str, head_sha: str) -> List[Dict[str, Any]]:
+        raw = self._run_git(["diff", "--raw", "-z", "--no-abbrev"] + _DIFF_OPTIONS + [merge_base, head_sha], git_dir=git_dir)
+        fields = raw.decode("utf-8", errors="replace").split("\0")
+        files: List[Dict[str, Any]] = []
+        idx = 0
+        while idx < len(fields) and fields[idx].startswith(":"):
+            _, _, old_blob, new_blob, status_code = fields[idx][1:].split(" ")
+            status_letter = status_code[0]
+            if status_letter in ("R", "C"):
+                previous_filename, filename = fields[idx + 1], fields[idx + 2]
+                idx += 3
+            else:
+                previous_filename, filename = None, fields[idx + 1]
+                idx += 2
+            files.append({
+                "filename": filename,
+                "status": _DIFF_STATUSES.get(status_letter, "modified"),
+                "patch": "",
+                "sha": new_blob if status_letter != "D" else old_blob,
+                "new_content": None,
+                "old_content": None,
+                "previous_filename": previous_filename if status_letter == "R" else None,
+            })
+
+        if not files:
+            return files
+        # GitHub's patch field is the diff from the first hunk header on, without the file headers.
+        patch_text = self._run_git(["diff"] + _DIFF_OPTIONS + [merge_base, head_sha], git_dir=git_dir).decode("utf-8", errors="replace")
+        sections = patch_text.split("\ndiff --git ")
+        if len(sections) == len(files):
+            for file_data, section in zip(files, sections):
+                hunk_start = section.find("\n@@")
+                file_data["patch"] = section[hunk_start + 1:].rstrip("\n") if hunk_start != -1 else ""
+        else:
+            print(f"WARNING: Mirror diff produced {len(sections)} patch section(s) for {len(files)} file(s); patches left empty.")
+        return files
+
+    def get_pull_request_files(self, repo_full_name: str, token: Optional[str], pull_number: int,
+                               base_ref: str, base_sha: str, head_sha: str) -> List[Dict[str, Any]]:
+        """Returns the changed files of a pull request computed from the local mirror.
+
+        The dicts have the same keys as get_pull_request_files_and_diff returns (contents still None;
+        read them with read_files). The diff is taken from the merge base, as GitHub does. Raises
+        GitMirrorError when the mirror cannot provide the data.
+        """
+        self._bump("requests")
+        try:
+            with self._repo_lock(repo_full_name):
+                git_dir = self._ensure_commits(repo_full_name, token, pull_number, base_ref, base_sha, head_sha)
+                os.utime(git_dir)
+                merge_base = self._run_git(["merge-base", base_sha, head_sha], git_dir=git_dir).decode("ascii").strip()
+                files = self._diff_files(git_dir, merge_base, head_sha)
+        except GitMirrorError:
+            self._bump("failures")
+            raise
+        self._enforce_quota(repo_full_name)
+        return files
+
+    def read_files(self, repo_full_name: str, specs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[str]]:
+        """Reads (sha, path) file contents from the mirror in one `git cat-file --batch` call.
+
+        Binary files map to None; missing or oversized files are left out of the result.
+        """
+        contents: Dict[Tuple[str, str], Optional[str]] = {}
+        git_dir = self._mirror_path(repo_full_name)
+        if not specs or not os.path.isdir(git_dir):
+            return contents
+        with self._repo_lock(repo_full_name):
+            output = self._run_git(["cat-file", "--batch"], git_dir=git_dir,
+                                   input_data="".join(f"{sha}:{path}\n" for sha, path in specs).encode("utf-8"))
+        position = 0
+        for spec in specs:
+            header_end = output.index(b"\n", position)
+            header = output[position:header_end]
+            position = header_end + 1
+            if header.endswith(b" missing") or header.endswith(b" ambiguous"):
+                continue
+            header = header.split(b" ")
+            size = int(header[2])
+            data = output[position:position + size]
+            position += size + 1
+            if header[1] != b"blob" or size > GIT_MIRROR_MAX_FILE_BYTES:
+                continue
+            contents[spec] = None if b"\0" in data[:8000] else data.decode("utf-8", errors="replace")
+        return contents
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(root, filename))
+                except OSError:
+                    pass
+        return total
+
+    def _enforce_quota(self, updated_repo: str):
+        """Re-measures the mirror just used and deletes the coldest mirrors while over the quota.
+
+        Sizes are measured and eviction candidates picked under _quota_lock only; each candidate is
+        then deleted holding just its own repo lock, so other reviews are never held up by disk work.
+        """
+        updated_entry = os.path.basename(self._mirror_path(updated_repo))
+        with self._quota_lock:
+            if self._sizes is None:
+                self._sizes = {}
+                if os.path.isdir(self.cache_dir):
+                    for entry in os.listdir(self.cache_dir):
+                        if entry.endswith(".git"):
+                            self._sizes[entry] = self._dir_size(os.path.join(self.cache_dir, entry))
+            self._sizes[updated_entry] = self._dir_size(self._mirror_path(updated_repo))
+            total = sum(self._sizes.values())
+            candidates: List[Tuple[str, int]] = []
+            if total > self.max_bytes:
+                by_last_use = sorted(
+                    (entry for entry in self._sizes if entry != updated_entry),
+                    key=lambda entry: os.path.getmtime(os.path.join(self.cache_dir, entry)) if os.path.exists(os.path.join(self.cache_dir, entry)) else 0,
+                )
+                for entry in by_last_use:
+                    if total <= self.max_bytes:
+                        break
+                    size = self._sizes.pop(entry)
+                    candidates.append((entry, size))
+                    total -= size
+            self._publish_size_totals()
+
+        for entry, size in candidates:
+            lock = self._repo_lock(entry[:-len(".git")].replace("__", "/", 1))
+            if not lock.acquire(blocking=False):
+                # In use right now, so not cold after all: keep it and let a later pass reconsider.
+                with self._quota_lock:
+                    self._sizes.setdefault(entry, size)
+                    self._publish_size_totals()
+                continue
+            try:
+                shutil.rmtree(os.path.join(self.cache_dir, entry), ignore_errors=True)
+            finally:
+                lock.release()
+            self._bump("evictions")
+            print(f"INFO: Evicted git mirror {entry} ({size} bytes, quota {self.max_bytes} bytes).")
+
+    def _publish_size_totals(self):
+        """Copies mirror count and bytes for get_stats (caller holds _quota_lock)."""
+        totals = (len(self._sizes), sum(self._sizes.values()))
+        with self._locks_lock:
+            self._size_totals = totals
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._locks_lock:
+            return {
+                "enabled": GIT_MIRROR_CACHE_ENABLED,
+                "mirrors": self._size_totals[0],
+                "bytes": self._size_totals[1],
+                "max_bytes": self.max_bytes,
+                **self._stats,
+            }
+
+
+git_mirror_cache = GitMirrorCache()
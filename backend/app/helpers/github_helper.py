@@ -4,14 +4,25 @@ import urllib.parse
 import json 
 from dotenv import load_dotenv
 from github import Github, GithubException, UnknownObjectException, BadCredentialsException
-from fastapi import Request, HTTPException 
+from fastapi import HTTPException 
 import traceback
+import threading
+import asyncio
+import math
 from typing import Optional, Tuple, Dict, Any, List # Added List for type hint
+import time
+import hashlib
+import tarfile
+from collections import OrderedDict
 
 # Assuming LLM and Vulnerability are in app.api.git and correctly imported
 # Ensure these paths are correct relative to your project structure.
 from app.api.git import LLM as AdvancedLLM
 from app.api.git import Vulnerability
+from app.helpers.diff_utils import find_review_anchor_line
+from app.helpers.github_http import github_session
+from app.helpers.ignore_matcher import CODEREVIEWIGNORE_PATH, IgnoreMatcher, get_repo_ignore_matcher
+from app.helpers.git_mirror_cache import git_mirror_cache, GitMirrorError, GIT_MIRROR_CACHE_ENABLED
 
 load_dotenv(override=True) 
 
@@ -20,6 +31,100 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 API_BASE_URL_FOR_INTERNAL_CALLS = os.getenv("API_BASE_URL_FOR_INTERNAL_CALLS", "http://localhost:8000")
 INTERNAL_SERVICE_TOKEN = os.getenv("INTERNAL_SERVICE_TOKEN", "super-secret-internal-token") 
+REVIEW_FILE_CONCURRENCY = max(1, int(os.getenv("REVIEW_FILE_CONCURRENCY", 4)))
+# "hunks" reviews modified files from their patch plus context; "full" sends complete before/after files.
+REVIEW_PROMPT_MODE = os.getenv("REVIEW_PROMPT_MODE", "hunks").lower()
+# In hunks mode, modified files up to this many lines are still reviewed in full (old content is fetched).
+REVIEW_FULL_FILE_MAX_LINES = int(os.getenv("REVIEW_FULL_FILE_MAX_LINES", 200))
+# Head and base file contents are fetched in bulk through GraphQL, this many blobs per query.
+REVIEW_GRAPHQL_FETCH_ENABLED = os.getenv("REVIEW_GRAPHQL_FETCH_ENABLED", "true").lower() == "true"
+REVIEW_GRAPHQL_BATCH_SIZE = max(1, int(os.getenv("REVIEW_GRAPHQL_BATCH_SIZE", 50)))
+# PRs needing at least this many file contents at one commit read them from a single streamed tarball of
+# that commit instead of per-file GraphQL/REST lookups. 0 disables archive fetching.
+REVIEW_ARCHIVE_FETCH_MIN_FILES = int(os.getenv("REVIEW_ARCHIVE_FETCH_MIN_FILES", 150))
+# Archive members larger than this are skipped (and left to the per-file fallback).
+REVIEW_ARCHIVE_MAX_FILE_BYTES = int(os.getenv("REVIEW_ARCHIVE_MAX_FILE_BYTES", 1024 * 1024))
+GITHUB_REPOS_PAGE_SIZE = min(100, max(1, int(os.getenv("GITHUB_REPOS_PAGE_SIZE", 100))))
+
+# Findings are submitted as one pull request review with inline comments ("review"), or as one issue comment per file ("comments").
+REVIEW_PUBLISH_MODE = os.getenv("REVIEW_PUBLISH_MODE", "review").lower()
+# GitHub rejects comment and review bodies longer than 65536 characters.
+GITHUB_COMMENT_MAX_CHARS = 65000
+
+
+def _format_file_review(comment_body: str, filename: Optional[str] = None,
+                        current_file_num: Optional[int] = None, total_files_num: Optional[int] = None) -> str:
+    file_progress_header = ""
+    if filename and current_file_num is not None and total_files_num is not None:
+        if total_files_num > 0 and current_file_num > 0 and current_file_num <= total_files_num:
+            file_progress_header = f" (File {current_file_num} of {total_files_num})"
+    formatted_comment_header = f"### AI Review for `{filename}`{file_progress_header}\n\n---\n\n" if filename else ""
+    return f"{formatted_comment_header}{comment_body}"
+
+
+def _truncate_comment(body: str, max_chars: int = GITHUB_COMMENT_MAX_CHARS) -> str:
+    if len(body) <= max_chars:
+        return body
+    notice = "\n\n_(Truncated: the full review exceeded GitHub's comment size limit.)_"
+    return body[:max_chars - len(notice)] + notice
+
+
+def _split_review_body(sections: List[str], max_chars: int = GITHUB_COMMENT_MAX_CHARS) -> List[str]:
+    """Packs review sections (the summary, then one per file) into as few bodies as fit GitHub's limit.
+
+    Sections are never split across bodies; only a single section that is too long on its own is truncated.
+    """
+    part_header_room = 64
+    bodies: List[str] = []
+    current: List[str] = []
+    current_len = 0
+    for section in sections:
+        section = _truncate_comment(section, max_chars - part_header_room)
+        added_len = len(section) + (2 if current else 0)
+        if current and current_len + added_len > max_chars - part_header_room:
+            bodies.append("\n\n".join(current))
+            current, current_len = [], 0
+            added_len = len(section)
+        current.append(section)
+        current_len += added_len
+    if current:
+        bodies.append("\n\n".join(current))
+    if len(bodies) > 1:
+        bodies = [f"_(Review part {index} of {len(bodies)})_\n\n{body}" for index, body in enumerate(bodies, start=1)]
+    return bodies
+
+
+# GitHubHelper instances (authenticated user, PyGithub client) are reused per token for this long.
+GITHUB_HELPER_CACHE_TTL_SECONDS = int(os.getenv("GITHUB_HELPER_CACHE_TTL_SECONDS", 600))
+GITHUB_HELPER_CACHE_MAX_SIZE = max(1, int(os.getenv("GITHUB_HELPER_CACHE_MAX_SIZE", 128)))
+
+_shared_clients_lock = threading.Lock()
+_shared_llm: Optional[AdvancedLLM] = None
+_shared_vulnerability_scanner: Optional[Vulnerability] = None
+
+
+def _get_shared_llm() -> AdvancedLLM:
+    """The LLM client holds no per-user state, so one instance serves every helper in the process."""
+    global _shared_llm
+    with _shared_clients_lock:
+        if _shared_llm is None:
+            _shared_llm = AdvancedLLM()
+            print("INFO: Initialized the shared AdvancedLLM client.")
+        return _shared_llm
+
+
+def _get_shared_vulnerability_scanner() -> Vulnerability:
+    global _shared_vulnerability_scanner
+    with _shared_clients_lock:
+        if _shared_vulnerability_scanner is None:
+            _shared_vulnerability_scanner = Vulnerability()
+            print("INFO: Initialized the shared Vulnerability scanner.")
+        return _shared_vulnerability_scanner
+
+
+class GitHubRepositoryNotFound(RuntimeError):
+    """The repository does not exist or the token cannot see it."""
+
 
 class GitHubHelper:
     def __init__(self, user_github_token: str):
@@ -56,32 +161,19 @@ class GitHubHelper:
         self.base_api_url = "https://api.github.com"
         
         try:
-            self.llm = AdvancedLLM()
-            print(f"DEBUG: GitHubHelper successfully initialized AdvancedLLM (type: {type(self.llm)}).")
+            self.llm = _get_shared_llm()
         except Exception as e_llm_init:
             print(f"CRITICAL_ERROR: GitHubHelper failed to initialize AdvancedLLM: {e_llm_init}")
             traceback.print_exc() 
             raise RuntimeError(f"Failed to initialize AdvancedLLM in GitHubHelper: {e_llm_init}") from e_llm_init
         
         try:
-            self.vulnerability_scanner = Vulnerability()
-            print(f"DEBUG: GitHubHelper successfully initialized Vulnerability scanner (type: {type(self.vulnerability_scanner)}).")
+            self.vulnerability_scanner = _get_shared_vulnerability_scanner()
         except Exception as e_vuln_init:
             print(f"CRITICAL_ERROR: GitHubHelper failed to initialize Vulnerability scanner: {e_vuln_init}")
             traceback.print_exc()
             raise RuntimeError(f"Failed to initialize Vulnerability scanner in GitHubHelper: {e_vuln_init}") from e_vuln_init
 
-        self.ignored_file_types = [
-            ".svg", ".png", ".jpg", ".jpeg", ".gif", ".ico", 
-            "readme.md", 
-            ".lock", "package-lock.json", "poetry.lock", "yarn.lock", 
-            ".env", 
-            "*.tfvars", 
-            "*.log", 
-            "license", 
-            ".gitignore" 
-        ] 
-
         self.api_base_url_internal = API_BASE_URL_FOR_INTERNAL_CALLS
         self.internal_service_token = INTERNAL_SERVICE_TOKEN
 
@@ -150,6 +242,32 @@ class GitHubHelper:
             traceback.print_exc()
             raise
 
+    def get_user_repositories_page(self, page: int = 1, per_page: int = GITHUB_REPOS_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], bool]:
+        """Fetches one page of the user's repositories. Returns (admin repos on that page, has_more).
+
+        Pages are numbered from 1, as in GitHub's REST pagination, and filtered to repos the user
+        administers, so a page can come back empty while later pages still have results.
+        """
+        url = f"{self.base_api_url}/user/repos"
+        params = {"affiliation": "owner,collaborator,organization_member", "per_page": per_page, "page": page}
+        response = github_session.get(url, headers=self.headers, params=params, timeout=30)
+        if response.status_code == 401:
+            raise BadCredentialsException(401, response.json() if response.content else {}, dict(response.headers))
+        if response.status_code != 200:
+            raise GithubException(response.status_code, response.json() if response.content else {}, dict(response.headers))
+        repos_data = [
+            {
+                "id": str(repo["id"]),
+                "name": repo["name"],
+                "name_with_namespace": repo["full_name"],
+                "description": repo.get("description") or "",
+                "html_url": repo.get("html_url"),
+            }
+            for repo in response.json()
+            if (repo.get("permissions") or {}).get("admin")
+        ]
+        return repos_data, "next" in response.links
+
     def add_user_as_collaborator(self, repo_full_name: str, username: str, permission: str = "push") -> Tuple[bool, str, Optional[int]]:
         print(f"--- GitHubHelper: Attempting to add {username} to {repo_full_name} with permission {permission} ---")
         url = f"{self.base_api_url}/repos/{repo_full_name}/collaborators/{username}"
@@ -160,7 +278,7 @@ class GitHubHelper:
         message = ""
 
         try:
-            response = requests.put(url, headers=self.headers, json=payload, timeout=15)
+            response = github_session.put(url, headers=self.headers, json=payload, timeout=15)
             response.raise_for_status() 
 
             response_data = response.json() if response.content else {} 
@@ -220,7 +338,7 @@ class GitHubHelper:
         
         url = f"{self.base_api_url}/user/repository_invitations/{invitation_id}"
         try:
-            response = requests.patch(url, headers=self.headers, timeout=10) 
+            response = github_session.patch(url, headers=self.headers, timeout=10) 
             response.raise_for_status() 
 
             if response.status_code == 204: 
@@ -247,73 +365,246 @@ class GitHubHelper:
             traceback.print_exc()
             return False, f"Unexpected error accepting invitation {invitation_id}: {str(e_gen)}"
 
-    def get_pull_request_files_and_diff(self, repo_full_name: str, pull_number: int) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str], Optional[str]]:
+    def _fetch_blob_texts_graphql(self, repo_full_name: str, specs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[str]]:
+        """Fetches many blob texts with batched GraphQL `object(expression: "sha:path")` lookups.
+
+        specs is a list of (commit_sha, path). The result maps each resolved spec to its text, or to None
+        for binary blobs. Specs missing from the result (truncated blobs, failed batches) should be
+        fetched through the REST fallback.
+        """
+        resolved: Dict[Tuple[str, str], Optional[str]] = {}
+        if not specs or '/' not in repo_full_name:
+            return resolved
+        owner, name = repo_full_name.split('/', 1)
+        graphql_url = f"{self.base_api_url}/graphql"
+
+        for batch_start in range(0, len(specs), REVIEW_GRAPHQL_BATCH_SIZE):
+            batch = specs[batch_start:batch_start + REVIEW_GRAPHQL_BATCH_SIZE]
+            variable_defs = ", ".join(f"$e{idx}: String!" for idx in range(len(batch)))
+            selections = "\n".join(
+                f"    f{idx}: object(expression: $e{idx}) {{ ... on Blob {{ text isBinary isTruncated }} }}" for idx in range(len(batch))
+            )
+            query = f"query($owner: String!, $name: String!, {variable_defs}) {{\n  repository(owner: $owner, name: $name) {{\n{selections}\n  }}\n}}"
+            variables: Dict[str, Any] = {"owner": owner, "name": name}
+            variables.update({f"e{idx}": f"{sha}:{path}" for idx, (sha, path) in enumerate(batch)})
+
+            try:
+                response = github_session.post(graphql_url, headers=self.headers, json={"query": query, "variables": variables}, timeout=30)
+                response.raise_for_status()
+                response_data = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e_graphql:
+                print(f"WARNING: GraphQL blob fetch failed for {repo_full_name} (batch of {len(batch)}): {e_graphql}. Falling back to REST for this batch.")
+                continue
+
+            if response_data.get("errors"):
+                print(f"WARNING: GraphQL blob fetch for {repo_full_name} returned errors: {str(response_data['errors'])[:300]}")
+            repository_data = (response_data.get("data") or {}).get("repository") or {}
+            for idx, spec in enumerate(batch):
+                blob = repository_data.get(f"f{idx}")
+                if not blob or blob.get("isTruncated"):
+                    continue
+                resolved[spec] = None if blob.get("isBinary") else blob.get("text")
+        print(f"INFO: GraphQL fetched {len(resolved)}/{len(specs)} blob(s) for {repo_full_name} in {math.ceil(len(specs) / REVIEW_GRAPHQL_BATCH_SIZE)} quer(ies).")
+        return resolved
+
+    def get_pull_request_counts(self, repo_full_name: str) -> Dict[str, int]:
+        """Returns {"open", "merged", "closed"} pull request totals from one GraphQL query.
+
+        "closed" counts closed pull requests that were not merged. Unlike search_issues this does not
+        use the Search API quota. Raises GitHubRepositoryNotFound when the token cannot see the repo and
+        RuntimeError when the counts cannot be read.
+        """
+        if '/' not in repo_full_name:
+            raise RuntimeError(f"Invalid repository name '{repo_full_name}'.")
+        owner, name = repo_full_name.split('/', 1)
+        query = (
+            "query($owner: String!, $name: String!) {\n"
+            "  repository(owner: $owner, name: $name) {\n"
+            "    open: pullRequests(states: OPEN) { totalCount }\n"
+            "    merged: pullRequests(states: MERGED) { totalCount }\n"
+            "    closed: pullRequests(states: CLOSED) { totalCount }\n"
+            "  }\n"
+            "}"
+        )
+        try:
+            response = github_session.post(f"{self.base_api_url}/graphql", headers=self.headers,
+                                           json={"query": query, "variables": {"owner": owner, "name": name}}, timeout=30)
+            response.raise_for_status()
+            response_data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e_graphql:
+            raise RuntimeError(f"GraphQL pull request count query failed for {repo_full_name}: {e_graphql}") from e_graphql
+        repository_data = (response_data.get("data") or {}).get("repository")
+        if not repository_data:
+            if any(error.get("type") == "NOT_FOUND" for error in response_data.get("errors") or [] if isinstance(error, dict)):
+                raise GitHubRepositoryNotFound(f"Repository {repo_full_name} not found or not accessible.")
+            raise RuntimeError(f"GraphQL pull request count query for {repo_full_name} returned no data: {str(response_data.get('errors'))[:300]}")
+        return {state: int(repository_data[state]["totalCount"]) for state in ("open", "merged", "closed")}
+
+    def _fetch_file_content_rest(self, repo, path: str, ref: str, label: str) -> Optional[str]:
+        try:
+            content_obj = repo.get_contents(path, ref=ref)
+            if content_obj.type == 'file':
+                return content_obj.decoded_content.decode('utf-8', errors='replace')
+            print(f"INFO: Skipping {label} content fetch for non-file type '{content_obj.type}' for {path} at {ref}")
+        except UnknownObjectException:
+            print(f"WARNING: {label.capitalize()} content for {path} (ref: {ref}) not found or too large.")
+        except GithubException as e_content_gh:
+            print(f"WARNING: GitHub error getting {label} content for {path} (ref: {ref}): {e_content_gh.status} {e_content_gh.data.get('message','')}.")
+        except Exception as e_content:
+            print(f"WARNING: Error decoding {label} content for {path} (ref: {ref}): {e_content}.")
+        return None
+
+    def _fetch_blob_texts_archive(self, repo_full_name: str, sha: str, paths: List[str]) -> Dict[Tuple[str, str], Optional[str]]:
+        """Reads the given paths from one streamed tarball of the repo at sha.
+
+        The archive is read member by member straight off the response (nothing is written to disk) and
+        the download stops once every wanted path has been seen. Binary files map to None; paths not in
+        the result (missing, too large, failed download) should be fetched through the other strategies.
+        """
+        resolved: Dict[Tuple[str, str], Optional[str]] = {}
+        wanted = set(paths)
+        if not wanted:
+            return resolved
+        url = f"{self.base_api_url}/repos/{repo_full_name}/tarball/{sha}"
+        try:
+            # Redirects to codeload.github.com; stream=True also keeps the archive out of the HTTP cache.
+            with github_session.get(url, headers=self.headers, stream=True, timeout=(15, 120)) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+                    for member in archive:
+                        if not member.isfile():
+                            continue
+                        # Members are prefixed with a single "<owner>-<repo>-<short sha>/" directory.
+                        path = member.name.split("/", 1)[1] if "/" in member.name else member.name
+                        if path not in wanted:
+                            continue
+                        wanted.discard(path)
+                        if member.size <= REVIEW_ARCHIVE_MAX_FILE_BYTES:
+                            extracted = archive.extractfile(member)
+                            data = extracted.read() if extracted else b""
+                            resolved[(sha, path)] = None if b"\0" in data[:8000] else data.decode("utf-8", errors="replace")
+                        if not wanted:
+                            break
+        except (requests.exceptions.RequestException, tarfile.TarError, OSError, EOFError) as e_archive:
+            print(f"WARNING: Archive fetch failed for {repo_full_name}@{sha[:7]}: {type(e_archive).__name__} - {e_archive}. Falling back to per-file fetching.")
+        print(f"INFO: Archive fetch read {len(resolved)}/{len(paths)} file(s) for {repo_full_name}@{sha[:7]}.")
+        return resolved
+
+    def _fetch_file_contents(self, repo, repo_full_name: str, specs: List[Tuple[str, str]], label: str,
+                             from_mirror: bool = False) -> Dict[Tuple[str, str], Optional[str]]:
+        """Fetches (sha, path) file contents.
+
+        With from_mirror they are first read from the local git mirror. Commits still needing at least
+        REVIEW_ARCHIVE_FETCH_MIN_FILES files are read from one tarball; the rest go through GraphQL in
+        bulk when enabled, then per file through REST.
+        """
+        contents: Dict[Tuple[str, str], Optional[str]] = {}
+        if from_mirror:
+            try:
+                contents.update(git_mirror_cache.read_files(repo_full_name, specs))
+            except GitMirrorError as e_mirror:
+                print(f"WARNING: Reading {label} contents from the git mirror of {repo_full_name} failed: {e_mirror}")
+        if REVIEW_ARCHIVE_FETCH_MIN_FILES > 0:
+            paths_by_sha: Dict[str, List[str]] = {}
+            for sha, path in specs:
+                if (sha, path) in contents:
+                    continue
+                paths_by_sha.setdefault(sha, []).append(path)
+            for sha, paths in paths_by_sha.items():
+                if len(paths) >= REVIEW_ARCHIVE_FETCH_MIN_FILES:
+                    print(f"INFO: Fetching {len(paths)} {label} file(s) for {repo_full_name} from the archive at {sha[:7]}.")
+                    contents.update(self._fetch_blob_texts_archive(repo_full_name, sha, paths))
+        if REVIEW_GRAPHQL_FETCH_ENABLED:
+            contents.update(self._fetch_blob_texts_graphql(repo_full_name, [spec for spec in specs if spec not in contents]))
+        for sha, path in specs:
+            if (sha, path) not in contents:
+                contents[(sha, path)] = self._fetch_file_content_rest(repo, path, sha, label)
+        return contents
+
+    def _fetch_codereviewignore(self, repo_full_name: str, ref: str) -> Optional[str]:
+        """Returns the repo's .codereviewignore at ref, or None if it has none. Raises if it cannot be read."""
+        url = f"{self.base_api_url}/repos/{repo_full_name}/contents/{CODEREVIEWIGNORE_PATH}"
+        headers = dict(self.headers, Accept="application/vnd.github.raw+json")
+        response = github_session.get(url, headers=headers, params={"ref": ref}, timeout=15)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.text
+
+    def get_ignore_matcher(self, repo_full_name: str, head_sha: str) -> IgnoreMatcher:
+        """Default ignore patterns plus the repo's .codereviewignore at head_sha (cached per SHA)."""
+        return get_repo_ignore_matcher(repo_full_name, head_sha, lambda: self._fetch_codereviewignore(repo_full_name, head_sha))
+
+    def _is_ignored_file(self, ignore_matcher: IgnoreMatcher, repo_full_name: str, pull_number: int, filename: str) -> bool:
+        if not ignore_matcher.matches(filename):
+            return False
+        print(f"INFO: Skipping ignored file in PR {repo_full_name}#{pull_number}: {filename}")
+        return True
+
+    def _get_repo_and_pull(self, repo_full_name: str, pull_number: int):
+        repo = self.g.get_repo(repo_full_name)
+        return repo, repo.get_pull(pull_number)
+
+    def get_pull_request_files_and_diff(self, repo_full_name: str, pull_number: int, repo=None, pull=None) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str], Optional[str]]:
         files_changed_data: List[Dict[str, Any]] = []
         try:
-            repo = self.g.get_repo(repo_full_name)
-            pull = repo.get_pull(pull_number)
+            if repo is None or pull is None:
+                repo, pull = self._get_repo_and_pull(repo_full_name, pull_number)
             
             base_sha = pull.base.sha
             head_sha = pull.head.sha
             base_ref = pull.base.ref
             head_ref = pull.head.ref
 
-            for file_obj in pull.get_files():
-                filename_lower = file_obj.filename.lower()
-                
-                is_ignored = False
-                for ignored_pattern in self.ignored_file_types:
-                    pattern_lower = ignored_pattern.lower()
-                    if pattern_lower.startswith("*."): 
-                        if filename_lower.endswith(pattern_lower[1:]):
-                            is_ignored = True
-                            break
-                    elif filename_lower == pattern_lower or filename_lower.endswith(pattern_lower): 
-                        is_ignored = True
-                        break
-                
-                if is_ignored:
-                    print(f"INFO: Skipping ignored file in PR {repo_full_name}#{pull_number}: {file_obj.filename}")
-                    continue
+            ignore_matcher = self.get_ignore_matcher(repo_full_name, head_sha)
+            from_mirror = False
+            if GIT_MIRROR_CACHE_ENABLED:
+                try:
+                    mirror_files = git_mirror_cache.get_pull_request_files(repo_full_name, self.token, pull_number, base_ref, base_sha, head_sha)
+                    files_changed_data = [file_data for file_data in mirror_files if not self._is_ignored_file(ignore_matcher, repo_full_name, pull_number, file_data["filename"])]
+                    from_mirror = True
+                except GitMirrorError as e_mirror:
+                    print(f"WARNING: Git mirror unavailable for {repo_full_name}#{pull_number}, using the GitHub API: {e_mirror}")
+
+            if not from_mirror:
+                for file_obj in pull.get_files():
+                    if self._is_ignored_file(ignore_matcher, repo_full_name, pull_number, file_obj.filename):
+                        continue
+
+                    file_data: Dict[str, Any] = {
+                        "filename": file_obj.filename, 
+                        "status": file_obj.status, 
+                        "patch": file_obj.patch if file_obj.patch else "", 
+                        "sha": file_obj.sha, 
+                        "new_content": None, 
+                        "old_content": None,
+                        "previous_filename": file_obj.previous_filename if file_obj.status == 'renamed' else None
+                    }
+                    files_changed_data.append(file_data)
+
+            new_specs = [(head_sha, file_data["filename"]) for file_data in files_changed_data if file_data["status"] in ['added', 'modified', 'renamed']]
+            new_contents = self._fetch_file_contents(repo, repo_full_name, new_specs, "new", from_mirror)
+            for file_data in files_changed_data:
+                file_data["new_content"] = new_contents.get((head_sha, file_data["filename"]))
+
+            old_specs: List[Tuple[str, str]] = []
+            for file_data in files_changed_data:
+                needs_old_content = file_data["status"] in ['modified', 'renamed']
+                if needs_old_content and REVIEW_PROMPT_MODE == "hunks" and file_data["patch"]:
+                    new_content_lines = file_data["new_content"].count("\n") + 1 if file_data["new_content"] is not None else None
+                    needs_old_content = new_content_lines is not None and new_content_lines <= REVIEW_FULL_FILE_MAX_LINES
+                if needs_old_content:
+                    old_path_for_content = file_data["previous_filename"] if file_data["status"] == 'renamed' and file_data["previous_filename"] else file_data["filename"]
+                    file_data["_old_path"] = old_path_for_content
+                    old_specs.append((base_sha, old_path_for_content))
+
+            old_contents = self._fetch_file_contents(repo, repo_full_name, old_specs, "old", from_mirror)
+            for file_data in files_changed_data:
+                old_path_for_content = file_data.pop("_old_path", None)
+                if old_path_for_content:
+                    file_data["old_content"] = old_contents.get((base_sha, old_path_for_content))
 
-                file_data: Dict[str, Any] = {
-                    "filename": file_obj.filename, 
-                    "status": file_obj.status, 
-                    "patch": file_obj.patch if file_obj.patch else "", 
-                    "sha": file_obj.sha, 
-                    "new_content": None, 
-                    "old_content": None,
-                    "previous_filename": file_obj.previous_filename if file_obj.status == 'renamed' else None
-                }
-                
-                if file_obj.status in ['added', 'modified', 'renamed']:
-                    try:
-                        content_obj = repo.get_contents(file_obj.filename, ref=head_sha)
-                        if content_obj.type == 'file': 
-                             file_data["new_content"] = content_obj.decoded_content.decode('utf-8', errors='replace')
-                        else: print(f"INFO: Skipping content fetch for non-file type '{content_obj.type}' for {file_obj.filename} at {head_sha}")
-                    except UnknownObjectException: 
-                         print(f"WARNING: Content for {file_obj.filename} (ref: {head_sha}) not found or too large. Using patch if available.")
-                    except GithubException as e_content_gh:
-                         print(f"WARNING: GitHub error getting new content for {file_obj.filename} (ref: {head_sha}): {e_content_gh.status} {e_content_gh.data.get('message','')}. Using patch if available.")
-                    except Exception as e_content: 
-                        print(f"WARNING: Error decoding new content for {file_obj.filename} (ref: {head_sha}): {e_content}. Using patch if available.")
-                
-                if file_obj.status in ['modified', 'renamed']:
-                    old_path_for_content = file_obj.previous_filename if file_obj.status == 'renamed' and file_obj.previous_filename else file_obj.filename
-                    try:
-                        content_obj_old = repo.get_contents(old_path_for_content, ref=base_sha)
-                        if content_obj_old.type == 'file':
-                            file_data["old_content"] = content_obj_old.decoded_content.decode('utf-8', errors='replace')
-                        else: print(f"INFO: Skipping old content fetch for non-file type '{content_obj_old.type}' for {old_path_for_content} at {base_sha}")
-                    except UnknownObjectException:
-                         print(f"WARNING: Old content for {old_path_for_content} (ref: {base_sha}) not found or too large.")
-                    except GithubException as e_content_old_gh:
-                         print(f"WARNING: GitHub error getting old content for {old_path_for_content} (ref: {base_sha}): {e_content_old_gh.status} {e_content_old_gh.data.get('message','')}.")
-                    except Exception as e_content_old:
-                         print(f"WARNING: Error decoding old content for {old_path_for_content} (ref: {base_sha}): {e_content_old}.")
-                
-                files_changed_data.append(file_data)
             return files_changed_data, base_ref, head_ref
         
         except GithubException as e: 
@@ -330,18 +621,13 @@ class GitHubHelper:
         return None, None, None 
 
     def publish_pull_request_comment(self, repo_full_name: str, pull_number: int, comment_body: str, 
-                                     filename: Optional[str] = None, current_file_num: Optional[int] = None, total_files_num: Optional[int] = None) -> Tuple[int, str]:
+                                     filename: Optional[str] = None, current_file_num: Optional[int] = None, total_files_num: Optional[int] = None,
+                                     pull=None) -> Tuple[int, str]:
         try:
-            repo = self.g.get_repo(repo_full_name)
-            pull = repo.get_pull(pull_number) 
-            
-            file_progress_header = ""
-            if filename and current_file_num is not None and total_files_num is not None:
-                if total_files_num > 0 and current_file_num > 0 and current_file_num <= total_files_num:
-                    file_progress_header = f" (File {current_file_num} of {total_files_num})"
+            if pull is None:
+                _, pull = self._get_repo_and_pull(repo_full_name, pull_number)
             
-            formatted_comment_header = f"### AI Review for `{filename}`{file_progress_header}\n\n---\n\n" if filename else ""
-            full_comment_body = f"{formatted_comment_header}{comment_body}"
+            full_comment_body = _format_file_review(comment_body, filename, current_file_num, total_files_num)
             
             comment_obj = pull.create_issue_comment(full_comment_body) 
             
@@ -360,24 +646,153 @@ class GitHubHelper:
             traceback.print_exc()
             return 500, f"Unexpected error posting comment: {str(e_gen)}"
 
-    def get_comments_from_pr_changes(self, repo_full_name: str, pull_number: int) -> Tuple[int, str]:
+    def publish_pull_request_review(self, repo_full_name: str, pull_number: int, summary_body: str,
+                                    findings: List[Dict[str, Any]], pull=None) -> Tuple[int, str]:
+        """Submits every file finding as a COMMENT review on the pull request.
+
+        findings are dicts with filename, patch and body. Each one is attached inline to a line of its
+        file's diff; findings that cannot be anchored are appended to the review body. If GitHub rejects
+        the inline comments (422 for a line outside the diff, for example) the review is resubmitted
+        with all findings in the body. A body over GitHub's size limit is split between files into
+        several reviews, the first of which carries the inline comments.
+        """
+        try:
+            if pull is None:
+                _, pull = self._get_repo_and_pull(repo_full_name, pull_number)
+
+            inline_comments: List[Dict[str, Any]] = []
+            body_sections = [summary_body]
+            for finding in findings:
+                anchor_line = find_review_anchor_line(finding['patch'], finding['body']) if finding.get('patch') else None
+                if anchor_line is None:
+                    body_sections.append(finding['body'])
+                    continue
+                inline_comments.append({
+                    "path": finding['filename'],
+                    "line": anchor_line,
+                    "side": "RIGHT",
+                    "body": _truncate_comment(finding['body']),
+                })
+
+            bodies = _split_review_body(body_sections)
+            try:
+                review_obj = pull.create_review(body=bodies[0], event="COMMENT", comments=inline_comments)
+            except GithubException as e_inline:
+                if not inline_comments:
+                    raise
+                error_message = e_inline.data.get('message', str(e_inline)) if hasattr(e_inline, 'data') and isinstance(e_inline.data, dict) else str(e_inline)
+                print(f"WARNING: GitHub rejected inline review comments for PR {repo_full_name}#{pull_number} (Status {e_inline.status}: {error_message}). Resubmitting with all findings in the review body.")
+                bodies = _split_review_body([summary_body] + [finding['body'] for finding in findings])
+                review_obj = pull.create_review(body=bodies[0], event="COMMENT")
+                inline_comments = []
+            for body in bodies[1:]:
+                pull.create_review(body=body, event="COMMENT")
+            if len(bodies) > 1:
+                print(f"INFO: Review for PR {repo_full_name}#{pull_number} exceeded GitHub's size limit and was posted as {len(bodies)} reviews.")
+
+            if review_obj and review_obj.id:
+                print(f"Successfully submitted review to PR {repo_full_name}#{pull_number} (Review ID: {review_obj.id}, inline comments: {len(inline_comments)}).")
+                return 201, "Successfully submitted review."
+            print(f"ERROR: Review submission to PR {repo_full_name}#{pull_number} returned an unexpected result (no review object or ID).")
+            return 500, "Review submission returned unexpected result."
+        except GithubException as e:
+            error_message = e.data.get('message', str(e)) if hasattr(e, 'data') and isinstance(e.data, dict) else str(e)
+            print(f"GitHub API error submitting review to PR {repo_full_name}#{pull_number}: Status {e.status}, Message: {error_message}")
+            return e.status if isinstance(e.status, int) else 500, f"GitHub API Error: {error_message}"
+        except Exception as e_gen:
+            print(f"Generic error in publish_pull_request_review for {repo_full_name}#{pull_number}: {type(e_gen).__name__} - {e_gen}")
+            traceback.print_exc()
+            return 500, f"Unexpected error submitting review: {str(e_gen)}"
+
+    async def _analyze_review_file(self, file_info: Dict[str, Any]) -> Tuple[Optional[str], str, bool]:
+        """Runs the analysis that fits one changed file. Returns (comment_text, analysis_type, is_llm_analyzed_file)."""
+        filename = file_info['filename']
+        comment_text: Optional[str] = None
+        analysis_type = "Code Analysis"
+        is_llm_analyzed_file = False
+
+        if filename.endswith("requirements.txt") and file_info.get('new_content'):
+            analysis_type = "Vulnerability Scan"
+            print(f"INFO: Performing {analysis_type} for {filename}")
+            scan_result = await asyncio.to_thread(self.vulnerability_scanner.check_vulnerabilities, file_info['new_content'])
+            comment_text = scan_result.get("response") if isinstance(scan_result, dict) else str(scan_result)
+        elif file_info.get('new_content'):
+            analysis_type = "LLM Code Review (New Content)"
+            print(f"INFO: Performing {analysis_type} for {filename}")
+            if file_info.get('status') in ['modified', 'renamed'] and not file_info.get('old_content') and file_info.get('patch') and REVIEW_PROMPT_MODE == "hunks":
+                analysis_type = "LLM Code Review (Changed Hunks)"
+                llm_response = await self.llm.analyze_file_changes(
+                    file_info['patch'], file_info['new_content'], filename, new_blob_sha=file_info.get('sha')
+                )
+            elif file_info.get('status') == 'modified' and file_info.get('old_content'):
+                llm_response = await self.llm.analyze_source_and_target_file(
+                    file_info['old_content'], file_info['new_content'], filename, new_blob_sha=file_info.get('sha')
+                )
+            else:
+                llm_response = await self.llm.analyze_source_file(file_info['new_content'], filename, new_blob_sha=file_info.get('sha'))
+            comment_text = llm_response.get("response") if isinstance(llm_response, dict) else str(llm_response)
+            if comment_text: is_llm_analyzed_file = True
+        elif file_info.get('patch'):
+            analysis_type = "LLM Code Review (Patch Only)"
+            print(f"INFO: Performing {analysis_type} on patch for {filename}")
+            llm_response = await self.llm.analyze_source_file(file_info['patch'], filename)
+            comment_text = llm_response.get("response") if isinstance(llm_response, dict) else str(llm_response)
+            if comment_text: is_llm_analyzed_file = True
+        else:
+            print(f"INFO: Skipped detailed analysis for {filename} - no suitable content (new_content or patch) found.")
+
+        return comment_text, analysis_type, is_llm_analyzed_file
+
+    def _review_batch_item(self, file_info: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(analysis_type, batch item) when the file can share an LLM call, following _analyze_review_file's choice of prompt."""
+        filename = file_info['filename']
+        if filename.endswith("requirements.txt") and file_info.get('new_content'):
+            return None
+        if file_info.get('new_content'):
+            if file_info.get('status') in ['modified', 'renamed'] and not file_info.get('old_content') and file_info.get('patch') and REVIEW_PROMPT_MODE == "hunks":
+                analysis_type = "LLM Code Review (Changed Hunks)"
+                item = self.llm.batch_item(filename, file_info['new_content'], patch=file_info['patch'], new_blob_sha=file_info.get('sha'))
+            elif file_info.get('status') == 'modified' and file_info.get('old_content'):
+                analysis_type = "LLM Code Review (New Content)"
+                item = self.llm.batch_item(filename, file_info['new_content'], original_content=file_info['old_content'], new_blob_sha=file_info.get('sha'))
+            else:
+                analysis_type = "LLM Code Review (New Content)"
+                item = self.llm.batch_item(filename, file_info['new_content'], new_blob_sha=file_info.get('sha'))
+        elif file_info.get('patch'):
+            analysis_type = "LLM Code Review (Patch Only)"
+            item = self.llm.batch_item(filename, file_info['patch'])
+        else:
+            return None
+        return (analysis_type, item) if item is not None else None
+
+    async def get_comments_from_pr_changes(self, repo_full_name: str, pull_number: int, cancel_event: Optional[threading.Event] = None) -> Tuple[int, str]:
+        """Reviews every changed file of a PR and publishes the results.
+
+        Up to REVIEW_FILE_CONCURRENCY files are analyzed at once; small files are grouped and reviewed
+        several per LLM call, falling back to per-file calls for any file a batch did not cover. With REVIEW_PUBLISH_MODE "review" all
+        findings are submitted at the end as one pull request review with inline comments on the changed
+        lines; with "comments" one issue comment is posted per file, in "File N of M" order, as soon as it
+        and all files before it are done.
+        cancel_event is checked between files; once it is set (a newer push superseded this review)
+        no further files are analyzed and nothing more is published.
+        """
         print(f"--- GitHubHelper: Starting review process for PR {repo_full_name}#{pull_number} ---")
         files_changed_raw: Optional[List[Dict[str, Any]]] = None
         base_ref: Optional[str] = None
         head_ref: Optional[str] = None
+        pull = None
         try:
-            files_changed_raw, base_ref, head_ref = self.get_pull_request_files_and_diff(repo_full_name, pull_number)
+            repo, pull = await asyncio.to_thread(self._get_repo_and_pull, repo_full_name, pull_number)
+            files_changed_raw, base_ref, head_ref = await asyncio.to_thread(self.get_pull_request_files_and_diff, repo_full_name, pull_number, repo, pull)
             if files_changed_raw is None: 
                 print(f"ERROR: Failed to retrieve PR file changes (returned None) for {repo_full_name}#{pull_number}.")
-                self.publish_pull_request_comment(repo_full_name, pull_number, "⚠️ CodeReview-Assistant: Critical error - could not retrieve file changes for review.")
+                await asyncio.to_thread(self.publish_pull_request_comment, repo_full_name, pull_number, "⚠️ CodeReview-Assistant: Critical error - could not retrieve file changes for review.", pull=pull)
                 return 500, "Critical error: Failed to retrieve PR file changes."
         except Exception as e_get_files: 
             print(f"ERROR: Could not retrieve PR file changes for {repo_full_name}#{pull_number}: {e_get_files}")
-            self.publish_pull_request_comment(repo_full_name, pull_number, f"⚠️ CodeReview-Assistant: Error retrieving files for review: {str(e_get_files)[:500]}")
+            await asyncio.to_thread(self.publish_pull_request_comment, repo_full_name, pull_number, f"⚠️ CodeReview-Assistant: Error retrieving files for review: {str(e_get_files)[:500]}", pull=pull)
             return 500, f"Could not retrieve PR file changes: {str(e_get_files)}"
 
-        self._increment_project_metrics(repo_full_name, pr_analyzed_increment=1)
-
         reviewable_files: List[Dict[str, Any]] = []
         for file_info_raw in files_changed_raw: 
             if file_info_raw.get('status') == 'removed':
@@ -391,78 +806,114 @@ class GitHubHelper:
         num_reviewable_files = len(reviewable_files)
         if num_reviewable_files == 0:
             print(f"INFO: No reviewable files (added, modified with content/patch) found in PR {repo_full_name}#{pull_number}")
-            self.publish_pull_request_comment(repo_full_name, pull_number, "🤖 CodeReview-Assistant: No files in this update require detailed review.")
+            await asyncio.to_thread(self._increment_project_metrics, repo_full_name, pr_analyzed_increment=1)
+            await asyncio.to_thread(self.publish_pull_request_comment, repo_full_name, pull_number, "🤖 CodeReview-Assistant: No files in this update require detailed review.", pull=pull)
             return 200, "No reviewable files found that require detailed review."
 
-        initial_comment_body = f"🤖 CodeReview-Assistant: Starting review for **{num_reviewable_files}** file(s). Individual comments will follow if issues are found or analysis is performed."
-        status_code_initial, msg_initial = self.publish_pull_request_comment(repo_full_name, pull_number, initial_comment_body)
-        if status_code_initial != 201: 
-            print(f"WARNING: Failed to publish initial status comment to PR {repo_full_name}#{pull_number}: {msg_initial} (Status: {status_code_initial})")
+        publish_as_review = REVIEW_PUBLISH_MODE != "comments"
+        if not publish_as_review:
+            initial_comment_body = f"🤖 CodeReview-Assistant: Starting review for **{num_reviewable_files}** file(s). Individual comments will follow if issues are found or analysis is performed."
+            status_code_initial, msg_initial = await asyncio.to_thread(self.publish_pull_request_comment, repo_full_name, pull_number, initial_comment_body, pull=pull)
+            if status_code_initial != 201: 
+                print(f"WARNING: Failed to publish initial status comment to PR {repo_full_name}#{pull_number}: {msg_initial} (Status: {status_code_initial})")
 
         files_actually_processed_for_llm = 0
         errors_during_overall_review = False
+        review_findings: List[Dict[str, Any]] = []
+        analysis_slots = asyncio.Semaphore(REVIEW_FILE_CONCURRENCY)
 
-        for idx, file_info in enumerate(reviewable_files):
-            current_file_num_for_comment = idx + 1
-            filename = file_info['filename']
-            print(f"INFO: Processing file {current_file_num_for_comment}/{num_reviewable_files}: {filename} in PR {repo_full_name}#{pull_number}")
-            
-            comment_text: Optional[str] = None
-            analysis_type = "Code Analysis" 
-            is_llm_analyzed_file = False
+        async def review_batch(batch_items: List[Dict[str, Any]]) -> Dict[str, str]:
+            async with analysis_slots:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise asyncio.CancelledError()
+                try:
+                    return await self.llm.analyze_files_batch(batch_items)
+                except Exception as e_batch:
+                    print(f"WARNING: Batched review of {len(batch_items)} files in PR {repo_full_name}#{pull_number} failed, reviewing them one by one: {type(e_batch).__name__} - {e_batch}")
+                    return {}
 
-            try:
-                if filename.endswith("requirements.txt") and file_info.get('new_content'):
-                    analysis_type = "Vulnerability Scan"
-                    print(f"INFO: Performing {analysis_type} for {filename}")
-                    scan_result = self.vulnerability_scanner.check_vulnerabilities(file_info['new_content'])
-                    comment_text = scan_result.get("response") if isinstance(scan_result, dict) else str(scan_result)
-                elif file_info.get('new_content'): 
-                    analysis_type = "LLM Code Review (New Content)"
-                    print(f"INFO: Performing {analysis_type} for {filename}")
-                    if file_info.get('status') == 'modified' and file_info.get('old_content'):
-                        llm_response = self.llm.analyze_source_and_target_file(
-                            file_info['old_content'], file_info['new_content'], filename
-                        )
-                    else: 
-                        llm_response = self.llm.analyze_source_file(file_info['new_content'], filename)
-                    comment_text = llm_response.get("response") if isinstance(llm_response, dict) else str(llm_response)
-                    if comment_text: is_llm_analyzed_file = True
-                elif file_info.get('patch'): 
-                    analysis_type = "LLM Code Review (Patch Only)"
-                    print(f"INFO: Performing {analysis_type} on patch for {filename}")
-                    llm_response = self.llm.analyze_source_file(file_info['patch'], filename) 
-                    comment_text = llm_response.get("response") if isinstance(llm_response, dict) else str(llm_response)
-                    if comment_text: is_llm_analyzed_file = True
-                else:
-                    print(f"INFO: Skipped detailed analysis for {filename} - no suitable content (new_content or patch) found.")
-                    continue 
-
-                if comment_text and comment_text.strip(): 
-                    status_pub, msg_pub = self.publish_pull_request_comment(
-                        repo_full_name, pull_number, comment_text, filename,
-                        current_file_num=current_file_num_for_comment, total_files_num=num_reviewable_files
-                    )
-                    if status_pub != 201:
-                        errors_during_overall_review = True
-                        print(f"ERROR: Failed to publish {analysis_type} comment for {filename}: {msg_pub} (Status: {status_pub})")
+        batch_plan: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for file_info in reviewable_files:
+            batch_entry = self._review_batch_item(file_info)
+            if batch_entry is not None:
+                batch_plan[file_info['filename']] = batch_entry
+        batch_tasks: Dict[str, asyncio.Task] = {}
+        for batch_items in self.llm.group_batch_items([item for _, item in batch_plan.values()]):
+            batch_task = asyncio.create_task(review_batch(batch_items))
+            for item in batch_items:
+                batch_tasks[item["file_name"]] = batch_task
+        if batch_tasks:
+            print(f"INFO: Batching {len(batch_tasks)} small file(s) of PR {repo_full_name}#{pull_number} into {len(set(batch_tasks.values()))} LLM call(s).")
+
+        async def analyze_in_slot(file_info: Dict[str, Any]) -> Tuple[Optional[str], str, bool]:
+            batch_task = batch_tasks.get(file_info['filename'])
+            if batch_task is not None:
+                batch_review = (await batch_task).get(file_info['filename'])
+                if batch_review:
+                    return batch_review, batch_plan[file_info['filename']][0], True
+            async with analysis_slots:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise asyncio.CancelledError()
+                return await self._analyze_review_file(file_info)
+
+        async def publish_file_result(file_info: Dict[str, Any], text: str, file_num: int, anchor_inline: bool = True) -> Tuple[int, str]:
+            if publish_as_review:
+                review_findings.append({
+                    "filename": file_info['filename'],
+                    "patch": file_info.get('patch') if anchor_inline else None,
+                    "body": _format_file_review(text, file_info['filename'], file_num, num_reviewable_files),
+                })
+                return 201, "Queued for review."
+            return await asyncio.to_thread(
+                self.publish_pull_request_comment,
+                repo_full_name, pull_number, text, file_info['filename'],
+                current_file_num=file_num, total_files_num=num_reviewable_files, pull=pull
+            )
+
+        analysis_tasks = [asyncio.create_task(analyze_in_slot(file_info)) for file_info in reviewable_files]
+        print(f"INFO: Analyzing {num_reviewable_files} file(s) in PR {repo_full_name}#{pull_number} with up to {REVIEW_FILE_CONCURRENCY} in parallel.")
+
+        try:
+            for idx, (file_info, analysis_task) in enumerate(zip(reviewable_files, analysis_tasks)):
+                current_file_num_for_comment = idx + 1
+                filename = file_info['filename']
+                analysis_type = "Code Analysis"
+
+                try:
+                    comment_text, analysis_type, is_llm_analyzed_file = await analysis_task
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise asyncio.CancelledError()
+                    print(f"INFO: Finished file {current_file_num_for_comment}/{num_reviewable_files}: {filename} in PR {repo_full_name}#{pull_number}")
+
+                    if comment_text and comment_text.strip(): 
+                        status_pub, msg_pub = await publish_file_result(file_info, comment_text, current_file_num_for_comment)
+                        if status_pub != 201:
+                            errors_during_overall_review = True
+                            print(f"ERROR: Failed to publish {analysis_type} comment for {filename}: {msg_pub} (Status: {status_pub})")
+                        else:
+                            print(f"INFO: Collected {analysis_type} result for {filename}" if publish_as_review else f"INFO: Successfully published {analysis_type} comment for {filename}")
+                            if is_llm_analyzed_file: 
+                                files_actually_processed_for_llm +=1
                     else:
-                        print(f"INFO: Successfully published {analysis_type} comment for {filename}")
-                        if is_llm_analyzed_file: 
-                            self._increment_project_metrics(repo_full_name, files_analyzed_increment=1)
-                            files_actually_processed_for_llm +=1
-                else:
-                    print(f"INFO: No comment text generated by {analysis_type} for {filename}, or comment was empty.")
-
-            except HTTPException as http_exc: 
-                errors_during_overall_review = True
-                print(f"ERROR: HTTPException during {analysis_type} for {filename}: Status {http_exc.status_code}, Detail: {http_exc.detail}")
-                self.publish_pull_request_comment(repo_full_name, pull_number, f"⚠️ Error during {analysis_type} for `{filename}`: {str(http_exc.detail)[:200]}...", filename, current_file_num_for_comment, num_reviewable_files)
-            except Exception as general_error: 
-                errors_during_overall_review = True
-                print(f"ERROR: Unexpected error during {analysis_type} for {filename}: {type(general_error).__name__} - {general_error}")
-                traceback.print_exc()
-                self.publish_pull_request_comment(repo_full_name, pull_number, f"⚠️ CodeReview-Assistant: An unexpected error occurred while analyzing `{filename}`. Please check server logs.", filename, current_file_num_for_comment, num_reviewable_files)
+                        print(f"INFO: No comment text generated by {analysis_type} for {filename}, or comment was empty.")
+
+                except asyncio.CancelledError:
+                    if cancel_event is not None and cancel_event.is_set():
+                        print(f"INFO: Review of PR {repo_full_name}#{pull_number} cancelled after {idx}/{num_reviewable_files} file(s): superseded by a newer push.")
+                        return 409, "Review cancelled: superseded by a newer push."
+                    raise
+                except HTTPException as http_exc: 
+                    errors_during_overall_review = True
+                    print(f"ERROR: HTTPException during {analysis_type} for {filename}: Status {http_exc.status_code}, Detail: {http_exc.detail}")
+                    await publish_file_result(file_info, f"⚠️ Error during {analysis_type} for `{filename}`: {str(http_exc.detail)[:200]}...", current_file_num_for_comment, anchor_inline=False)
+                except Exception as general_error: 
+                    errors_during_overall_review = True
+                    print(f"ERROR: Unexpected error during {analysis_type} for {filename}: {type(general_error).__name__} - {general_error}")
+                    traceback.print_exc()
+                    await publish_file_result(file_info, f"⚠️ CodeReview-Assistant: An unexpected error occurred while analyzing `{filename}`. Please check server logs.", current_file_num_for_comment, anchor_inline=False)
+        finally:
+            for analysis_task in analysis_tasks + list(batch_tasks.values()):
+                analysis_task.cancel()
 
         final_comment_body = f"🤖 CodeReview-Assistant: Review complete. Analyzed **{files_actually_processed_for_llm}/{num_reviewable_files}** file(s) with the LLM."
         
@@ -472,12 +923,23 @@ class GitHubHelper:
 
         if errors_during_overall_review:
             final_comment_body += "\n\n⚠️ Some errors occurred during the review. Please check individual file comments or application logs for more details."
+        elif publish_as_review:
+            final_comment_body += "\n\nAll reviewable files processed. Findings are attached to the changed lines below."
         else:
             final_comment_body += "\n\nAll reviewable files processed. Please see individual comments above for details if any were generated."
-            
-        status_code_final, msg_final = self.publish_pull_request_comment(repo_full_name, pull_number, final_comment_body)
-        if status_code_final != 201:
-            print(f"WARNING: Failed to publish final completion comment to PR {repo_full_name}#{pull_number}: {msg_final} (Status: {status_code_final})")
+
+        if publish_as_review:
+            status_code_final, msg_final = await asyncio.to_thread(self.publish_pull_request_review, repo_full_name, pull_number, final_comment_body, review_findings, pull)
+            if status_code_final != 201:
+                errors_during_overall_review = True
+                files_actually_processed_for_llm = 0
+                print(f"ERROR: Failed to submit review to PR {repo_full_name}#{pull_number}: {msg_final} (Status: {status_code_final})")
+        else:
+            status_code_final, msg_final = await asyncio.to_thread(self.publish_pull_request_comment, repo_full_name, pull_number, final_comment_body, pull=pull)
+            if status_code_final != 201:
+                print(f"WARNING: Failed to publish final completion comment to PR {repo_full_name}#{pull_number}: {msg_final} (Status: {status_code_final})")
+
+        await asyncio.to_thread(self._increment_project_metrics, repo_full_name, files_analyzed_increment=files_actually_processed_for_llm, pr_analyzed_increment=1)
 
         if errors_during_overall_review:
             return 500, "Review completed with one or more errors."
@@ -547,67 +1009,70 @@ class GitHubHelper:
             traceback.print_exc()
             return False, f"Unexpected error creating/managing webhook: {str(e_other)}", None
 
-    async def handle_github_webhook(self, request: Request):
-        try: 
-            payload = await request.json()
-        except json.JSONDecodeError: 
-            print("Webhook Error: Invalid JSON payload received.")
-            return 400, "Invalid JSON payload." 
-        except Exception as e_json: 
-            print(f"Webhook Error: Could not parse JSON payload: {e_json}")
-            return 400, f"Error parsing JSON payload: {e_json}"
-
-        event_type = request.headers.get("X-GitHub-Event")
-        delivery_id = request.headers.get("X-GitHub-Delivery") 
-        print(f"--- GitHubHelper: Received webhook. Event: '{event_type}', Delivery ID: '{delivery_id}' ---")
-
-        if event_type != "pull_request":
-            print(f"Ignoring non-pull_request event: '{event_type}'")
-            return 200, f"Event '{event_type}' received and ignored. Only 'pull_request' events are processed."
-
-        action = payload.get("action")
-        pr_data = payload.get("pull_request")
-        repo_data = payload.get("repository")
-
-        if not action or not pr_data or not repo_data:
-            print("Webhook Error: Missing 'action', 'pull_request', or 'repository' data in payload.")
-            return 400, "Missing essential data in pull_request event payload."
-
-        repo_full_name = repo_data.get("full_name")
-        pull_number = pr_data.get("number")
-        pr_state = pr_data.get("state") 
-        is_draft = pr_data.get("draft", False) 
-        pr_title = pr_data.get("title", "").lower() 
-
-        if not repo_full_name or not isinstance(pull_number, int):
-            print("Webhook Error: Missing 'repository.full_name' or 'pull_request.number' in payload.")
-            return 400, "Missing repository full name or pull request number in payload."
-
-        print(f"Processing PR Event: Repo='{repo_full_name}', PR#='{pull_number}', Action='{action}', State='{pr_state}', Draft='{is_draft}'")
-
-        trigger_actions = ["opened", "reopened", "synchronize", "ready_for_review"]
-        
-        if action in trigger_actions and pr_state == "open" and not is_draft:
-            if "wip" in pr_title or "[draft]" in pr_title: 
-                print(f"PR {repo_full_name}#{pull_number} action '{action}' skipped: Title indicates Work-In-Progress or Draft.")
-                return 200, "Action skipped: Pull request title indicates WIP/Draft."
 
-            print(f"Relevant PR action '{action}' for {repo_full_name}#{pull_number}. Initiating code review process.")
-            try:
-                status, msg = self.get_comments_from_pr_changes(repo_full_name, pull_number)
-                print(f"Review process for {repo_full_name}#{pull_number} completed with status {status}: {msg}")
-                return status if 200 <= status < 300 else 500, msg 
-            except Exception as e_review_process: 
-                print(f"Critical Error during webhook processing for {repo_full_name}#{pull_number}: {type(e_review_process).__name__} - {e_review_process}")
-                traceback.print_exc()
-                return 500, f"Internal server error during webhook processing: {str(e_review_process)}"
-        
-        elif is_draft:
-            print(f"PR {repo_full_name}#{pull_number} action '{action}' skipped: Pull request is currently a draft.")
-            return 200, "Action skipped: Pull request is a draft."
-        elif pr_state == "closed":
-            print(f"PR {repo_full_name}#{pull_number} action '{action}' skipped: Pull request is closed.")
-            return 200, "Action skipped: Pull request is closed."
-        else: 
-            print(f"No action taken for PR event action '{action}' on {repo_full_name}#{pull_number} (State: {pr_state}, Draft: {is_draft}).")
-            return 200, f"No action taken for PR event action '{action}' under current conditions."
+_helper_cache_lock = threading.Lock()
+_helper_cache: "OrderedDict[str, Tuple[GitHubHelper, float]]" = OrderedDict()
+_helper_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def get_github_helper(user_github_token: str) -> GitHubHelper:
+    """Returns a cached GitHubHelper for the token, creating (and authenticating) one on a miss.
+
+    Helpers are kept for GITHUB_HELPER_CACHE_TTL_SECONDS, at most GITHUB_HELPER_CACHE_MAX_SIZE of them
+    (least recently used first out). Tokens are only stored hashed as cache keys. Raises the same
+    ValueError/RuntimeError as the GitHubHelper constructor; failures are not cached.
+    """
+    if not user_github_token:
+        return GitHubHelper(user_github_token)
+    cache_key = token_cache_key(user_github_token)
+    now = time.monotonic()
+    with _helper_cache_lock:
+        cached = _helper_cache.get(cache_key)
+        if cached is not None and now - cached[1] < GITHUB_HELPER_CACHE_TTL_SECONDS:
+            _helper_cache.move_to_end(cache_key)
+            _helper_cache_stats["hits"] += 1
+            return cached[0]
+        if cached is not None:
+            del _helper_cache[cache_key]
+        _helper_cache_stats["misses"] += 1
+
+    helper = GitHubHelper(user_github_token)
+
+    with _helper_cache_lock:
+        _helper_cache[cache_key] = (helper, time.monotonic())
+        _helper_cache.move_to_end(cache_key)
+        while len(_helper_cache) > GITHUB_HELPER_CACHE_MAX_SIZE:
+            _helper_cache.popitem(last=False)
+            _helper_cache_stats["evictions"] += 1
+    return helper
+
+
+def peek_github_helper(helper_cache_key: str) -> Optional[GitHubHelper]:
+    """Returns the cached, unexpired helper for a token_cache_key() without creating one."""
+    with _helper_cache_lock:
+        cached = _helper_cache.get(helper_cache_key)
+    if cached is None or time.monotonic() - cached[1] >= GITHUB_HELPER_CACHE_TTL_SECONDS:
+        return None
+    return cached[0]
+
+
+def invalidate_github_helper(user_github_token: Optional[str]):
+    """Drops the cached helper for a token, e.g. after GitHub rejected it as bad credentials."""
+    if not user_github_token:
+        return
+    with _helper_cache_lock:
+        _helper_cache.pop(token_cache_key(user_github_token), None)
+
+
+def get_github_helper_cache_stats() -> Dict[str, Any]:
+    with _helper_cache_lock:
+        return {
+            **_helper_cache_stats,
+            "entries": len(_helper_cache),
+            "max_entries": GITHUB_HELPER_CACHE_MAX_SIZE,
+            "ttl_seconds": GITHUB_HELPER_CACHE_TTL_SECONDS,
+        }
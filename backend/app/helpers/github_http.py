@@ -0,0 +1,216 @@
+import os
+import json
+import hashlib
+from typing import Optional, Dict, Any
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from github import RateLimitExceededException
+from github.Requester import Requester, HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass
+from dotenv import load_dotenv
+
+from app.helpers.github_rate_limit import (
+    github_rate_limiter, get_github_request_priority, GitHubRateLimitWait,
+    GITHUB_RATE_LIMIT_MAX_RETRIES, GITHUB_INTERACTIVE_MAX_WAIT_SECONDS, GITHUB_PRIORITY_INTERACTIVE,
+)
+
+load_dotenv(override=True)
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB_GITHUB_CACHE = int(os.getenv("REDIS_DB_GITHUB_CACHE", 5))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+
+GITHUB_API_HOST = "api.github.com"
+GITHUB_HTTP_CACHE_ENABLED = os.getenv("GITHUB_HTTP_CACHE_ENABLED", "true").lower() == "true"
+GITHUB_HTTP_CACHE_TTL_SECONDS = int(os.getenv("GITHUB_HTTP_CACHE_TTL_SECONDS", 24 * 3600))
+GITHUB_HTTP_CACHE_MAX_BODY_BYTES = int(os.getenv("GITHUB_HTTP_CACHE_MAX_BODY_BYTES", 2 * 1024 * 1024))
+
+GITHUB_HTTP_CACHE_ENTRY_PREFIX = "github_http_cache:entry:"
+GITHUB_HTTP_CACHE_STATS_KEY = "github_http_cache:stats"
+
+# The body is stored already decoded by requests, so these headers no longer describe it.
+_UNCACHED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+redis_client_github_cache = redis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB_GITHUB_CACHE,
+    decode_responses=False,
+    password=REDIS_PASSWORD
+)
+
+
+def _incr_stats(**deltas: int):
+    try:
+        with redis_client_github_cache.pipeline(transaction=False) as pipe:
+            for field, delta in deltas.items():
+                pipe.hincrby(GITHUB_HTTP_CACHE_STATS_KEY, field, delta)
+            pipe.execute()
+    except redis.exceptions.RedisError as e_redis:
+        print(f"WARNING: Could not update GitHub HTTP cache stats: {e_redis}")
+
+
+def _is_secondary_rate_limit(response: requests.Response, stream: bool) -> bool:
+    if response.status_code != 403 or stream:
+        return False
+    return "secondary rate limit" in response.text.lower()
+
+
+class GitHubCachingAdapter(HTTPAdapter):
+    """Transport adapter that paces GitHub API requests and revalidates REST GETs with If-None-Match.
+
+    Every request first waits for github_rate_limiter, and a rate-limited answer is retried after the
+    backoff GitHub asked for instead of being returned to the caller.
+
+    ETags and response bodies are kept in Redis, keyed by a hash of the URL, Accept header and
+    Authorization header (so a token never sees another token's cached data). A 304 answer, which
+    GitHub does not count against the rate limit, is turned back into the stored 200 response with the
+    fresh rate-limit headers merged in. Any Redis problem just disables caching for that request.
+    """
+
+    def _cache_key(self, request: requests.PreparedRequest) -> Optional[str]:
+        if not GITHUB_HTTP_CACHE_ENABLED or request.method != "GET":
+            return None
+        if GITHUB_API_HOST not in (request.url or ""):
+            return None
+        material = f"{request.url}|{request.headers.get('Accept', '')}|{request.headers.get('Authorization', '')}"
+        return f"{GITHUB_HTTP_CACHE_ENTRY_PREFIX}{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+    def _load_entry(self, cache_key: str) -> Optional[Dict[bytes, bytes]]:
+        try:
+            entry = redis_client_github_cache.hgetall(cache_key)
+        except redis.exceptions.RedisError as e_redis:
+            print(f"WARNING: GitHub HTTP cache lookup failed, sending unconditional request: {e_redis}")
+            return None
+        return entry or None
+
+    def _store_entry(self, cache_key: str, response: requests.Response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        body = response.content
+        if body is None or len(body) > GITHUB_HTTP_CACHE_MAX_BODY_BYTES:
+            return
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in _UNCACHED_HEADERS}
+        try:
+            with redis_client_github_cache.pipeline(transaction=False) as pipe:
+                pipe.delete(cache_key)
+                pipe.hset(cache_key, mapping={
+                    "etag": etag or "",
+                    "last_modified": last_modified or "",
+                    "headers": json.dumps(headers),
+                    "body": body,
+                })
+                pipe.expire(cache_key, GITHUB_HTTP_CACHE_TTL_SECONDS)
+                pipe.hincrby(GITHUB_HTTP_CACHE_STATS_KEY, "stores", 1)
+                pipe.execute()
+        except redis.exceptions.RedisError as e_redis:
+            print(f"WARNING: Could not store GitHub response in HTTP cache: {e_redis}")
+
+    def _cached_response(self, request: requests.PreparedRequest, entry: Dict[bytes, bytes],
+                         not_modified: requests.Response) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(json.loads(entry[b"headers"]))
+        for name, value in not_modified.headers.items():
+            if name.lower() not in _UNCACHED_HEADERS:
+                response.headers[name] = value
+        response._content = entry.get(b"body", b"")
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = not_modified.elapsed
+        return response
+
+    def _send_paced(self, request, stream=False, **kwargs):
+        quota_key = github_rate_limiter.quota_key(request.headers.get("Authorization"), request.url or "")
+        priority = get_github_request_priority()
+        for attempt in range(GITHUB_RATE_LIMIT_MAX_RETRIES + 1):
+            try:
+                github_rate_limiter.acquire(quota_key, priority)
+            except GitHubRateLimitWait as e_wait:
+                # Surfaces like GitHub's own rate limit answer, which callers already handle.
+                raise RateLimitExceededException(
+                    403, {"message": str(e_wait)}, {"Retry-After": str(int(e_wait.wait_seconds) + 1)}
+                ) from e_wait
+            response = super().send(request, stream=stream, **kwargs)
+            backoff = github_rate_limiter.update(
+                quota_key, response.status_code, response.headers, secondary_limited=_is_secondary_rate_limit(response, stream)
+            )
+            if backoff is None or attempt == GITHUB_RATE_LIMIT_MAX_RETRIES:
+                return response
+            if priority == GITHUB_PRIORITY_INTERACTIVE and backoff > GITHUB_INTERACTIVE_MAX_WAIT_SECONDS:
+                return response
+            print(f"WARNING: GitHub rate limited {request.method} {request.url} (Status {response.status_code}). Retrying in {backoff:.0f}s (attempt {attempt + 1}/{GITHUB_RATE_LIMIT_MAX_RETRIES}).")
+            github_rate_limiter.record_retry()
+            response.close()
+        return response
+
+    def send(self, request, stream=False, **kwargs):
+        cache_key = None if stream else self._cache_key(request)
+        if cache_key is None:
+            return self._send_paced(request, stream=stream, **kwargs)
+
+        entry = self._load_entry(cache_key)
+        conditional = False
+        if entry and "If-None-Match" not in request.headers and "If-Modified-Since" not in request.headers:
+            if entry.get(b"etag"):
+                request.headers["If-None-Match"] = entry[b"etag"].decode("utf-8")
+                conditional = True
+            elif entry.get(b"last_modified"):
+                request.headers["If-Modified-Since"] = entry[b"last_modified"].decode("utf-8")
+                conditional = True
+
+        response = self._send_paced(request, stream=stream, **kwargs)
+
+        if conditional and response.status_code == 304:
+            _incr_stats(requests=1, conditional=1, not_modified=1)
+            return self._cached_response(request, entry, response)
+        _incr_stats(requests=1, conditional=1 if conditional else 0)
+        if response.status_code == 200:
+            self._store_entry(cache_key, response)
+        return response
+
+
+github_caching_adapter = GitHubCachingAdapter(pool_connections=10, pool_maxsize=32)
+
+# Shared session for the raw REST and GraphQL calls GitHubHelper makes next to PyGithub.
+github_session = requests.Session()
+github_session.mount(f"https://{GITHUB_API_HOST}", github_caching_adapter)
+
+
+class CachingHTTPSRequestsConnectionClass(HTTPSRequestsConnectionClass):
+    """PyGithub connection whose session goes through the caching adapter (keeping PyGithub's retry policy)."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.adapter = GitHubCachingAdapter(max_retries=self.retry, pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("https://", self.adapter)
+
+
+Requester.injectConnectionClasses(HTTPRequestsConnectionClass, CachingHTTPSRequestsConnectionClass)
+
+
+def get_github_http_cache_stats() -> Dict[str, Any]:
+    stats = {key.decode("utf-8"): int(value) for key, value in redis_client_github_cache.hgetall(GITHUB_HTTP_CACHE_STATS_KEY).items()}
+    cacheable_requests = stats.get("requests", 0)
+    conditional = stats.get("conditional", 0)
+    not_modified = stats.get("not_modified", 0)
+    return {
+        "enabled": GITHUB_HTTP_CACHE_ENABLED,
+        "requests": cacheable_requests,
+        "conditional_requests": conditional,
+        "not_modified": not_modified,
+        "stores": stats.get("stores", 0),
+        "conditional_ratio": round(conditional / cacheable_requests, 4) if cacheable_requests else 0.0,
+        "not_modified_ratio": round(not_modified / conditional, 4) if conditional else 0.0,
+        "hit_ratio": round(not_modified / cacheable_requests, 4) if cacheable_requests else 0.0,
+        "ttl_seconds": GITHUB_HTTP_CACHE_TTL_SECONDS,
+    }
@@ -0,0 +1,213 @@
+import os
+import time
+import hashlib
+import threading
+import contextvars
+from typing import Optional, Dict, Any, Mapping
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+GITHUB_PRIORITY_INTERACTIVE = "interactive"
+GITHUB_PRIORITY_BULK = "bulk"
+
+GITHUB_RATE_LIMIT_ENABLED = os.getenv("GITHUB_RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Token bucket per GitHub token: sustained requests per second and burst size.
+GITHUB_REQUESTS_PER_SECOND = float(os.getenv("GITHUB_REQUESTS_PER_SECOND", 10))
+GITHUB_REQUEST_BURST = max(1, int(os.getenv("GITHUB_REQUEST_BURST", 20)))
+# Below this many remaining core requests, bulk (review) traffic waits for the reset so that the
+# dashboard keeps working.
+GITHUB_BULK_QUOTA_RESERVE = int(os.getenv("GITHUB_BULK_QUOTA_RESERVE", 200))
+# GitHub asks clients to wait at least a minute after a secondary rate limit without Retry-After.
+GITHUB_SECONDARY_LIMIT_BACKOFF_SECONDS = int(os.getenv("GITHUB_SECONDARY_LIMIT_BACKOFF_SECONDS", 60))
+GITHUB_RATE_LIMIT_MAX_RETRIES = int(os.getenv("GITHUB_RATE_LIMIT_MAX_RETRIES", 3))
+# Longest a single request is held back before it is sent anyway.
+GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS", 900))
+# Interactive (user-facing) requests fail with a rate limit error instead of waiting longer than this.
+GITHUB_INTERACTIVE_MAX_WAIT_SECONDS = float(os.getenv("GITHUB_INTERACTIVE_MAX_WAIT_SECONDS", 5))
+
+_request_priority: contextvars.ContextVar[str] = contextvars.ContextVar("github_request_priority", default=GITHUB_PRIORITY_INTERACTIVE)
+
+
+def set_github_request_priority(priority: str) -> contextvars.Token:
+    """Sets the priority of GitHub calls made from the current context (and threads started from it via to_thread)."""
+    return _request_priority.set(priority)
+
+
+def get_github_request_priority() -> str:
+    return _request_priority.get()
+
+
+class GitHubRateLimitWait(Exception):
+    """Raised instead of waiting when an interactive request would be held back too long."""
+
+    def __init__(self, wait_seconds: float):
+        super().__init__(f"GitHub rate limit reached. Retry in {wait_seconds:.0f}s.")
+        self.wait_seconds = wait_seconds
+
+
+class _TokenQuota:
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: float = 0.0
+        self.blocked_until: float = 0.0
+        self.tokens: float = float(GITHUB_REQUEST_BURST)
+        self.refilled_at: float = time.monotonic()
+        self.waiting = {GITHUB_PRIORITY_INTERACTIVE: 0, GITHUB_PRIORITY_BULK: 0}
+
+
+class GitHubRateLimiter:
+    """Paces GitHub API requests per token from the X-RateLimit-* and Retry-After response headers.
+
+    Requests that cannot go out yet are delayed. Interactive requests are served before bulk ones and
+    fail with GitHubRateLimitWait rather than wait longer than GITHUB_INTERACTIVE_MAX_WAIT_SECONDS, so a
+    throttled token never holds up a user request for minutes. Bulk requests stop when the remaining
+    quota drops below GITHUB_BULK_QUOTA_RESERVE.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._quotas: Dict[str, _TokenQuota] = {}
+        self._stats = {"requests": 0, "delayed": 0, "wait_seconds": 0.0, "rate_limited": 0, "retries": 0, "rejected": 0}
+
+    @staticmethod
+    def quota_key(authorization: Optional[str], url: str) -> str:
+        """Quotas are tracked per token and per GitHub rate limit resource (core, search, graphql)."""
+        token_key = hashlib.sha256(authorization.encode("utf-8")).hexdigest()[:16] if authorization else "anonymous"
+        if "/search/" in url:
+            resource = "search"
+        elif url.rstrip("/").endswith("/graphql"):
+            resource = "graphql"
+        else:
+            resource = "core"
+        return f"{token_key}:{resource}"
+
+    def _quota(self, key: str) -> _TokenQuota:
+        quota = self._quotas.get(key)
+        if quota is None:
+            quota = self._quotas[key] = _TokenQuota()
+        return quota
+
+    def _wait_seconds(self, quota: _TokenQuota, priority: str) -> float:
+        now_monotonic = time.monotonic()
+        quota.tokens = min(float(GITHUB_REQUEST_BURST), quota.tokens + (now_monotonic - quota.refilled_at) * GITHUB_REQUESTS_PER_SECOND)
+        quota.refilled_at = now_monotonic
+
+        now = time.time()
+        if quota.blocked_until > now:
+            return quota.blocked_until - now
+        if quota.remaining is not None and quota.reset_at > now:
+            if quota.remaining <= 0:
+                return quota.reset_at - now
+            bulk_reserve = min(GITHUB_BULK_QUOTA_RESERVE, quota.limit // 10) if quota.limit else GITHUB_BULK_QUOTA_RESERVE
+            if priority == GITHUB_PRIORITY_BULK and quota.remaining <= bulk_reserve:
+                return quota.reset_at - now
+        if priority == GITHUB_PRIORITY_BULK and quota.waiting[GITHUB_PRIORITY_INTERACTIVE] > 0:
+            return 1.0 / GITHUB_REQUESTS_PER_SECOND
+        if quota.tokens < 1:
+            return (1 - quota.tokens) / GITHUB_REQUESTS_PER_SECOND
+        return 0.0
+
+    def acquire(self, key: str, priority: Optional[str] = None) -> float:
+        """Blocks until a request for key may be sent. Returns the seconds spent waiting.
+
+        Raises GitHubRateLimitWait for an interactive request that would wait too long.
+        """
+        if not GITHUB_RATE_LIMIT_ENABLED:
+            return 0.0
+        priority = priority or get_github_request_priority()
+        started = time.monotonic()
+        with self._condition:
+            quota = self._quota(key)
+            quota.waiting[priority] = quota.waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    waited = time.monotonic() - started
+                    wait_seconds = self._wait_seconds(quota, priority)
+                    if wait_seconds <= 0 or waited >= GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS:
+                        break
+                    if priority == GITHUB_PRIORITY_INTERACTIVE and waited + wait_seconds > GITHUB_INTERACTIVE_MAX_WAIT_SECONDS:
+                        self._stats["rejected"] += 1
+                        raise GitHubRateLimitWait(wait_seconds)
+                    # Wake up at least once a second so header updates from other threads are picked up.
+                    self._condition.wait(min(wait_seconds, 1.0, GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS - waited))
+                quota.tokens -= 1
+                if quota.remaining is not None:
+                    quota.remaining = max(0, quota.remaining - 1)
+                self._stats["requests"] += 1
+                if waited > 0.001:
+                    self._stats["delayed"] += 1
+                    self._stats["wait_seconds"] += waited
+                return waited
+            finally:
+                quota.waiting[priority] -= 1
+                self._condition.notify_all()
+
+    def update(self, key: str, status_code: int, headers: Mapping[str, str], secondary_limited: bool = False) -> Optional[float]:
+        """Records the quota headers of a response. Returns the backoff in seconds if it was rate limited.
+
+        secondary_limited marks a 403 whose body reports a secondary (abuse) rate limit.
+        """
+        if not GITHUB_RATE_LIMIT_ENABLED:
+            return None
+        now = time.time()
+        backoff: Optional[float] = None
+        with self._condition:
+            quota = self._quota(key)
+            try:
+                if headers.get("X-RateLimit-Limit") is not None:
+                    quota.limit = int(headers["X-RateLimit-Limit"])
+                if headers.get("X-RateLimit-Remaining") is not None:
+                    quota.remaining = int(headers["X-RateLimit-Remaining"])
+                if headers.get("X-RateLimit-Reset") is not None:
+                    quota.reset_at = float(headers["X-RateLimit-Reset"])
+            except ValueError:
+                pass
+
+            retry_after = headers.get("Retry-After")
+            if status_code in (403, 429) and (retry_after is not None or quota.remaining == 0 or status_code == 429 or secondary_limited):
+                if retry_after is not None and retry_after.isdigit():
+                    backoff = float(retry_after)
+                elif quota.remaining == 0 and quota.reset_at > now:
+                    backoff = quota.reset_at - now + 1
+                else:
+                    backoff = float(GITHUB_SECONDARY_LIMIT_BACKOFF_SECONDS)
+                quota.blocked_until = max(quota.blocked_until, now + backoff)
+                self._stats["rate_limited"] += 1
+            self._condition.notify_all()
+        return backoff
+
+    def record_retry(self):
+        with self._condition:
+            self._stats["retries"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._condition:
+            tokens = {
+                key: {
+                    "limit": quota.limit,
+                    "remaining": quota.remaining,
+                    "reset_in_seconds": round(max(0.0, quota.reset_at - now), 1) if quota.reset_at else None,
+                    "blocked_for_seconds": round(max(0.0, quota.blocked_until - now), 1),
+                    "waiting_interactive": quota.waiting[GITHUB_PRIORITY_INTERACTIVE],
+                    "waiting_bulk": quota.waiting[GITHUB_PRIORITY_BULK],
+                }
+                for key, quota in self._quotas.items()
+            }
+            return {
+                "enabled": GITHUB_RATE_LIMIT_ENABLED,
+                "requests": self._stats["requests"],
+                "delayed": self._stats["delayed"],
+                "wait_seconds": round(self._stats["wait_seconds"], 3),
+                "rate_limited": self._stats["rate_limited"],
+                "retries": self._stats["retries"],
+                "rejected": self._stats["rejected"],
+                "bulk_quota_reserve": GITHUB_BULK_QUOTA_RESERVE,
+                "tokens": tokens,
+            }
+
+
+github_rate_limiter = GitHubRateLimiter()
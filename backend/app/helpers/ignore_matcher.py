@@ -0,0 +1,152 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Tuple, Callable, Iterable
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+CODEREVIEWIGNORE_PATH = ".codereviewignore"
+# Compiled .codereviewignore matchers kept in memory, keyed by (repo, head SHA).
+IGNORE_MATCHER_CACHE_MAX_SIZE = int(os.getenv("IGNORE_MATCHER_CACHE_MAX_SIZE", 512))
+
+# Files that are never worth an LLM review (assets, lock files, secrets, boilerplate).
+DEFAULT_IGNORE_PATTERNS = [
+    "*.svg", "*.png", "*.jpg", "*.jpeg", "*.gif", "*.ico",
+    "readme.md",
+    "*.lock", "package-lock.json",
+    "*.env",
+    "*.tfvars",
+    "*.log",
+    "license",
+    ".gitignore",
+]
+
+
+def _glob_to_regex(pattern: str, files_only: bool = False) -> Optional[str]:
+    """Translates one gitignore-style pattern into a regex matching repo-relative paths.
+
+    Patterns without a slash match a file or directory name at any depth, patterns with a slash (or a
+    leading one) are anchored at the repo root, a trailing slash only matches directories, "**" spans
+    directories and "*" / "?" stay within one path segment. With files_only the pattern must match
+    the file itself, never a directory above it.
+    """
+    directory_only = pattern.endswith("/")
+    pattern = pattern.strip("/") if directory_only else pattern
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    if not pattern:
+        return None
+
+    regex_parts: List[str] = []
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        if pattern.startswith("**/", idx):
+            regex_parts.append("(?:.*/)?")
+            idx += 3
+            continue
+        if pattern.startswith("**", idx):
+            regex_parts.append(".*")
+            idx += 2
+            continue
+        if char == "*":
+            regex_parts.append("[^/]*")
+        elif char == "?":
+            regex_parts.append("[^/]")
+        elif char == "[":
+            closing = pattern.find("]", idx + 1)
+            if closing == -1:
+                regex_parts.append(re.escape(char))
+            else:
+                regex_parts.append("[" + pattern[idx + 1:closing].replace("!", "^", 1) + "]")
+                idx = closing
+        else:
+            regex_parts.append(re.escape(char))
+        idx += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    # A matching directory ignores everything below it; a file pattern may also name a directory.
+    if files_only:
+        suffix = ""
+    else:
+        suffix = "/.*" if directory_only else "(?:/.*)?"
+    return f"{prefix}{''.join(regex_parts)}{suffix}"
+
+
+class IgnoreMatcher:
+    """Decides which changed files are left out of a review, from gitignore-style patterns.
+
+    All patterns are compiled into one regex (plus one for "!" negations, which always win over
+    ignores), so checking a path costs a single match however many patterns there are.
+    files_only restricts patterns to file names, as the built-in defaults need: "license" must not
+    skip everything in a license/ package.
+    """
+
+    def __init__(self, patterns: Iterable[str], case_sensitive: bool = False, parent: Optional["IgnoreMatcher"] = None,
+                 files_only: bool = False):
+        self.patterns: List[str] = []
+        ignore_regexes: List[str] = []
+        negate_regexes: List[str] = []
+        for raw_pattern in patterns:
+            pattern = raw_pattern.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            regex = _glob_to_regex(pattern[1:] if negated else pattern, files_only)
+            if regex is None:
+                continue
+            self.patterns.append(pattern)
+            (negate_regexes if negated else ignore_regexes).append(regex)
+        flags = 0 if case_sensitive else re.IGNORECASE
+        self._ignore = re.compile("|".join(ignore_regexes), flags) if ignore_regexes else None
+        self._negate = re.compile("|".join(negate_regexes), flags) if negate_regexes else None
+        self.parent = parent
+
+    @classmethod
+    def from_text(cls, text: str, parent: Optional["IgnoreMatcher"] = None) -> "IgnoreMatcher":
+        """Builds a matcher from .codereviewignore content (gitignore syntax, case sensitive)."""
+        return cls(text.splitlines(), case_sensitive=True, parent=parent)
+
+    def matches(self, path: str) -> bool:
+        path = path.lstrip("/")
+        if self._negate is not None and self._negate.fullmatch(path):
+            return False
+        if self._ignore is not None and self._ignore.fullmatch(path):
+            return True
+        return self.parent.matches(path) if self.parent is not None else False
+
+
+DEFAULT_IGNORE_MATCHER = IgnoreMatcher(DEFAULT_IGNORE_PATTERNS, files_only=True)
+
+_repo_matchers: "OrderedDict[Tuple[str, str], IgnoreMatcher]" = OrderedDict()
+_repo_matchers_lock = threading.Lock()
+
+
+def get_repo_ignore_matcher(repo_full_name: str, head_sha: str, fetch_ignore_file: Callable[[], Optional[str]]) -> IgnoreMatcher:
+    """Returns the matcher for a repo at head_sha: the defaults plus the repo's .codereviewignore.
+
+    fetch_ignore_file returns the file's text, None if the repo has none, or raises if it could not
+    be read; only the first two outcomes are cached, since a file at a given commit never changes.
+    """
+    cache_key = (repo_full_name, head_sha)
+    with _repo_matchers_lock:
+        matcher = _repo_matchers.get(cache_key)
+        if matcher is not None:
+            _repo_matchers.move_to_end(cache_key)
+            return matcher
+    try:
+        ignore_text = fetch_ignore_file()
+    except Exception as e_fetch:
+        print(f"WARNING: Could not read {CODEREVIEWIGNORE_PATH} for {repo_full_name}@{head_sha[:7]}, using default ignore patterns: {e_fetch}")
+        return DEFAULT_IGNORE_MATCHER
+    matcher = IgnoreMatcher.from_text(ignore_text, parent=DEFAULT_IGNORE_MATCHER) if ignore_text else DEFAULT_IGNORE_MATCHER
+    if ignore_text:
+        print(f"INFO: Loaded {len(matcher.patterns)} pattern(s) from {CODEREVIEWIGNORE_PATH} for {repo_full_name}@{head_sha[:7]}.")
+    with _repo_matchers_lock:
+        _repo_matchers[cache_key] = matcher
+        while len(_repo_matchers) > IGNORE_MATCHER_CACHE_MAX_SIZE:
+            _repo_matchers.popitem(last=False)
+    return matcher
@@ -0,0 +1,181 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any, Callable, Awaitable
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# Attempts after the first one for timeouts, network errors and 429/5xx answers.
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", 1.0))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", 30.0))
+# Upper bound for one LLM call including all retries and backoff.
+LLM_CALL_DEADLINE_SECONDS = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", 180))
+# Hedging sends a duplicate request when the first one is slower than the observed p95 latency.
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", 2.0))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", 200))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when an LLM call (with its retries) does not finish within its deadline."""
+
+
+def _retry_after_seconds(response: Optional[httpx.Response]) -> Optional[float]:
+    if response is None:
+        return None
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return None
+    if retry_after.strip().isdigit():
+        return float(retry_after)
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMCallPolicy:
+    """Retries, deadline and optional hedging around one LLM HTTP request.
+
+    send() makes one request and returns the httpx.Response. Failures worth repeating (timeouts, network
+    errors, 408/429/5xx) are retried with full-jitter exponential backoff, or after Retry-After when
+    the API sends it. Other responses, including other error statuses, are returned to the caller.
+    Responses that are retried or lose a hedge are closed, so send() may also open a streamed response.
+    """
+
+    def __init__(self):
+        self._latencies: deque = deque(maxlen=LLM_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0, "failures": 0}
+
+    def _bump(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _record_latency(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def p95_latency(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    @staticmethod
+    def _backoff_seconds(attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = _retry_after_seconds(response)
+        if retry_after is not None:
+            return min(retry_after, LLM_RETRY_MAX_DELAY_SECONDS)
+        return random.uniform(0, min(LLM_RETRY_MAX_DELAY_SECONDS, LLM_RETRY_BASE_DELAY_SECONDS * (2 ** attempt)))
+
+    async def _timed_send(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        started = time.monotonic()
+        response = await send()
+        if response.status_code < 400:
+            self._record_latency(time.monotonic() - started)
+        return response
+
+    async def _send_hedged(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        hedge_delay = self.p95_latency() if LLM_HEDGING_ENABLED else None
+        if hedge_delay is None:
+            return await self._timed_send(send)
+
+        primary = asyncio.create_task(self._timed_send(send))
+        pending = {primary}
+        first_error: Optional[BaseException] = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=max(hedge_delay, LLM_HEDGE_MIN_DELAY_SECONDS))
+            if not done:
+                self._bump("hedges")
+                hedge = asyncio.create_task(self._timed_send(send))
+                pending.add(hedge)
+            while True:
+                for task in done:
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                        continue
+                    response = task.result()
+                    # A retryable answer from one request is only used if the other one fails too.
+                    if response.status_code in RETRYABLE_STATUS_CODES and pending:
+                        await response.aclose()
+                        continue
+                    if task is not primary:
+                        self._bump("hedge_wins")
+                    return response
+                if not pending:
+                    raise first_error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call_with_retries(self, send: Callable[[], Awaitable[httpx.Response]], deadline: float) -> httpx.Response:
+        attempt = 0
+        while True:
+            response: Optional[httpx.Response] = None
+            try:
+                response = await self._send_hedged(send)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == LLM_MAX_RETRIES:
+                    return response
+                failure = f"HTTP {response.status_code}"
+            except httpx.TransportError as e_send:
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                failure = repr(e_send)
+            backoff = self._backoff_seconds(attempt, response)
+            if time.monotonic() + backoff >= deadline:
+                print(f"WARNING: LLM call failed ({failure}); the deadline leaves no time for another attempt.")
+                if response is not None:
+                    return response
+                raise LLMDeadlineExceeded(f"LLM call failed ({failure}) and the deadline leaves no time to retry.")
+            if response is not None:
+                # Frees the connection of a streamed response (send(..., stream=True)) before retrying.
+                await response.aclose()
+            attempt += 1
+            print(f"WARNING: LLM call failed ({failure}). Retrying in {backoff:.1f}s (attempt {attempt}/{LLM_MAX_RETRIES}).")
+            self._bump("retries")
+            await asyncio.sleep(backoff)
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]], deadline_seconds: float = LLM_CALL_DEADLINE_SECONDS) -> httpx.Response:
+        """Runs send under the retry policy. Raises LLMDeadlineExceeded when deadline_seconds runs out."""
+        self._bump("calls")
+        deadline = time.monotonic() + deadline_seconds
+        try:
+            return await asyncio.wait_for(self._call_with_retries(send, deadline), timeout=deadline_seconds)
+        except asyncio.TimeoutError as e_deadline:
+            self._bump("deadline_exceeded")
+            raise LLMDeadlineExceeded(f"LLM call did not finish within {deadline_seconds:.0f}s.") from e_deadline
+        except LLMDeadlineExceeded:
+            self._bump("deadline_exceeded")
+            raise
+        except Exception:
+            self._bump("failures")
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        p95 = self.p95_latency()
+        with self._lock:
+            return {
+                **self._stats,
+                "latency_samples": len(self._latencies),
+                "p95_latency_seconds": round(p95, 3) if p95 is not None else None,
+                "hedging_enabled": LLM_HEDGING_ENABLED,
+                "max_retries": LLM_MAX_RETRIES,
+                "deadline_seconds": LLM_CALL_DEADLINE_SECONDS,
+            }
+
+
+llm_call_policy = LLMCallPolicy()
@@ -0,0 +1,319 @@
+import os
+import copy
+import time
+import hashlib
+import asyncio
+import threading
+import traceback
+import importlib.util
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+
+from dotenv import load_dotenv
+
+from app.helpers.prompt_budget import estimate_tokens, get_token_budget
+
+load_dotenv(override=True)
+
+LOCAL_LLM_ENABLED = os.getenv("LOCAL_LLM_ENABLED", "false").lower() == "true"
+LOCAL_LLM_MODEL_NAME = os.getenv("LOCAL_LLM_MODEL_NAME", "codellama/CodeLlama-7b-Instruct-hf")
+LOCAL_LLM_MAX_NEW_TOKENS = int(os.getenv("LOCAL_LLM_MAX_NEW_TOKENS", 1024))
+# The local model is only offered prompts up to this size (CPU inference slows down sharply with length).
+LOCAL_LLM_MAX_PROMPT_TOKENS = int(os.getenv("LOCAL_LLM_MAX_PROMPT_TOKENS", 4000))
+LOCAL_LLM_CONCURRENCY = max(1, int(os.getenv("LOCAL_LLM_CONCURRENCY", 1)))
+# Attention key/values of the static review instructions are computed once and kept on disk here.
+LOCAL_LLM_PREFIX_CACHE_ENABLED = os.getenv("LOCAL_LLM_PREFIX_CACHE_ENABLED", "true").lower() == "true"
+LOCAL_LLM_PREFIX_CACHE_DIR = os.getenv("LOCAL_LLM_PREFIX_CACHE_DIR", "/tmp/codereview-llm-prefix-cache")
+
+# Latency assumed for a backend until it has LLM_ROUTER_MIN_SAMPLES real measurements.
+LLM_ROUTER_REMOTE_PRIOR_SECONDS = float(os.getenv("LLM_ROUTER_REMOTE_PRIOR_SECONDS", 15))
+LLM_ROUTER_LOCAL_PRIOR_SECONDS = float(os.getenv("LLM_ROUTER_LOCAL_PRIOR_SECONDS", 60))
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", 5))
+LLM_ROUTER_LATENCY_WINDOW = int(os.getenv("LLM_ROUTER_LATENCY_WINDOW", 200))
+# Consecutive failures after which a backend is skipped for the cooldown period.
+LLM_ROUTER_FAILURE_THRESHOLD = int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", 3))
+LLM_ROUTER_COOLDOWN_SECONDS = float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", 60))
+
+
+class LLMBackend:
+    """One way of turning a prompt into a review, plus the load and latency the router tracks for it."""
+
+    def __init__(self, name: str, model_id: str, generate: Callable[[str], Awaitable[str]],
+                 max_prompt_tokens: int, concurrency: int, prior_latency_seconds: float):
+        self.name = name
+        self.model_id = model_id
+        self._generate = generate
+        self.max_prompt_tokens = max_prompt_tokens
+        self.concurrency = concurrency
+        self.prior_latency_seconds = prior_latency_seconds
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.latencies: deque = deque(maxlen=LLM_ROUTER_LATENCY_WINDOW)
+
+    def is_available(self) -> bool:
+        return True
+
+    def is_healthy(self) -> bool:
+        return self.is_available() and time.monotonic() >= self.unhealthy_until
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        if len(self.latencies) < LLM_ROUTER_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+    def estimated_seconds(self) -> float:
+        """Expected time to answer a new request: p50 latency scaled by how many requests are ahead of it."""
+        p50 = self.latency_percentile(0.5)
+        return (p50 if p50 is not None else self.prior_latency_seconds) * (1 + self.inflight / self.concurrency)
+
+    async def generate(self, prompt: str) -> str:
+        return await self._generate(prompt)
+
+
+class LocalCodeLlamaBackend(LLMBackend):
+    """CodeLlama run in-process with transformers. The model is loaded on first use, not at import."""
+
+    def __init__(self):
+        super().__init__("local", LOCAL_LLM_MODEL_NAME, self._generate_local, LOCAL_LLM_MAX_PROMPT_TOKENS,
+                         LOCAL_LLM_CONCURRENCY, LLM_ROUTER_LOCAL_PRIOR_SECONDS)
+        self._tokenizer = None
+        self._model = None
+        self._device = "cpu"
+        self._load_lock = threading.Lock()
+        self._load_failed = False
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._prompt_prefix: Optional[str] = None
+        self._prefix_ids = None
+        self._prefix_cache = None
+        self._prefix_stats = {"hits": 0, "misses": 0, "loaded_from_disk": 0, "computed": 0}
+
+    def set_prompt_prefix(self, prefix: str):
+        """Declares the instruction text most prompts start with, so its key/values can be reused."""
+        with self._load_lock:
+            if prefix != self._prompt_prefix:
+                self._prompt_prefix, self._prefix_ids, self._prefix_cache = prefix, None, None
+
+    def is_available(self) -> bool:
+        return LOCAL_LLM_ENABLED and not self._load_failed and importlib.util.find_spec("transformers") is not None
+
+    def _ensure_loaded(self):
+        with self._load_lock:
+            if self._model is not None:
+                return
+            try:
+                import torch
+                from transformers import AutoTokenizer, AutoModelForCausalLM
+                self._device = "cuda" if torch.cuda.is_available() else "cpu"
+                print(f"INFO: Loading local model {LOCAL_LLM_MODEL_NAME} on {self._device}...")
+                tokenizer = AutoTokenizer.from_pretrained(LOCAL_LLM_MODEL_NAME, padding_side="left")
+                tokenizer.pad_token = tokenizer.eos_token
+                model = AutoModelForCausalLM.from_pretrained(
+                    LOCAL_LLM_MODEL_NAME,
+                    torch_dtype=torch.float16 if self._device == "cuda" else torch.float32,
+                    device_map={"": self._device},
+                )
+                model.eval()
+                self._tokenizer, self._model = tokenizer, model
+                print(f"INFO: Local model {LOCAL_LLM_MODEL_NAME} loaded.")
+            except Exception as e_load:
+                self._load_failed = True
+                print(f"ERROR: Could not load local model {LOCAL_LLM_MODEL_NAME}, disabling the local backend: {type(e_load).__name__} - {e_load}")
+                traceback.print_exc()
+                raise
+
+    def _prefix_cache_path(self, prefix_text: str) -> str:
+        import torch
+        key = hashlib.sha256(f"{LOCAL_LLM_MODEL_NAME}\n{self._model.dtype}\n{torch.__version__}\n{prefix_text}".encode("utf-8")).hexdigest()[:24]
+        return os.path.join(LOCAL_LLM_PREFIX_CACHE_DIR, f"{key}.pt")
+
+    def _ensure_prefix_cache(self):
+        """Loads the prefix key/values from disk, or computes and saves them. Failures only disable reuse."""
+        with self._load_lock:
+            if self._prefix_cache is not None or not self._prompt_prefix or not LOCAL_LLM_PREFIX_CACHE_ENABLED:
+                return
+            try:
+                import torch
+                from transformers import DynamicCache
+                prefix_text = f"[INST] {self._prompt_prefix.lstrip()}"
+                prefix_ids = self._tokenizer(prefix_text, return_tensors="pt")["input_ids"].to(self._device)
+                cache_path = self._prefix_cache_path(prefix_text)
+                prefix_cache = None
+                if os.path.exists(cache_path):
+                    try:
+                        saved = torch.load(cache_path, map_location=self._device, weights_only=True)
+                        if torch.equal(saved["input_ids"], prefix_ids):
+                            prefix_cache = DynamicCache.from_legacy_cache(saved["key_values"])
+                            self._prefix_stats["loaded_from_disk"] += 1
+                    except Exception as e_read:
+                        print(f"WARNING: Ignoring unreadable local prefix cache {cache_path}: {e_read}")
+                if prefix_cache is None:
+                    prefix_cache = DynamicCache()
+                    with torch.inference_mode():
+                        self._model(input_ids=prefix_ids, past_key_values=prefix_cache, use_cache=True)
+                    self._prefix_stats["computed"] += 1
+                    try:
+                        os.makedirs(LOCAL_LLM_PREFIX_CACHE_DIR, exist_ok=True)
+                        temp_path = f"{cache_path}.tmp"
+                        torch.save({"input_ids": prefix_ids.cpu(), "key_values": tuple(
+                            (key.cpu(), value.cpu()) for key, value in prefix_cache.to_legacy_cache()
+                        )}, temp_path)
+                        os.replace(temp_path, cache_path)
+                    except Exception as e_write:
+                        print(f"WARNING: Could not persist local prefix cache to {cache_path}: {e_write}")
+                self._prefix_ids, self._prefix_cache = prefix_ids, prefix_cache
+                print(f"INFO: Local prefix cache ready ({prefix_ids.shape[1]} tokens).")
+            except Exception as e_prefix:
+                print(f"WARNING: Local prefix cache unavailable, prompts are processed in full: {type(e_prefix).__name__} - {e_prefix}")
+                self._prompt_prefix = None
+
+    def generate_sync(self, prompt: str) -> str:
+        self._ensure_loaded()
+        import torch
+        # CodeLlama-Instruct expects the instruction wrapped in [INST] ... [/INST].
+        inputs = self._tokenizer(f"[INST] {prompt.strip()} [/INST]", return_tensors="pt").to(self._device)
+        self._ensure_prefix_cache()
+        past_key_values = None
+        prefix_ids = self._prefix_ids
+        if prefix_ids is not None:
+            prefix_length = prefix_ids.shape[1]
+            # Reuse only when the prompt tokenizes to exactly the cached prefix (plus at least one more token).
+            if inputs["input_ids"].shape[1] > prefix_length and torch.equal(inputs["input_ids"][:, :prefix_length], prefix_ids):
+                past_key_values = copy.deepcopy(self._prefix_cache)
+            self._prefix_stats["hits" if past_key_values is not None else "misses"] += 1
+        with torch.inference_mode():
+            output = self._model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs.get("attention_mask"),
+                past_key_values=past_key_values,
+                max_new_tokens=LOCAL_LLM_MAX_NEW_TOKENS,
+                temperature=0.7,
+                top_p=0.9,
+                do_sample=True,
+                repetition_penalty=1.2,
+                eos_token_id=self._tokenizer.eos_token_id,
+            )
+        # Only the generated continuation, not the echoed prompt.
+        return self._tokenizer.decode(output[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True).strip()
+
+    def get_prefix_cache_stats(self) -> Dict[str, Any]:
+        return {
+            **self._prefix_stats,
+            "enabled": LOCAL_LLM_PREFIX_CACHE_ENABLED,
+            "prefix_tokens": self._prefix_ids.shape[1] if self._prefix_ids is not None else None,
+        }
+
+    async def _generate_local(self, prompt: str) -> str:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        async with self._slots:
+            return await asyncio.to_thread(self.generate_sync, prompt)
+
+
+class LLMRouter:
+    """Sends each review prompt to the backend expected to answer first, failing over to the others.
+
+    Backends that cannot take the prompt (over their token limit), are unavailable or are cooling
+    down after repeated failures are skipped. The rest are ranked by p50 latency scaled by their
+    current queue depth; on an error the next one is tried.
+    """
+
+    def __init__(self):
+        self.backends: Dict[str, LLMBackend] = {}
+        self._lock = threading.Lock()
+        self._decisions: Dict[str, int] = {}
+        self._failovers = 0
+
+    def register(self, backend: LLMBackend):
+        with self._lock:
+            self.backends.setdefault(backend.name, backend)
+
+    def register_remote(self, model_id: str, generate: Callable[[str], Awaitable[str]], concurrency: int):
+        """Registers the remote API backend once per process (every LLM instance shares it)."""
+        if "remote" not in self.backends:
+            self.register(LLMBackend("remote", model_id, generate, get_token_budget(model_id), concurrency, LLM_ROUTER_REMOTE_PRIOR_SECONDS))
+
+    def rank_backends(self, prompt: str) -> List[LLMBackend]:
+        prompt_tokens = estimate_tokens(prompt)
+        with self._lock:
+            candidates = [
+                backend for backend in self.backends.values()
+                if backend.is_healthy() and prompt_tokens <= backend.max_prompt_tokens
+            ]
+        return sorted(candidates, key=lambda backend: backend.estimated_seconds())
+
+    async def generate(self, prompt: str) -> Tuple[str, LLMBackend]:
+        """Returns (review text, backend that produced it). Raises the last error if every backend failed."""
+        ranked = self.rank_backends(prompt)
+        if not ranked:
+            # Nothing is healthy: still give the remote API (or whatever is registered) a chance.
+            ranked = [backend for backend in self.backends.values() if backend.is_available()][:1]
+        if not ranked:
+            raise RuntimeError("No LLM backend is available.")
+
+        last_error: Optional[BaseException] = None
+        for position, backend in enumerate(ranked):
+            with self._lock:
+                decision = backend.name if position == 0 else f"{backend.name}:failover"
+                self._decisions[decision] = self._decisions.get(decision, 0) + 1
+                if position > 0:
+                    self._failovers += 1
+                backend.inflight += 1
+                backend.requests += 1
+            started = time.monotonic()
+            try:
+                review_text = await backend.generate(prompt)
+            except Exception as e_backend:
+                last_error = e_backend
+                with self._lock:
+                    backend.failures += 1
+                    backend.consecutive_failures += 1
+                    if backend.consecutive_failures >= LLM_ROUTER_FAILURE_THRESHOLD:
+                        backend.unhealthy_until = time.monotonic() + LLM_ROUTER_COOLDOWN_SECONDS
+                print(f"WARNING: LLM backend '{backend.name}' failed: {type(e_backend).__name__} - {e_backend}")
+                if not _is_retryable_elsewhere(e_backend):
+                    raise
+                continue
+            finally:
+                with self._lock:
+                    backend.inflight -= 1
+            with self._lock:
+                backend.latencies.append(time.monotonic() - started)
+                backend.consecutive_failures = 0
+                backend.unhealthy_until = 0.0
+            return review_text, backend
+        raise last_error
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            backends = {}
+            for name, backend in self.backends.items():
+                p50 = backend.latency_percentile(0.5)
+                p95 = backend.latency_percentile(0.95)
+                backends[name] = {
+                    "model_id": backend.model_id,
+                    "available": backend.is_available(),
+                    "healthy": backend.is_healthy(),
+                    "inflight": backend.inflight,
+                    "requests": backend.requests,
+                    "failures": backend.failures,
+                    "p50_latency_seconds": round(p50, 3) if p50 is not None else None,
+                    "p95_latency_seconds": round(p95, 3) if p95 is not None else None,
+                    "estimated_seconds": round(backend.estimated_seconds(), 3),
+                    "max_prompt_tokens": backend.max_prompt_tokens,
+                }
+            return {"decisions": dict(self._decisions), "failovers": self._failovers, "backends": backends}
+
+
+def _is_retryable_elsewhere(error: BaseException) -> bool:
+    """Errors caused by the prompt itself (bad request, safety block) would fail on any backend."""
+    status_code = getattr(error, "status_code", None)
+    return not (isinstance(status_code, int) and status_code in (400, 413))
+
+
+local_codellama_backend = LocalCodeLlamaBackend()
+llm_router = LLMRouter()
+llm_router.register(local_codellama_backend)
@@ -0,0 +1,180 @@
+import os
+import time
+import asyncio
+import traceback
+from typing import Optional, Dict
+
+import redis
+from dotenv import load_dotenv
+
+from app.helpers.github_helper import GitHubHelper, get_github_helper
+from app.helpers.github_rate_limit import set_github_request_priority, GITHUB_PRIORITY_BULK
+
+load_dotenv(override=True)
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB_PROJECTS = int(os.getenv("REDIS_DB_PROJECTS", 2))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+
+BOT_GITHUB_PERMANENT_TOKEN = os.getenv("BOT_GITHUB_PERMANENT_TOKEN")
+
+PR_COUNTERS_RECONCILE_INTERVAL_SECONDS = int(os.getenv("PR_COUNTERS_RECONCILE_INTERVAL_SECONDS", 6 * 3600))
+PR_COUNTERS_RECONCILE_POLL_SECONDS = int(os.getenv("PR_COUNTERS_RECONCILE_POLL_SECONDS", 300))
+# Repos reconciled per poll, so that a large backlog is spread out instead of bursting.
+PR_COUNTERS_RECONCILE_BATCH = max(1, int(os.getenv("PR_COUNTERS_RECONCILE_BATCH", 20)))
+
+PR_COUNTER_STATES = ("open", "merged", "closed")
+PR_COUNTER_ACTIONS = ("opened", "reopened", "closed")
+PR_COUNTERS_KEY_PREFIX = "pr_counters:counts:"
+PR_STATES_KEY_PREFIX = "pr_counters:states:"
+PR_COUNTERS_RECONCILED_KEY = "pr_counters:reconciled_at"
+
+redis_client_pr_counters = redis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB_PROJECTS,
+    decode_responses=True,
+    password=REDIS_PASSWORD
+)
+
+# Moves one pull request to a new state and adjusts the repo counters in the same step.
+# The per-PR entry ("updated_at|state") makes redeliveries no-ops and drops events older than the
+# last one applied (GitHub does not guarantee delivery order). Without an entry, the previous state
+# implied by the action is used. Counters are only adjusted once a reconciliation has set a baseline.
+# KEYS[1] = counters hash, KEYS[2] = per-PR state hash
+# ARGV = pull number, new state, implied previous state ('' for none), updated_at
+# Returns 1 if counters changed, 0 if the event was a duplicate or stale, -1 if there is no baseline yet.
+_APPLY_TRANSITION_SCRIPT = """
+local current = redis.call('HGET', KEYS[2], ARGV[1])
+local old_state = false
+if current then
+    local separator = string.find(current, '|', 1, true)
+    local current_updated_at = string.sub(current, 1, separator - 1)
+    old_state = string.sub(current, separator + 1)
+    if old_state == ARGV[2] or ARGV[4] < current_updated_at then
+        return 0
+    end
+elseif ARGV[3] ~= '' then
+    old_state = ARGV[3]
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[4] .. '|' .. ARGV[2])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+if old_state then
+    redis.call('HINCRBY', KEYS[1], old_state, -1)
+end
+redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+return 1
+"""
+
+# state after the action, and the state the PR must have been in before it
+_ACTION_TRANSITIONS = {
+    "opened": ("open", ""),
+    "reopened": ("open", "closed"),
+}
+
+
+def _counters_key(repo_full_name: str) -> str:
+    return f"{PR_COUNTERS_KEY_PREFIX}{repo_full_name}"
+
+
+def _states_key(repo_full_name: str) -> str:
+    return f"{PR_STATES_KEY_PREFIX}{repo_full_name}"
+
+
+def apply_pull_request_event(repo_full_name: str, pull_number: int, action: str, merged: bool, updated_at: Optional[str]) -> int:
+    """Updates the counters for an opened, reopened or closed pull_request event. Other actions are ignored."""
+    if action == "closed":
+        new_state, implied_previous = ("merged" if merged else "closed"), "open"
+    elif action in _ACTION_TRANSITIONS:
+        new_state, implied_previous = _ACTION_TRANSITIONS[action]
+    else:
+        return 0
+    result = redis_client_pr_counters.eval(
+        _APPLY_TRANSITION_SCRIPT, 2, _counters_key(repo_full_name), _states_key(repo_full_name),
+        pull_number, new_state, implied_previous, updated_at or ""
+    )
+    if result == 1:
+        print(f"INFO: PR counters for {repo_full_name}: #{pull_number} -> {new_state} ({action}).")
+    return int(result)
+
+
+def get_pr_counters(repo_full_name: str) -> Optional[Dict[str, int]]:
+    """Returns {"open", "merged", "closed"} from Redis, or None if the repo was never reconciled."""
+    counts = redis_client_pr_counters.hgetall(_counters_key(repo_full_name))
+    if not counts:
+        return None
+    return {state: max(0, int(counts.get(state, 0))) for state in PR_COUNTER_STATES}
+
+
+def reconcile_pr_counters(helper: GitHubHelper, repo_full_name: str) -> Dict[str, int]:
+    """Replaces the counters with live totals from GitHub and records when that happened."""
+    counts = helper.get_pull_request_counts(repo_full_name)
+    with redis_client_pr_counters.pipeline(transaction=True) as pipe:
+        pipe.delete(_counters_key(repo_full_name))
+        pipe.hset(_counters_key(repo_full_name), mapping=counts)
+        pipe.zadd(PR_COUNTERS_RECONCILED_KEY, {repo_full_name: time.time()})
+        pipe.execute()
+    return counts
+
+
+class PRCounterReconciler:
+    """Periodically re-reads live pull request totals to correct counter drift (missed webhooks etc.)."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    async def start(self):
+        if self._running:
+            return
+        if not BOT_GITHUB_PERMANENT_TOKEN:
+            print("WARNING: BOT_GITHUB_PERMANENT_TOKEN is not set. PR counter reconciliation is disabled.")
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._reconcile_loop())
+        print(f"INFO: PR counter reconciler started (every {PR_COUNTERS_RECONCILE_INTERVAL_SECONDS}s per repo).")
+
+    async def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _reconcile_loop(self):
+        set_github_request_priority(GITHUB_PRIORITY_BULK)
+        while self._running:
+            try:
+                await self.reconcile_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e_reconcile:
+                print(f"ERROR: PR counter reconciliation failed: {type(e_reconcile).__name__} - {e_reconcile}")
+                traceback.print_exc()
+            await asyncio.sleep(PR_COUNTERS_RECONCILE_POLL_SECONDS)
+
+    async def reconcile_due(self) -> int:
+        due_before = time.time() - PR_COUNTERS_RECONCILE_INTERVAL_SECONDS
+        due_repos = await asyncio.to_thread(
+            redis_client_pr_counters.zrangebyscore, PR_COUNTERS_RECONCILED_KEY, "-inf", due_before, 0, PR_COUNTERS_RECONCILE_BATCH
+        )
+        if not due_repos:
+            return 0
+        bot_helper = await asyncio.to_thread(get_github_helper, BOT_GITHUB_PERMANENT_TOKEN)
+        reconciled = 0
+        for repo_full_name in due_repos:
+            try:
+                await asyncio.to_thread(reconcile_pr_counters, bot_helper, repo_full_name)
+                reconciled += 1
+            except (RuntimeError, redis.exceptions.RedisError) as e_repo:
+                print(f"WARNING: Could not reconcile PR counters for {repo_full_name}: {e_repo}")
+                # Try again next interval rather than on every poll.
+                await asyncio.to_thread(redis_client_pr_counters.zadd, PR_COUNTERS_RECONCILED_KEY, {repo_full_name: time.time()})
+        print(f"INFO: Reconciled PR counters for {reconciled}/{len(due_repos)} repo(s).")
+        return reconciled
+
+
+pr_counter_reconciler = PRCounterReconciler()
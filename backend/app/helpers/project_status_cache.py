@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Callable
+
+import redis
+from dotenv import load_dotenv
+
+from app.helpers.github_helper import GitHubHelper, peek_github_helper, token_cache_key
+from app.helpers.github_rate_limit import set_github_request_priority, GITHUB_PRIORITY_BULK
+
+load_dotenv(override=True)
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB_PROJECTS = int(os.getenv("REDIS_DB_PROJECTS", 2))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+
+# Statuses younger than this are served as fresh; older ones are served marked stale until the
+# sweeper (or the next live check) refreshes them. Beyond the max age they are recomputed inline.
+PROJECT_STATUS_TTL_SECONDS = int(os.getenv("PROJECT_STATUS_TTL_SECONDS", 15 * 60))
+PROJECT_STATUS_MAX_STALE_SECONDS = int(os.getenv("PROJECT_STATUS_MAX_STALE_SECONDS", 24 * 3600))
+PROJECT_STATUS_SWEEP_INTERVAL_SECONDS = int(os.getenv("PROJECT_STATUS_SWEEP_INTERVAL_SECONDS", 60))
+PROJECT_STATUS_SWEEP_CONCURRENCY = max(1, int(os.getenv("PROJECT_STATUS_SWEEP_CONCURRENCY", 4)))
+PROJECT_STATUS_MAX_TRACKED_REPOS = int(os.getenv("PROJECT_STATUS_MAX_TRACKED_REPOS", 10000))
+
+PROJECT_STATUS_CACHE_KEY = "project_status_cache"
+
+redis_client_project_status = redis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB_PROJECTS,
+    decode_responses=True,
+    password=REDIS_PASSWORD
+)
+
+
+def get_cached_project_statuses(repo_full_names: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Reads cached statuses with one HMGET.
+
+    Each hit is {"status": {...}, "checked_at": epoch, "stale": bool}. Misses, entries older than
+    PROJECT_STATUS_MAX_STALE_SECONDS and Redis errors map to None.
+    """
+    cached: Dict[str, Optional[Dict[str, Any]]] = {name: None for name in repo_full_names}
+    if not repo_full_names:
+        return cached
+    try:
+        raw_entries = redis_client_project_status.hmget(PROJECT_STATUS_CACHE_KEY, repo_full_names)
+    except redis.exceptions.RedisError as e_redis:
+        print(f"WARNING: Project status cache lookup failed, checking GitHub live: {e_redis}")
+        return cached
+    now = time.time()
+    for repo_full_name, raw_entry in zip(repo_full_names, raw_entries):
+        if not raw_entry:
+            continue
+        try:
+            entry = json.loads(raw_entry)
+            age = now - float(entry["checked_at"])
+        except (ValueError, KeyError, TypeError):
+            continue
+        if age > PROJECT_STATUS_MAX_STALE_SECONDS:
+            continue
+        cached[repo_full_name] = {"status": entry["status"], "checked_at": entry["checked_at"], "stale": age > PROJECT_STATUS_TTL_SECONDS}
+    return cached
+
+
+def store_project_statuses(statuses: Dict[str, Dict[str, Any]]):
+    """Stores freshly checked statuses (repo full name -> status dict) with one HSET."""
+    if not statuses:
+        return
+    now = time.time()
+    try:
+        redis_client_project_status.hset(PROJECT_STATUS_CACHE_KEY, mapping={
+            repo_full_name: json.dumps({"status": status, "checked_at": now}) for repo_full_name, status in statuses.items()
+        })
+    except redis.exceptions.RedisError as e_redis:
+        print(f"WARNING: Could not store {len(statuses)} project status(es) in cache: {e_redis}")
+
+
+def invalidate_project_status(*repo_full_names: str):
+    """Forgets cached statuses so the next dashboard load checks GitHub live."""
+    repo_full_names = tuple(name for name in repo_full_names if name)
+    if not repo_full_names:
+        return
+    try:
+        redis_client_project_status.hdel(PROJECT_STATUS_CACHE_KEY, *repo_full_names)
+        print(f"INFO: Invalidated cached project status for {', '.join(repo_full_names)}.")
+    except redis.exceptions.RedisError as e_redis:
+        print(f"WARNING: Could not invalidate cached project status for {', '.join(repo_full_names)}: {e_redis}")
+
+
+class ProjectStatusSweeper:
+    """Refreshes cached project statuses shortly before they go stale.
+
+    Statuses can only be checked with a token that administers the repo, so the sweeper remembers,
+    per repo, the (hashed) token of the last user who loaded it and reuses that user's helper while it
+    is still in the GitHubHelper cache. Repos without a live helper are left to go stale and are
+    refreshed on the next dashboard load.
+    """
+
+    def __init__(self, determine_status: Callable[[GitHubHelper, str], Optional[Dict[str, Any]]]):
+        """determine_status checks one repo live and returns its status dict, or None if it should not be cached."""
+        self.determine_status = determine_status
+        self._refreshers: "OrderedDict[str, str]" = OrderedDict()
+        self._refreshers_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    def track(self, repo_full_names: List[str], helper: GitHubHelper):
+        helper_key = token_cache_key(helper.token)
+        with self._refreshers_lock:
+            for repo_full_name in repo_full_names:
+                self._refreshers[repo_full_name] = helper_key
+                self._refreshers.move_to_end(repo_full_name)
+            while len(self._refreshers) > PROJECT_STATUS_MAX_TRACKED_REPOS:
+                self._refreshers.popitem(last=False)
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._sweep_loop())
+        print(f"INFO: Project status sweeper started (every {PROJECT_STATUS_SWEEP_INTERVAL_SECONDS}s, TTL {PROJECT_STATUS_TTL_SECONDS}s).")
+
+    async def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sweep_loop(self):
+        set_github_request_priority(GITHUB_PRIORITY_BULK)
+        while self._running:
+            try:
+                refreshed = await self.sweep_once()
+                if refreshed:
+                    print(f"INFO: Project status sweeper refreshed {refreshed} repo(s).")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e_sweep:
+                print(f"ERROR: Project status sweep failed: {type(e_sweep).__name__} - {e_sweep}")
+                traceback.print_exc()
+            await asyncio.sleep(PROJECT_STATUS_SWEEP_INTERVAL_SECONDS)
+
+    async def sweep_once(self) -> int:
+        with self._refreshers_lock:
+            tracked = dict(self._refreshers)
+        if not tracked:
+            return 0
+        cached = await asyncio.to_thread(get_cached_project_statuses, list(tracked))
+        refresh_after = time.time() - max(0, PROJECT_STATUS_TTL_SECONDS - PROJECT_STATUS_SWEEP_INTERVAL_SECONDS)
+        due = [
+            repo_full_name for repo_full_name, entry in cached.items()
+            if entry is not None and float(entry["checked_at"]) <= refresh_after
+        ]
+        sweep_slots = asyncio.Semaphore(PROJECT_STATUS_SWEEP_CONCURRENCY)
+        refreshed: Dict[str, Dict[str, Any]] = {}
+
+        async def refresh(repo_full_name: str):
+            helper = peek_github_helper(tracked[repo_full_name])
+            if helper is None:
+                return
+            async with sweep_slots:
+                status = await asyncio.to_thread(self.determine_status, helper, repo_full_name)
+            if status is not None:
+                refreshed[repo_full_name] = status
+
+        await asyncio.gather(*[refresh(repo_full_name) for repo_full_name in due])
+        await asyncio.to_thread(store_project_statuses, refreshed)
+        return len(refreshed)
@@ -0,0 +1,127 @@
+import os
+import re
+import json
+import math
+from typing import List, Dict, Tuple
+
+from app.helpers.diff_utils import SCOPE_START_PATTERN
+
+# Source code averages a little over three characters per token with the usual BPE tokenizers.
+CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", 3.5))
+LLM_DEFAULT_TOKEN_BUDGET = int(os.getenv("LLM_DEFAULT_TOKEN_BUDGET", 24000))
+
+REGION_HEADER_PATTERN = re.compile(r"^@@ new lines \d+-\d+ @@$")
+NUMBERED_LINE_PATTERN = re.compile(r"^\s*(\d+) [ +]", re.MULTILINE)
+
+
+def _load_token_budgets() -> Dict[str, int]:
+    raw_budgets = os.getenv("LLM_TOKEN_BUDGETS", "")
+    if not raw_budgets:
+        return {}
+    try:
+        return {model_id: int(budget) for model_id, budget in json.loads(raw_budgets).items()}
+    except (ValueError, TypeError, AttributeError) as e_budgets:
+        print(f"WARNING: Ignoring invalid LLM_TOKEN_BUDGETS value ({e_budgets}). Expected a JSON object of model id to token count.")
+        return {}
+
+
+LLM_TOKEN_BUDGETS = _load_token_budgets()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, tokenizer-free estimate of the prompt tokens needed for text."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def get_token_budget(model_id: str) -> int:
+    """Maximum prompt tokens per LLM call for a model (LLM_TOKEN_BUDGETS, else LLM_DEFAULT_TOKEN_BUDGET)."""
+    return LLM_TOKEN_BUDGETS.get(model_id, LLM_DEFAULT_TOKEN_BUDGET)
+
+
+def _pack_segments(segments: List[Tuple[int, int, List[str]]], max_tokens: int) -> List[Tuple[int, int, str]]:
+    """Greedily packs consecutive (start_line, end_line, lines) segments into chunks of at most max_tokens.
+
+    A single segment that is larger than the budget is cut on line boundaries.
+    """
+    chunks: List[Tuple[int, int, str]] = []
+    current_lines: List[str] = []
+    current_start = current_end = 0
+    current_tokens = 0
+
+    def flush():
+        nonlocal current_lines, current_tokens
+        if current_lines:
+            chunks.append((current_start, current_end, "\n".join(current_lines)))
+        current_lines, current_tokens = [], 0
+
+    for start_line, end_line, lines in segments:
+        segment_tokens = estimate_tokens("\n".join(lines))
+        if current_lines and current_tokens + segment_tokens > max_tokens:
+            flush()
+        if segment_tokens <= max_tokens:
+            if not current_lines:
+                current_start = start_line
+            current_lines.extend(lines)
+            current_end = end_line
+            current_tokens += segment_tokens
+            continue
+        for offset, line in enumerate(lines):
+            line_tokens = estimate_tokens(line) + 1
+            if current_lines and current_tokens + line_tokens > max_tokens:
+                flush()
+            if not current_lines:
+                current_start = start_line + offset
+            current_lines.append(line)
+            current_end = start_line + offset
+            current_tokens += line_tokens
+    flush()
+    return chunks
+
+
+def split_code_into_chunks(code: str, max_tokens: int) -> List[Tuple[int, int, str]]:
+    """Splits source code into (start_line, end_line, text) chunks on function and class boundaries."""
+    lines = code.splitlines()
+    if not lines:
+        return []
+    boundary_indents = [len(line) - len(line.lstrip()) for line in lines if SCOPE_START_PATTERN.match(line)]
+    outer_indent = min(boundary_indents) if boundary_indents else None
+
+    segments: List[Tuple[int, int, List[str]]] = []
+    segment_start = 0
+    for index, line in enumerate(lines):
+        is_boundary = (
+            outer_indent is not None and index > segment_start and SCOPE_START_PATTERN.match(line)
+            and len(line) - len(line.lstrip()) == outer_indent
+        )
+        if is_boundary:
+            segments.append((segment_start + 1, index, lines[segment_start:index]))
+            segment_start = index
+    segments.append((segment_start + 1, len(lines), lines[segment_start:]))
+    return _pack_segments(segments, max_tokens)
+
+
+def split_hunk_excerpt(excerpt: str, max_tokens: int) -> List[Tuple[int, int, str]]:
+    """Splits a rendered hunk excerpt (see diff_utils.build_hunk_excerpt) into chunks of whole hunk clusters.
+
+    Line numbers in the returned tuples refer to the new file, as read from the excerpt's line prefixes.
+    """
+    lines = excerpt.splitlines()
+    segments: List[Tuple[int, int, List[str]]] = []
+    segment_start = 0
+    for index, line in enumerate(lines):
+        if index > segment_start and REGION_HEADER_PATTERN.match(line):
+            segments.append((segment_start + 1, index, lines[segment_start:index]))
+            segment_start = index
+    if lines:
+        segments.append((segment_start + 1, len(lines), lines[segment_start:]))
+
+    chunks: List[Tuple[int, int, str]] = []
+    for start_position, end_position, text in _pack_segments(segments, max_tokens):
+        new_line_numbers = [int(number) for number in NUMBERED_LINE_PATTERN.findall(text)]
+        if new_line_numbers:
+            chunks.append((new_line_numbers[0], new_line_numbers[-1], text))
+        else:
+            chunks.append((start_position, end_position, text))
+    return chunks
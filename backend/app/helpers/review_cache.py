@@ -0,0 +1,108 @@
+import os
+import time
+import hashlib
+from typing import Optional, Dict, Any
+
+import redis
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB_REVIEW_CACHE = int(os.getenv("REDIS_DB_REVIEW_CACHE", 4))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+
+REVIEW_CACHE_ENABLED = os.getenv("REVIEW_CACHE_ENABLED", "true").lower() == "true"
+REVIEW_CACHE_TTL_SECONDS = int(os.getenv("REVIEW_CACHE_TTL_SECONDS", 14 * 24 * 3600))
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", 50000))
+
+REVIEW_CACHE_ENTRY_PREFIX = "review_cache:entry:"
+REVIEW_CACHE_LRU_KEY = "review_cache:lru"
+REVIEW_CACHE_STATS_KEY = "review_cache:stats"
+
+redis_client_review_cache = aioredis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB_REVIEW_CACHE,
+    decode_responses=True,
+    password=REDIS_PASSWORD
+)
+
+
+def git_blob_sha(content: str) -> str:
+    """Returns the git blob SHA-1 of text content, i.e. what `git hash-object` would print."""
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob " + str(len(data)).encode("ascii") + b"\0" + data).hexdigest()
+
+
+def review_cache_key(new_blob_sha: str, old_blob_sha: Optional[str], prompt_hash: str, model_id: str) -> str:
+    digest = hashlib.sha256(f"{new_blob_sha}|{old_blob_sha or ''}|{prompt_hash}|{model_id}".encode("utf-8")).hexdigest()
+    return digest
+
+
+async def get_cached_review(new_blob_sha: str, old_blob_sha: Optional[str], prompt_hash: str, model_id: str) -> Optional[str]:
+    """Looks up a stored review. Any Redis problem is logged and treated as a miss."""
+    if not REVIEW_CACHE_ENABLED:
+        return None
+    digest = review_cache_key(new_blob_sha, old_blob_sha, prompt_hash, model_id)
+    try:
+        review_text = await redis_client_review_cache.get(f"{REVIEW_CACHE_ENTRY_PREFIX}{digest}")
+        async with redis_client_review_cache.pipeline(transaction=False) as pipe:
+            if review_text is not None:
+                pipe.hincrby(REVIEW_CACHE_STATS_KEY, "hits", 1)
+                pipe.zadd(REVIEW_CACHE_LRU_KEY, {digest: time.time()})
+                pipe.expire(f"{REVIEW_CACHE_ENTRY_PREFIX}{digest}", REVIEW_CACHE_TTL_SECONDS)
+            else:
+                pipe.hincrby(REVIEW_CACHE_STATS_KEY, "misses", 1)
+            await pipe.execute()
+        return review_text
+    except redis.exceptions.RedisError as e_redis:
+        print(f"WARNING: Review cache lookup failed, continuing without cache: {e_redis}")
+        return None
+
+
+async def store_review(new_blob_sha: str, old_blob_sha: Optional[str], prompt_hash: str, model_id: str, review_text: str):
+    """Stores a review and evicts the least recently used entries beyond REVIEW_CACHE_MAX_ENTRIES."""
+    if not REVIEW_CACHE_ENABLED or not review_text:
+        return
+    digest = review_cache_key(new_blob_sha, old_blob_sha, prompt_hash, model_id)
+    now = time.time()
+    try:
+        async with redis_client_review_cache.pipeline(transaction=False) as pipe:
+            pipe.set(f"{REVIEW_CACHE_ENTRY_PREFIX}{digest}", review_text, ex=REVIEW_CACHE_TTL_SECONDS)
+            pipe.zadd(REVIEW_CACHE_LRU_KEY, {digest: now})
+            pipe.zremrangebyscore(REVIEW_CACHE_LRU_KEY, "-inf", now - REVIEW_CACHE_TTL_SECONDS)
+            pipe.hincrby(REVIEW_CACHE_STATS_KEY, "stores", 1)
+            pipe.zcard(REVIEW_CACHE_LRU_KEY)
+            results = await pipe.execute()
+
+        overflow = results[-1] - REVIEW_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            evicted = await redis_client_review_cache.zpopmin(REVIEW_CACHE_LRU_KEY, overflow)
+            if evicted:
+                async with redis_client_review_cache.pipeline(transaction=False) as pipe:
+                    pipe.delete(*[f"{REVIEW_CACHE_ENTRY_PREFIX}{evicted_digest}" for evicted_digest, _ in evicted])
+                    pipe.hincrby(REVIEW_CACHE_STATS_KEY, "evictions", len(evicted))
+                    await pipe.execute()
+    except redis.exceptions.RedisError as e_redis:
+        print(f"WARNING: Could not store review in cache: {e_redis}")
+
+
+async def get_review_cache_stats() -> Dict[str, Any]:
+    stats = await redis_client_review_cache.hgetall(REVIEW_CACHE_STATS_KEY)
+    entries = await redis_client_review_cache.zcard(REVIEW_CACHE_LRU_KEY)
+    hits = int(stats.get("hits", 0))
+    misses = int(stats.get("misses", 0))
+    return {
+        "enabled": REVIEW_CACHE_ENABLED,
+        "hits": hits,
+        "misses": misses,
+        "stores": int(stats.get("stores", 0)),
+        "evictions": int(stats.get("evictions", 0)),
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "entries": entries,
+        "max_entries": REVIEW_CACHE_MAX_ENTRIES,
+        "ttl_seconds": REVIEW_CACHE_TTL_SECONDS,
+    }
@@ -0,0 +1,471 @@
+import os
+import uuid
+import asyncio
+import threading
+import traceback
+from datetime import datetime
+from typing import Optional, Tuple, Dict, Any, List
+
+import redis
+import redis.asyncio as aioredis
+from fastapi import Request
+from dotenv import load_dotenv
+
+from app.helpers.github_helper import get_github_helper
+from app.helpers.webhook_payload import decode_pull_request_event, decode_repository_event, WebhookPayloadError
+from app.helpers.project_status_cache import invalidate_project_status
+from app.helpers.pr_counters import apply_pull_request_event, PR_COUNTER_ACTIONS
+from app.helpers.github_rate_limit import set_github_request_priority, GITHUB_PRIORITY_BULK
+
+load_dotenv(override=True)
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB_REVIEW_QUEUE = int(os.getenv("REDIS_DB_REVIEW_QUEUE", 3))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+
+BOT_GITHUB_PERMANENT_TOKEN = os.getenv("BOT_GITHUB_PERMANENT_TOKEN")
+
+REVIEW_WORKER_CONCURRENCY = int(os.getenv("REVIEW_WORKER_CONCURRENCY", 2))
+REVIEW_JOB_MAX_ATTEMPTS = int(os.getenv("REVIEW_JOB_MAX_ATTEMPTS", 3))
+REVIEW_JOB_RESULT_TTL_SECONDS = int(os.getenv("REVIEW_JOB_RESULT_TTL_SECONDS", 7 * 24 * 3600))
+REVIEW_JOB_HEARTBEAT_SECONDS = int(os.getenv("REVIEW_JOB_HEARTBEAT_SECONDS", 5))
+REVIEW_JOB_STALE_SECONDS = int(os.getenv("REVIEW_JOB_STALE_SECONDS", 120))
+REVIEW_QUEUE_POLL_TIMEOUT_SECONDS = int(os.getenv("REVIEW_QUEUE_POLL_TIMEOUT_SECONDS", 5))
+REVIEW_DELIVERY_DEDUP_TTL_SECONDS = int(os.getenv("REVIEW_DELIVERY_DEDUP_TTL_SECONDS", 3 * 24 * 3600))
+REVIEW_PR_STATE_TTL_SECONDS = int(os.getenv("REVIEW_PR_STATE_TTL_SECONDS", 30 * 24 * 3600))
+
+REVIEW_QUEUE_KEY = "review_jobs:queue"
+REVIEW_PROCESSING_KEY = "review_jobs:processing"
+REVIEW_JOB_KEY_PREFIX = "review_jobs:job:"
+REVIEW_DELIVERY_KEY_PREFIX = "review_jobs:delivery:"
+REVIEW_PR_KEY_PREFIX = "review_jobs:pr:"
+
+TRIGGER_ACTIONS = ["opened", "reopened", "synchronize", "ready_for_review"]
+# Events that can change a project's bot (collaborator) or webhook status.
+PROJECT_STATUS_EVENTS = ["member", "repository", "meta"]
+
+redis_client_queue = aioredis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB_REVIEW_QUEUE,
+    decode_responses=True,
+    password=REDIS_PASSWORD
+)
+
+
+def _job_key(job_id: str) -> str:
+    return f"{REVIEW_JOB_KEY_PREFIX}{job_id}"
+
+
+def _pr_key(repo_full_name: str, pull_number: int) -> str:
+    return f"{REVIEW_PR_KEY_PREFIX}{repo_full_name}#{pull_number}"
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().isoformat()
+
+
+# Registers a head SHA as the newest one for a PR. Deliveries whose pull_request.updated_at is older
+# than the stored one are stale (GitHub does not guarantee delivery order) and are rejected. A delivery
+# for the head SHA that already has a pending job is coalesced onto that job.
+# KEYS[1] = PR key; ARGV = head_sha, updated_at, new job id, ttl
+# Returns {outcome, job_id} where outcome is 'stale', 'existing' or 'new' (job_id = previous pending job).
+_REGISTER_HEAD_SHA_SCRIPT = """
+local latest_sha = redis.call('HGET', KEYS[1], 'latest_head_sha')
+local latest_updated_at = redis.call('HGET', KEYS[1], 'latest_updated_at')
+local pending = redis.call('HGET', KEYS[1], 'pending_job_id')
+if latest_updated_at and ARGV[2] ~= '' and ARGV[2] < latest_updated_at and latest_sha ~= ARGV[1] then
+    return {'stale', latest_sha or ''}
+end
+if latest_sha == ARGV[1] and pending then
+    return {'existing', pending}
+end
+redis.call('HSET', KEYS[1], 'latest_head_sha', ARGV[1], 'latest_updated_at', ARGV[2], 'pending_job_id', ARGV[3])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return {'new', pending or ''}
+"""
+
+# Clears the pending job pointer for a PR, but only if it still points at the finishing job.
+# KEYS[1] = PR key; ARGV[1] = job id
+_RELEASE_PENDING_JOB_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'pending_job_id') == ARGV[1] then
+    return redis.call('HDEL', KEYS[1], 'pending_job_id')
+end
+return 0
+"""
+
+
+async def enqueue_review_job(repo_full_name: str, pull_number: int, head_sha: Optional[str] = None,
+                             action: Optional[str] = None, delivery_id: Optional[str] = None,
+                             updated_at: Optional[str] = None) -> Tuple[str, bool]:
+    """Persists a review job and pushes it onto the review queue.
+
+    Jobs are coalesced per (repo_full_name, pull_number): a delivery for a head SHA that is already
+    pending returns the existing job, and registering a newer head SHA supersedes older queued or
+    running jobs for the same PR. Returns (job_id, created). job_id is empty if the delivery is stale.
+    """
+    job_id = uuid.uuid4().hex
+    if head_sha:
+        outcome, other_job_id = await redis_client_queue.eval(
+            _REGISTER_HEAD_SHA_SCRIPT, 1, _pr_key(repo_full_name, pull_number),
+            head_sha, updated_at or "", job_id, REVIEW_PR_STATE_TTL_SECONDS
+        )
+        if outcome == "stale":
+            print(f"INFO: Ignoring stale delivery for {repo_full_name}#{pull_number} (head: {head_sha}); newer head {other_job_id} already registered.")
+            return "", False
+        if outcome == "existing":
+            print(f"INFO: Coalesced delivery for {repo_full_name}#{pull_number} (head: {head_sha}) onto pending job {other_job_id}.")
+            return other_job_id, False
+        if other_job_id:
+            print(f"INFO: Job {other_job_id} for {repo_full_name}#{pull_number} superseded by new head {head_sha}.")
+            await _update_job(other_job_id, superseded_by=job_id)
+
+    job_data = {
+        "job_id": job_id,
+        "status": "queued",
+        "repo_full_name": repo_full_name,
+        "pull_number": str(pull_number),
+        "head_sha": head_sha or "",
+        "action": action or "",
+        "delivery_id": delivery_id or "",
+        "attempts": "0",
+        "created_at": _now_iso(),
+    }
+    async with redis_client_queue.pipeline(transaction=True) as pipe:
+        pipe.hset(_job_key(job_id), mapping=job_data)
+        pipe.lpush(REVIEW_QUEUE_KEY, job_id)
+        await pipe.execute()
+    print(f"INFO: Enqueued review job {job_id} for {repo_full_name}#{pull_number} (head: {head_sha}, delivery: {delivery_id}).")
+    return job_id, True
+
+
+async def claim_delivery(delivery_id: Optional[str]) -> bool:
+    """Records a webhook delivery id. Returns False if the delivery was already seen (a GitHub retry)."""
+    if not delivery_id:
+        return True
+    claimed = await redis_client_queue.set(
+        f"{REVIEW_DELIVERY_KEY_PREFIX}{delivery_id}", _now_iso(), nx=True, ex=REVIEW_DELIVERY_DEDUP_TTL_SECONDS
+    )
+    return bool(claimed)
+
+
+async def release_delivery(delivery_id: Optional[str]):
+    """Forgets a claimed delivery so that a GitHub redelivery is processed again."""
+    if delivery_id:
+        await redis_client_queue.delete(f"{REVIEW_DELIVERY_KEY_PREFIX}{delivery_id}")
+
+
+async def is_job_superseded(repo_full_name: str, pull_number: int, head_sha: Optional[str]) -> bool:
+    if not head_sha:
+        return False
+    latest_head_sha = await redis_client_queue.hget(_pr_key(repo_full_name, pull_number), "latest_head_sha")
+    return bool(latest_head_sha) and latest_head_sha != head_sha
+
+
+async def get_review_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job_data = await redis_client_queue.hgetall(_job_key(job_id))
+    return job_data or None
+
+
+async def _update_job(job_id: str, **fields: Any):
+    await redis_client_queue.hset(_job_key(job_id), mapping={k: str(v) for k, v in fields.items()})
+
+
+async def _finish_job(job_id: str, status: str, pr_key: Optional[str] = None, **fields: Any):
+    async with redis_client_queue.pipeline(transaction=True) as pipe:
+        pipe.hset(_job_key(job_id), mapping={"status": status, "finished_at": _now_iso(), **{k: str(v) for k, v in fields.items()}})
+        pipe.expire(_job_key(job_id), REVIEW_JOB_RESULT_TTL_SECONDS)
+        pipe.lrem(REVIEW_PROCESSING_KEY, 1, job_id)
+        if pr_key:
+            pipe.eval(_RELEASE_PENDING_JOB_SCRIPT, 1, pr_key, job_id)
+        await pipe.execute()
+
+
+async def requeue_stale_jobs() -> int:
+    """Moves jobs left in the processing list by a dead worker back onto the queue.
+
+    A job is considered orphaned when its heartbeat is older than REVIEW_JOB_STALE_SECONDS, so
+    jobs still being worked on by another process are left alone.
+    """
+    requeued = 0
+    job_ids: List[str] = await redis_client_queue.lrange(REVIEW_PROCESSING_KEY, 0, -1)
+    now = datetime.utcnow()
+    for job_id in job_ids:
+        job_data = await get_review_job(job_id)
+        if not job_data:
+            await redis_client_queue.lrem(REVIEW_PROCESSING_KEY, 1, job_id)
+            continue
+        last_seen = job_data.get("heartbeat_at") or job_data.get("started_at") or job_data.get("created_at")
+        try:
+            age_seconds = (now - datetime.fromisoformat(last_seen)).total_seconds()
+        except (TypeError, ValueError):
+            age_seconds = REVIEW_JOB_STALE_SECONDS + 1
+        if age_seconds <= REVIEW_JOB_STALE_SECONDS:
+            continue
+        async with redis_client_queue.pipeline(transaction=True) as pipe:
+            pipe.lrem(REVIEW_PROCESSING_KEY, 1, job_id)
+            pipe.rpush(REVIEW_QUEUE_KEY, job_id)
+            pipe.hset(_job_key(job_id), "status", "queued")
+            await pipe.execute()
+        requeued += 1
+        print(f"WARNING: Requeued stale review job {job_id} ({job_data.get('repo_full_name')}#{job_data.get('pull_number')}), last heartbeat {age_seconds:.0f}s ago.")
+    return requeued
+
+
+async def handle_github_webhook(request: Request, payload_body: bytes) -> Tuple[int, str, Optional[str]]:
+    """Triages a verified GitHub webhook delivery and enqueues a review job when one is needed.
+
+    payload_body is the raw body the signature was checked against; it is decoded once, and only for
+    pull_request events. Returns (status_code, message, job_id). No review work is done here so the
+    delivery can be acknowledged well inside GitHub's 10 second timeout.
+    """
+    event_type = request.headers.get("X-GitHub-Event")
+    delivery_id = request.headers.get("X-GitHub-Delivery")
+    print(f"--- Review queue: Received webhook. Event: '{event_type}', Delivery ID: '{delivery_id}' ---")
+
+    try:
+        if not await claim_delivery(delivery_id):
+            print(f"INFO: Duplicate webhook delivery '{delivery_id}' ignored.")
+            return 200, f"Delivery '{delivery_id}' already processed.", None
+    except redis.exceptions.RedisError as e_redis:
+        print(f"ERROR: Could not record webhook delivery '{delivery_id}': {e_redis}")
+        return 503, "Review queue temporarily unavailable.", None
+
+    # Only a delivery that was actually handled stays claimed; anything else can be redelivered.
+    try:
+        result = await _triage_webhook(event_type, delivery_id, payload_body)
+    except Exception:
+        await _release_delivery_quietly(delivery_id)
+        raise
+    if not 200 <= result[0] < 300:
+        await _release_delivery_quietly(delivery_id)
+    return result
+
+
+async def _release_delivery_quietly(delivery_id: Optional[str]):
+    try:
+        await release_delivery(delivery_id)
+    except redis.exceptions.RedisError as e_redis:
+        print(f"WARNING: Could not release webhook delivery '{delivery_id}': {e_redis}")
+
+
+async def _triage_webhook(event_type: Optional[str], delivery_id: Optional[str], payload_body: bytes) -> Tuple[int, str, Optional[str]]:
+    if event_type in PROJECT_STATUS_EVENTS:
+        try:
+            repository_event = decode_repository_event(payload_body)
+        except WebhookPayloadError as e_payload:
+            print(f"Webhook Error: Invalid '{event_type}' payload received: {e_payload}")
+            return 400, f"Invalid JSON payload: {e_payload}", None
+        repo_full_name = repository_event.repository.full_name if repository_event.repository else None
+        if repo_full_name:
+            await asyncio.to_thread(invalidate_project_status, repo_full_name)
+        return 200, f"Event '{event_type}' ({repository_event.action}) processed: project status for {repo_full_name} will be rechecked.", None
+
+    if event_type != "pull_request":
+        print(f"Ignoring non-pull_request event: '{event_type}'")
+        return 200, f"Event '{event_type}' received and ignored. Only 'pull_request' events are processed.", None
+
+    try:
+        event = decode_pull_request_event(payload_body)
+    except WebhookPayloadError as e_payload:
+        print(f"Webhook Error: Invalid pull_request payload received: {e_payload}")
+        return 400, f"Invalid JSON payload: {e_payload}", None
+
+    action = event.action
+    pr_data = event.pull_request
+    repo_data = event.repository
+
+    if not action or not pr_data or not repo_data:
+        print("Webhook Error: Missing 'action', 'pull_request', or 'repository' data in payload.")
+        return 400, "Missing essential data in pull_request event payload.", None
+
+    repo_full_name = repo_data.full_name
+    pull_number = pr_data.number
+    pr_state = pr_data.state
+    is_draft = bool(pr_data.draft)
+    pr_title = (pr_data.title or "").lower()
+    head_sha = pr_data.head.sha if pr_data.head else None
+    updated_at = pr_data.updated_at
+
+    if not repo_full_name or not isinstance(pull_number, int):
+        print("Webhook Error: Missing 'repository.full_name' or 'pull_request.number' in payload.")
+        return 400, "Missing repository full name or pull request number in payload.", None
+
+    print(f"Processing PR Event: Repo='{repo_full_name}', PR#='{pull_number}', Action='{action}', State='{pr_state}', Draft='{is_draft}'")
+
+    if action in PR_COUNTER_ACTIONS:
+        try:
+            await asyncio.to_thread(apply_pull_request_event, repo_full_name, pull_number, action, bool(pr_data.merged), updated_at)
+        except redis.exceptions.RedisError as e_redis:
+            print(f"WARNING: Could not update PR counters for {repo_full_name}#{pull_number}: {e_redis}")
+
+    if action in TRIGGER_ACTIONS and pr_state == "open" and not is_draft:
+        if "wip" in pr_title or "[draft]" in pr_title:
+            print(f"PR {repo_full_name}#{pull_number} action '{action}' skipped: Title indicates Work-In-Progress or Draft.")
+            return 200, "Action skipped: Pull request title indicates WIP/Draft.", None
+
+        try:
+            job_id, created = await enqueue_review_job(
+                repo_full_name, pull_number, head_sha=head_sha, action=action, delivery_id=delivery_id, updated_at=updated_at
+            )
+        except redis.exceptions.RedisError as e_redis:
+            print(f"ERROR: Could not enqueue review job for {repo_full_name}#{pull_number}: {e_redis}")
+            return 503, "Review queue temporarily unavailable.", None
+        if not job_id:
+            return 200, f"Delivery for {repo_full_name}#{pull_number} is older than the latest push and was ignored.", None
+        if not created:
+            return 202, f"Review for {repo_full_name}#{pull_number} at {head_sha} is already queued.", job_id
+        return 202, f"Review for {repo_full_name}#{pull_number} queued.", job_id
+
+    elif is_draft:
+        print(f"PR {repo_full_name}#{pull_number} action '{action}' skipped: Pull request is currently a draft.")
+        return 200, "Action skipped: Pull request is a draft.", None
+    elif pr_state == "closed":
+        print(f"PR {repo_full_name}#{pull_number} action '{action}' skipped: Pull request is closed.")
+        return 200, "Action skipped: Pull request is closed.", None
+    else:
+        print(f"No action taken for PR event action '{action}' on {repo_full_name}#{pull_number} (State: {pr_state}, Draft: {is_draft}).")
+        return 200, f"No action taken for PR event action '{action}' under current conditions.", None
+
+
+class ReviewWorkerPool:
+    """Pulls review jobs off the Redis queue and runs them with bounded concurrency."""
+
+    def __init__(self, concurrency: int = REVIEW_WORKER_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    async def start(self):
+        if self._tasks:
+            return
+        if not BOT_GITHUB_PERMANENT_TOKEN:
+            print("WARNING: BOT_GITHUB_PERMANENT_TOKEN is not set. Review workers not started.")
+            return
+        self._stopping.clear()
+        try:
+            await requeue_stale_jobs()
+        except redis.exceptions.RedisError as e_redis:
+            print(f"WARNING: Could not recover stale review jobs on startup: {e_redis}")
+        for worker_index in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker_loop(worker_index)))
+        self._tasks.append(asyncio.create_task(self._reaper_loop()))
+        print(f"INFO: Started {self.concurrency} review worker(s).")
+
+    async def stop(self):
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        print("INFO: Review workers stopped.")
+
+    async def _reaper_loop(self):
+        while not self._stopping.is_set():
+            await asyncio.sleep(REVIEW_JOB_STALE_SECONDS)
+            try:
+                await requeue_stale_jobs()
+            except redis.exceptions.RedisError as e_redis:
+                print(f"WARNING: Stale review job check failed: {e_redis}")
+
+    async def _worker_loop(self, worker_index: int):
+        while not self._stopping.is_set():
+            try:
+                job_id = await redis_client_queue.blmove(
+                    REVIEW_QUEUE_KEY, REVIEW_PROCESSING_KEY, REVIEW_QUEUE_POLL_TIMEOUT_SECONDS, src="RIGHT", dest="LEFT"
+                )
+            except asyncio.CancelledError:
+                raise
+            except redis.exceptions.RedisError as e_redis:
+                print(f"ERROR: Review worker {worker_index} could not read from queue: {e_redis}")
+                await asyncio.sleep(REVIEW_QUEUE_POLL_TIMEOUT_SECONDS)
+                continue
+            if not job_id:
+                continue
+            try:
+                await self._run_job(job_id, worker_index)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e_job:
+                print(f"ERROR: Review worker {worker_index} crashed on job {job_id}: {type(e_job).__name__} - {e_job}")
+                traceback.print_exc()
+
+    async def _watch_job(self, job_id: str, repo_full_name: str, pull_number: int, head_sha: Optional[str],
+                         cancel_event: threading.Event):
+        """Heartbeats a running job and signals cancellation once a newer head SHA is registered."""
+        while True:
+            await asyncio.sleep(REVIEW_JOB_HEARTBEAT_SECONDS)
+            try:
+                await _update_job(job_id, heartbeat_at=_now_iso())
+                if not cancel_event.is_set() and await is_job_superseded(repo_full_name, pull_number, head_sha):
+                    print(f"INFO: Review job {job_id} for {repo_full_name}#{pull_number} superseded by a newer push. Cancelling.")
+                    cancel_event.set()
+            except redis.exceptions.RedisError as e_redis:
+                print(f"WARNING: Heartbeat for review job {job_id} failed: {e_redis}")
+
+    async def _run_job(self, job_id: str, worker_index: int):
+        # Review traffic yields GitHub quota to interactive dashboard requests.
+        set_github_request_priority(GITHUB_PRIORITY_BULK)
+        job_data = await get_review_job(job_id)
+        if not job_data:
+            print(f"WARNING: Review job {job_id} has no stored data. Dropping it.")
+            await redis_client_queue.lrem(REVIEW_PROCESSING_KEY, 1, job_id)
+            return
+
+        repo_full_name = job_data["repo_full_name"]
+        pull_number = int(job_data["pull_number"])
+        head_sha = job_data.get("head_sha") or None
+        pr_key = _pr_key(repo_full_name, pull_number) if head_sha else None
+
+        if await is_job_superseded(repo_full_name, pull_number, head_sha):
+            print(f"INFO: Dropping queued review job {job_id} for {repo_full_name}#{pull_number}: head {head_sha} was superseded.")
+            await _finish_job(job_id, "superseded", pr_key=pr_key)
+            return
+
+        attempts = int(job_data.get("attempts", 0)) + 1
+        await _update_job(job_id, status="running", attempts=attempts, started_at=_now_iso(), heartbeat_at=_now_iso())
+        print(f"INFO: Worker {worker_index} starting review job {job_id} for {repo_full_name}#{pull_number} (attempt {attempts}).")
+
+        cancel_event = threading.Event()
+        watch_task = asyncio.create_task(self._watch_job(job_id, repo_full_name, pull_number, head_sha, cancel_event))
+        try:
+            github_helper = await asyncio.to_thread(get_github_helper, BOT_GITHUB_PERMANENT_TOKEN)
+            status, msg = await github_helper.get_comments_from_pr_changes(repo_full_name, pull_number, cancel_event)
+        except Exception as e_review:
+            print(f"ERROR: Review job {job_id} for {repo_full_name}#{pull_number} failed: {type(e_review).__name__} - {e_review}")
+            traceback.print_exc()
+            if attempts < REVIEW_JOB_MAX_ATTEMPTS and not cancel_event.is_set():
+                async with redis_client_queue.pipeline(transaction=True) as pipe:
+                    pipe.hset(_job_key(job_id), mapping={"status": "queued", "last_error": str(e_review)[:500]})
+                    pipe.lrem(REVIEW_PROCESSING_KEY, 1, job_id)
+                    pipe.rpush(REVIEW_QUEUE_KEY, job_id)
+                    await pipe.execute()
+            else:
+                await _finish_job(job_id, "superseded" if cancel_event.is_set() else "failed", pr_key=pr_key,
+                                  last_error=str(e_review)[:500])
+            return
+        finally:
+            watch_task.cancel()
+
+        if cancel_event.is_set():
+            job_status = "superseded"
+        else:
+            job_status = "completed" if 200 <= status < 300 else "completed_with_errors"
+        await _finish_job(job_id, job_status, pr_key=pr_key, result_status_code=status, result_message=msg)
+        print(f"INFO: Review job {job_id} for {repo_full_name}#{pull_number} finished ({job_status}) with status {status}: {msg}")
+
+
+review_worker_pool = ReviewWorkerPool()
+
+
+async def _run_standalone_workers():
+    await review_worker_pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await review_worker_pool.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(_run_standalone_workers())
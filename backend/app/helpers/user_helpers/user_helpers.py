@@ -29,6 +29,7 @@ import urllib.parse
 import urllib3
 
 from app.api.git import LLM
+from app.helpers.ignore_matcher import DEFAULT_IGNORE_MATCHER
 from backend.app.helpers.github_helper import GITLAB_TOKEN
 from app.api.auth import GITLAB_CLIENT_ID, GITLAB_CLIENT_SECRET, GITLAB_OAUTH_URL, GITLAB_REDIRECT_URI, GITLAB_TOKEN_URL, GITLAB_USER_API
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -47,7 +48,7 @@ class MergeRequestHelper:
         # Determine if GitLab connection needs verify=False (HTTPS + localhost implies self-signed)
         self.gitlab_verify_ssl = not (self.base_url.startswith("https://localhost"))
 
-        self.ignored_file_types = [".svg", ".png", ".ico", "README.md", ".lock"]
+        self.ignore_matcher = DEFAULT_IGNORE_MATCHER
 
         try:
             # Instantiate LLM. Assumes LLM uses os.getenv("API_KEY") or similar
@@ -75,17 +76,17 @@ class MergeRequestHelper:
             raise # Re-raise exception
 
     # --- Modified get_comment ---
-    def get_comment(self, file_name: str, source_file: str, target_file: str = None):
+    async def get_comment(self, file_name: str, source_file: str, target_file: str = None):
         """Gets code review comment using the instantiated LLM service."""
         try:
             if target_file:
                 print(f"Analyzing changes for: {file_name}")
-                llm_response_data = self.llm.analyze_source_and_target_file(
+                llm_response_data = await self.llm.analyze_source_and_target_file(
                     original_content=target_file, changes=source_file, file_name=file_name
                 )
             else:
                 print(f"Analyzing new file/content for: {file_name}")
-                llm_response_data = self.llm.analyze_source_file(
+                llm_response_data = await self.llm.analyze_source_file(
                     changes=source_file, file_name=file_name
                 )
 
@@ -140,7 +141,7 @@ class MergeRequestHelper:
             return 500, f"Error Posting Comment: {str(e)}"
 
     # --- get_comments_from_changes (Use refined logic) ---
-    def get_comments_from_changes(self, changes, project_id, source_branch, target_branch, merge_request_id):
+    async def get_comments_from_changes(self, changes, project_id, source_branch, target_branch, merge_request_id):
         if not all([changes, project_id, source_branch, target_branch, merge_request_id]):
             print("Error: Missing required parameters for get_comments_from_changes.")
             return 500, "Internal error: Missing parameters."
@@ -153,7 +154,7 @@ class MergeRequestHelper:
             renamed_file = change.get("renamed_file", False)
             file_path = change.get("new_path")
 
-            if deleted_file or not file_path or any(file_path.lower().endswith(ft) for ft in self.ignored_file_types):
+            if deleted_file or not file_path or self.ignore_matcher.matches(file_path):
                 continue # Skip deleted, pathless, or ignored files
 
             print(f"Processing change for file: {file_path}")
@@ -163,13 +164,13 @@ class MergeRequestHelper:
             if new_file or renamed_file:
                 source_content = self.get_raw_file(project_id, file_path, source_branch)
                 if source_content is not None:
-                    comment = self.get_comment(file_path, source_content, None)
+                    comment = await self.get_comment(file_path, source_content, None)
                 else: errors_occurred = True; print(f"Failed get content (new): {file_path}")
             else: # Modified
                 source_content = self.get_raw_file(project_id, file_path, source_branch)
                 target_content = self.get_raw_file(project_id, file_path, target_branch)
                 if source_content is not None and target_content is not None:
-                    comment = self.get_comment(file_path, source_content, target_content)
+                    comment = await self.get_comment(file_path, source_content, target_content)
                 else: errors_occurred = True; print(f"Failed get content (mod): {file_path}")
 
             if comment:
@@ -183,13 +184,13 @@ class MergeRequestHelper:
         return (500, "Completed with errors.") if errors_occurred else (200, "Successfully processed changes.")
 
     # --- handle_merge_request_open (Use refined logic) ---
-    def handle_merge_request_open(self, project_id: str, merge_request_id: str):
+    async def handle_merge_request_open(self, project_id: str, merge_request_id: str):
         print(f"Starting review process for MR !{merge_request_id}...")
         try:
             source_branch, target_branch, changes = self.get_changes_and_branches(project_id, merge_request_id)
             if changes is None or source_branch is None or target_branch is None:
                 return 500, "Failed to retrieve merge request details."
-            return self.get_comments_from_changes(changes, project_id, source_branch, target_branch, merge_request_id)
+            return await self.get_comments_from_changes(changes, project_id, source_branch, target_branch, merge_request_id)
         except Exception as err:
             print(f"Unhandled exception in handle_merge_request_open: {err}")
             return 500, "Internal server error during merge request handling."
@@ -216,8 +217,7 @@ class MergeRequestHelper:
 
             if action in trigger_actions and not is_draft:
                  print(f"Processing '{action}' event for non-draft MR !{mr_id}")
-                 # Run sync logic (consider async later if too slow)
-                 status_code, message = self.handle_merge_request_open(proj_id, mr_id)
+                 status_code, message = await self.handle_merge_request_open(proj_id, mr_id)
                  return status_code, message
             elif is_draft: return 200, "Skipped: MR is draft."
             else: return 200, f"Skipped action: {action}."
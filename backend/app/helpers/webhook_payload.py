@@ -0,0 +1,150 @@
+import json
+import time
+import threading
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# With msgspec the payload types are Structs and the decoder only materializes the fields declared
+# below, skipping the rest of the (often several hundred KB) pull_request payload. Without it the
+# same types are plain dataclasses filled from a stdlib json parse.
+_PayloadBase = msgspec.Struct if msgspec is not None else object
+
+
+def _payload_type(cls):
+    return cls if msgspec is not None else dataclass(cls)
+
+
+class WebhookPayloadError(ValueError):
+    """Raised when a webhook body is not valid JSON or does not match the expected shape."""
+
+
+@_payload_type
+class PullRequestHead(_PayloadBase):
+    sha: Optional[str] = None
+
+
+@_payload_type
+class PullRequestData(_PayloadBase):
+    number: Optional[int] = None
+    state: Optional[str] = None
+    draft: Optional[bool] = False
+    merged: Optional[bool] = False
+    title: Optional[str] = None
+    updated_at: Optional[str] = None
+    head: Optional[PullRequestHead] = None
+
+
+@_payload_type
+class RepositoryData(_PayloadBase):
+    full_name: Optional[str] = None
+
+
+@_payload_type
+class PullRequestEvent(_PayloadBase):
+    action: Optional[str] = None
+    pull_request: Optional[PullRequestData] = None
+    repository: Optional[RepositoryData] = None
+
+
+@_payload_type
+class RepositoryEvent(_PayloadBase):
+    """member, repository and meta events: only the repository they concern is needed."""
+    action: Optional[str] = None
+    repository: Optional[RepositoryData] = None
+
+
+_pull_request_event_decoder = msgspec.json.Decoder(PullRequestEvent) if msgspec is not None else None
+_repository_event_decoder = msgspec.json.Decoder(RepositoryEvent) if msgspec is not None else None
+
+_decode_stats_lock = threading.Lock()
+_decode_stats: Dict[str, float] = {"decoded": 0, "errors": 0, "bytes": 0, "cpu_seconds": 0.0}
+
+
+def _record_decode(body_size: int, cpu_seconds: float, failed: bool):
+    with _decode_stats_lock:
+        _decode_stats["errors" if failed else "decoded"] += 1
+        _decode_stats["bytes"] += body_size
+        _decode_stats["cpu_seconds"] += cpu_seconds
+
+
+def _build_pull_request_event(data: Any) -> PullRequestEvent:
+    if not isinstance(data, dict):
+        raise WebhookPayloadError("Webhook payload is not a JSON object.")
+    pr_data = data.get("pull_request")
+    repo_data = data.get("repository")
+    pull_request = None
+    if isinstance(pr_data, dict):
+        head_data = pr_data.get("head")
+        number = pr_data.get("number")
+        pull_request = PullRequestData(
+            number=number if isinstance(number, int) else None,
+            state=pr_data.get("state"),
+            draft=pr_data.get("draft", False),
+            merged=pr_data.get("merged", False),
+            title=pr_data.get("title"),
+            updated_at=pr_data.get("updated_at"),
+            head=PullRequestHead(sha=head_data.get("sha")) if isinstance(head_data, dict) else None,
+        )
+    repository = RepositoryData(full_name=repo_data.get("full_name")) if isinstance(repo_data, dict) else None
+    return PullRequestEvent(action=data.get("action"), pull_request=pull_request, repository=repository)
+
+
+def _build_repository_event(data: Any) -> RepositoryEvent:
+    if not isinstance(data, dict):
+        raise WebhookPayloadError("Webhook payload is not a JSON object.")
+    repo_data = data.get("repository")
+    repository = RepositoryData(full_name=repo_data.get("full_name")) if isinstance(repo_data, dict) else None
+    return RepositoryEvent(action=data.get("action"), repository=repository)
+
+
+def _decode(payload_body: bytes, decoder, build_event):
+    started = time.thread_time()
+    try:
+        if decoder is not None:
+            try:
+                event = decoder.decode(payload_body)
+            except (msgspec.DecodeError, msgspec.ValidationError) as e_decode:
+                raise WebhookPayloadError(str(e_decode)) from e_decode
+        else:
+            try:
+                event = build_event(json.loads(payload_body))
+            except (json.JSONDecodeError, UnicodeDecodeError) as e_decode:
+                raise WebhookPayloadError(str(e_decode)) from e_decode
+    except WebhookPayloadError:
+        _record_decode(len(payload_body), time.thread_time() - started, failed=True)
+        raise
+    _record_decode(len(payload_body), time.thread_time() - started, failed=False)
+    return event
+
+
+def decode_pull_request_event(payload_body: bytes) -> PullRequestEvent:
+    """Decodes a raw pull_request webhook body in a single pass. Raises WebhookPayloadError on bad input."""
+    return _decode(payload_body, _pull_request_event_decoder, _build_pull_request_event)
+
+
+def decode_repository_event(payload_body: bytes) -> RepositoryEvent:
+    """Decodes the repository part of any webhook body. Raises WebhookPayloadError on bad input."""
+    return _decode(payload_body, _repository_event_decoder, _build_repository_event)
+
+
+def get_webhook_decode_stats() -> Dict[str, Any]:
+    """In-process counters for webhook payload decoding (per worker process)."""
+    with _decode_stats_lock:
+        decoded = int(_decode_stats["decoded"])
+        errors = int(_decode_stats["errors"])
+        total_bytes = int(_decode_stats["bytes"])
+        cpu_seconds = _decode_stats["cpu_seconds"]
+    deliveries = decoded + errors
+    return {
+        "decoder": "msgspec" if msgspec is not None else "json",
+        "decoded": decoded,
+        "errors": errors,
+        "bytes": total_bytes,
+        "cpu_seconds": round(cpu_seconds, 6),
+        "avg_cpu_ms_per_delivery": round(cpu_seconds * 1000 / deliveries, 4) if deliveries else 0.0,
+    }
@@ -10,10 +10,16 @@ from app.api import git
 from app.api import users
 from app.api import model
 from app.api import auth
+from app.api import metrics
 from app.helpers import verify_token
+from app.helpers.review_queue import review_worker_pool
+from app.api.git import close_llm_http_client
+from app.api.users import project_status_sweeper
+from app.helpers.pr_counters import pr_counter_reconciler
 from google.auth.transport import requests as google_requests
 from fastapi.middleware.cors import CORSMiddleware
 import logging
+import os
 import requests
 
 app = FastAPI(
@@ -45,6 +51,23 @@ app.include_router(webhook.router)
 app.include_router(git.router)
 app.include_router(users.router)
 app.include_router(auth.router)
+app.include_router(metrics.router)
+
+REVIEW_WORKERS_IN_PROCESS = os.getenv("REVIEW_WORKERS_IN_PROCESS", "true").lower() == "true"
+
+@app.on_event("startup")
+async def start_review_workers():
+    if REVIEW_WORKERS_IN_PROCESS:
+        await review_worker_pool.start()
+    await project_status_sweeper.start()
+    await pr_counter_reconciler.start()
+
+@app.on_event("shutdown")
+async def stop_review_workers():
+    await review_worker_pool.stop()
+    await project_status_sweeper.stop()
+    await pr_counter_reconciler.stop()
+    await close_llm_http_client()
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
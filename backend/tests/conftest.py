@@ -0,0 +1,6 @@
+import os
+
+# Some helpers build their clients at import time; give them placeholder settings so importing the
+# modules under test needs neither a .env file nor network access.
+os.environ.setdefault("API_KEY", "test-api-key")
+os.environ.setdefault("API_HEADER", "https://llm.invalid/v1beta/models/test-model:generateContent?key=")
@@ -0,0 +1,78 @@
+from app.helpers.diff_utils import build_hunk_excerpt
+
+NEW_CONTENT = "\n".join(f"line {number}" for number in range(1, 41))
+# Line 20 replaced, line 35 added.
+PATCH = (
+    "@@ -19,3 +19,3 @@\n"
+    " line 19\n"
+    "-old 20\n"
+    "+line 20\n"
+    " line 21\n"
+    "@@ -33,3 +33,4 @@\n"
+    " line 33\n"
+    " line 34\n"
+    "+line 35\n"
+    " line 36"
+)
+
+
+def _numbered(start, end, added=()):
+    return [f"{number:>2} {'+' if number in added else ' '}line {number}" for number in range(start, end + 1)]
+
+
+def test_hunks_are_widened_by_context_lines_only():
+    excerpt = build_hunk_excerpt(PATCH, NEW_CONTENT, context_lines=2, include_enclosing_scope=False)
+
+    assert excerpt.splitlines() == (
+        ["@@ new lines 18-22 @@"]
+        + _numbered(18, 19) + ["   -old 20"] + _numbered(20, 22, added={20})
+        + ["@@ new lines 33-37 @@"]
+        + _numbered(33, 37, added={35})
+    )
+
+
+def test_overlapping_regions_are_merged():
+    excerpt = build_hunk_excerpt(PATCH, NEW_CONTENT, context_lines=8, include_enclosing_scope=False)
+
+    assert excerpt.splitlines()[0] == "@@ new lines 12-40 @@"
+    assert sum(line.startswith("@@") for line in excerpt.splitlines()) == 1
+    assert "35 +line 35" in excerpt.splitlines()
+
+
+def test_context_is_clamped_to_the_file():
+    excerpt = build_hunk_excerpt(PATCH, NEW_CONTENT, context_lines=100, include_enclosing_scope=False)
+
+    lines = excerpt.splitlines()
+    assert lines[0] == "@@ new lines 1-40 @@"
+    assert lines[1] == " 1  line 1"
+    assert lines[-1] == "40  line 40"
+
+
+def test_region_extends_to_the_enclosing_scope():
+    new_content = "\n".join(
+        ["import os", "", "def handler(event):"]
+        + [f"    step_{number} = {number}" for number in range(1, 11)]
+        + ["    return event"]
+    )
+    patch = "@@ -12,2 +12,2 @@\n     step_9 = 9\n-    step_10 = 0\n+    step_10 = 10\n     return event"
+
+    with_scope = build_hunk_excerpt(patch, new_content, context_lines=1, include_enclosing_scope=True)
+    without_scope = build_hunk_excerpt(patch, new_content, context_lines=1, include_enclosing_scope=False)
+
+    assert with_scope.splitlines()[0] == "@@ new lines 3-14 @@"
+    assert " 3  def handler(event):" in with_scope.splitlines()
+    assert without_scope.splitlines()[0] == "@@ new lines 12-14 @@"
+
+
+def test_lines_removed_at_the_end_of_the_file_are_kept():
+    new_content = "a\nb"
+    patch = "@@ -1,3 +1,2 @@\n a\n b\n-c"
+
+    assert build_hunk_excerpt(patch, new_content, context_lines=3).splitlines() == [
+        "@@ new lines 1-2 @@", "1  a", "2  b", "  -c",
+    ]
+
+
+def test_patch_is_returned_unchanged_without_new_content():
+    assert build_hunk_excerpt(PATCH, None) == PATCH
+    assert build_hunk_excerpt("", NEW_CONTENT) == ""
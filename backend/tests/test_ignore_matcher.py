@@ -0,0 +1,73 @@
+import pytest
+
+from app.helpers.ignore_matcher import DEFAULT_IGNORE_MATCHER, IgnoreMatcher
+
+
+@pytest.mark.parametrize("patterns, path, expected", [
+    # "**" spans any number of directories, "*" and "?" stay within one segment.
+    (["docs/**/*.md"], "docs/guide.md", True),
+    (["docs/**/*.md"], "docs/a/b/guide.md", True),
+    (["docs/**/*.md"], "src/docs/guide.md", False),
+    (["**/fixtures"], "tests/unit/fixtures/data.json", True),
+    (["build/**"], "build/out/app.js", True),
+    (["*.py"], "src/app/main.py", True),
+    (["src/*.py"], "src/app/main.py", False),
+    (["file?.txt"], "file1.txt", True),
+    (["file?.txt"], "file10.txt", False),
+    # Without a slash a pattern matches at any depth; with one it is anchored at the repo root.
+    (["generated"], "generated/models.py", True),
+    (["generated"], "src/generated/models.py", True),
+    (["/generated"], "src/generated/models.py", False),
+    (["/generated"], "generated/models.py", True),
+    (["src/generated"], "lib/src/generated/models.py", False),
+    # A trailing slash only matches directories.
+    (["vendor/"], "vendor/lib.js", True),
+    (["vendor/"], "third_party/vendor/lib.js", True),
+    (["vendor/"], "vendor", False),
+    # Negations win over ignores regardless of order.
+    (["*.json", "!package.json"], "package.json", False),
+    (["!package.json", "*.json"], "package.json", False),
+    (["*.json", "!package.json"], "tsconfig.json", True),
+    # Comments and blank lines are skipped.
+    (["# *.py", "", "   "], "main.py", False),
+])
+def test_patterns(patterns, path, expected):
+    assert IgnoreMatcher(patterns, case_sensitive=True).matches(path) is expected
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("LICENSE", True),
+    ("docs/README.md", True),
+    ("assets/logo.svg", True),
+    ("poetry.lock", True),
+    ("license/__init__.py", False),
+    ("src/readme.md/parser.py", False),
+    ("src/app.py", False),
+])
+def test_default_patterns_only_match_file_names(path, expected):
+    assert DEFAULT_IGNORE_MATCHER.matches(path) is expected
+
+
+@pytest.mark.parametrize("files_only, path, expected", [
+    (False, "logs/app.txt", True),
+    (True, "logs/app.txt", False),
+    (True, "logs", True),
+])
+def test_files_only(files_only, path, expected):
+    assert IgnoreMatcher(["logs"], files_only=files_only).matches(path) is expected
+
+
+@pytest.mark.parametrize("ignore_text, path, expected", [
+    ("*.generated.ts", "src/api.generated.ts", True),
+    ("*.generated.ts", "assets/logo.png", True),
+    ("!README.md", "README.md", False),
+    ("!README.md", "docs/readme.md", True),
+])
+def test_repo_patterns_extend_the_defaults(ignore_text, path, expected):
+    matcher = IgnoreMatcher.from_text(ignore_text, parent=DEFAULT_IGNORE_MATCHER)
+    assert matcher.matches(path) is expected
+
+
+def test_case_sensitivity():
+    assert IgnoreMatcher(["*.PNG"]).matches("image.png") is True
+    assert IgnoreMatcher(["*.PNG"], case_sensitive=True).matches("image.png") is False
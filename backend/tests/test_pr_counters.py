@@ -0,0 +1,66 @@
+import fakeredis
+import pytest
+
+from app.helpers import pr_counters
+
+REPO = "octo/repo"
+
+
+class _FakeHelper:
+    def __init__(self, counts):
+        self.counts = counts
+
+    def get_pull_request_counts(self, repo_full_name):
+        return dict(self.counts)
+
+
+@pytest.fixture
+def counters_redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(pr_counters, "redis_client_pr_counters", client)
+    return client
+
+
+@pytest.fixture
+def baseline(counters_redis):
+    return pr_counters.reconcile_pr_counters(_FakeHelper({"open": 5, "merged": 2, "closed": 1}), REPO)
+
+
+def test_opened_then_closed_moves_the_pull_request_between_counters(baseline):
+    assert pr_counters.apply_pull_request_event(REPO, 1, "opened", False, "2024-05-01T10:00:00Z") == 1
+    assert pr_counters.get_pr_counters(REPO) == {"open": 6, "merged": 2, "closed": 1}
+
+    assert pr_counters.apply_pull_request_event(REPO, 1, "closed", False, "2024-05-01T12:00:00Z") == 1
+    assert pr_counters.get_pr_counters(REPO) == {"open": 5, "merged": 2, "closed": 2}
+
+
+def test_out_of_order_reopened_after_closed_leaves_counters_unchanged(baseline):
+    pr_counters.apply_pull_request_event(REPO, 1, "opened", False, "2024-05-01T10:00:00Z")
+    pr_counters.apply_pull_request_event(REPO, 1, "closed", False, "2024-05-01T12:00:00Z")
+
+    # Delivered last, but happened before the close.
+    assert pr_counters.apply_pull_request_event(REPO, 1, "reopened", False, "2024-05-01T11:00:00Z") == 0
+    assert pr_counters.get_pr_counters(REPO) == {"open": 5, "merged": 2, "closed": 2}
+
+
+def test_redelivered_event_is_applied_once(baseline):
+    pr_counters.apply_pull_request_event(REPO, 2, "opened", False, "2024-05-01T10:00:00Z")
+
+    assert pr_counters.apply_pull_request_event(REPO, 2, "closed", True, "2024-05-01T12:00:00Z") == 1
+    assert pr_counters.apply_pull_request_event(REPO, 2, "closed", True, "2024-05-01T12:00:00Z") == 0
+    assert pr_counters.get_pr_counters(REPO) == {"open": 5, "merged": 3, "closed": 1}
+
+
+def test_events_before_a_baseline_only_record_pull_request_state(counters_redis):
+    assert pr_counters.apply_pull_request_event(REPO, 3, "opened", False, "2024-05-01T10:00:00Z") == -1
+    assert pr_counters.get_pr_counters(REPO) is None
+
+    # The baseline already counts #3 as open, so closing it must move it from open to closed.
+    pr_counters.reconcile_pr_counters(_FakeHelper({"open": 1, "merged": 0, "closed": 0}), REPO)
+    assert pr_counters.apply_pull_request_event(REPO, 3, "closed", False, "2024-05-01T12:00:00Z") == 1
+    assert pr_counters.get_pr_counters(REPO) == {"open": 0, "merged": 0, "closed": 1}
+
+
+def test_unrelated_actions_are_ignored(baseline):
+    assert pr_counters.apply_pull_request_event(REPO, 4, "synchronize", False, "2024-05-01T10:00:00Z") == 0
+    assert pr_counters.get_pr_counters(REPO) == {"open": 5, "merged": 2, "closed": 1}
@@ -0,0 +1,77 @@
+import re
+
+from app.helpers.diff_utils import build_hunk_excerpt
+from app.helpers.prompt_budget import estimate_tokens, split_code_into_chunks, split_hunk_excerpt
+
+
+def _function(name, body_lines):
+    return [f"def {name}():"] + [f"    value_{number} = '{name}-{number}'" for number in range(body_lines)] + ["    return value_0"]
+
+
+SOURCE_LINES = ["import os", ""] + _function("first", 20) + [""] + _function("second", 20) + [""] + _function("third", 20)
+SOURCE = "\n".join(SOURCE_LINES)
+
+
+def _assert_lines_covered_once(chunks, lines):
+    assert "\n".join(text for _, _, text in chunks) == "\n".join(lines)
+    expected_start = 1
+    for start_line, end_line, text in chunks:
+        assert start_line == expected_start
+        assert end_line - start_line + 1 == len(text.split("\n"))
+        assert text.split("\n") == lines[start_line - 1:end_line]
+        expected_start = end_line + 1
+    assert expected_start == len(lines) + 1
+
+
+def test_code_under_budget_is_a_single_chunk():
+    assert split_code_into_chunks(SOURCE, estimate_tokens(SOURCE) + 10) == [(1, len(SOURCE_LINES), SOURCE)]
+
+
+def test_code_over_budget_is_split_on_function_boundaries():
+    budget = estimate_tokens("\n".join(_function("second", 20))) + 20
+    chunks = split_code_into_chunks(SOURCE, budget)
+
+    assert len(chunks) == 3
+    _assert_lines_covered_once(chunks, SOURCE_LINES)
+    assert [text.split("\n")[0] for _, _, text in chunks[1:]] == ["def second():", "def third():"]
+    assert all(estimate_tokens(text) <= budget for _, _, text in chunks)
+
+
+def test_function_larger_than_the_budget_is_cut_on_line_boundaries():
+    lines = _function("huge", 200)
+    chunks = split_code_into_chunks("\n".join(lines), 100)
+
+    assert len(chunks) > 1
+    _assert_lines_covered_once(chunks, lines)
+
+
+def test_empty_code_has_no_chunks():
+    assert split_code_into_chunks("", 100) == []
+
+
+NEW_CONTENT = "\n".join(f"line {number}" for number in range(1, 201))
+PATCH = "\n".join(
+    f"@@ -{number},1 +{number},1 @@\n-old {number}\n+line {number}" for number in (20, 80, 140, 190)
+)
+EXCERPT = build_hunk_excerpt(PATCH, NEW_CONTENT, context_lines=3, include_enclosing_scope=False)
+
+
+def test_excerpt_under_budget_is_a_single_chunk():
+    assert split_hunk_excerpt(EXCERPT, estimate_tokens(EXCERPT) + 10) == [(17, 193, EXCERPT)]
+
+
+def test_excerpt_is_split_between_whole_regions_with_new_file_labels():
+    region_tokens = max(estimate_tokens(region) for region in re.split(r"\n(?=@@)", EXCERPT))
+    chunks = split_hunk_excerpt(EXCERPT, region_tokens + 5)
+
+    assert [(start_line, end_line) for start_line, end_line, _ in chunks] == [(17, 23), (77, 83), (137, 143), (187, 193)]
+    assert all(text.startswith("@@ new lines ") for _, _, text in chunks)
+    assert "\n".join(text for _, _, text in chunks) == EXCERPT
+
+
+def test_excerpt_chunks_pack_several_regions_when_they_fit():
+    region_tokens = max(estimate_tokens(region) for region in re.split(r"\n(?=@@)", EXCERPT))
+    chunks = split_hunk_excerpt(EXCERPT, 2 * region_tokens + 5)
+
+    assert [(start_line, end_line) for start_line, end_line, _ in chunks] == [(17, 83), (137, 193)]
+    assert "\n".join(text for _, _, text in chunks) == EXCERPT
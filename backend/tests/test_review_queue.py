@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+import fakeredis
+import pytest
+
+from app.helpers import review_queue
+
+
+@pytest.fixture
+def queue_redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(review_queue, "redis_client_queue", client)
+    return client
+
+
+def _enqueue(head_sha, updated_at):
+    return review_queue.enqueue_review_job("octo/repo", 7, head_sha=head_sha, action="synchronize", updated_at=updated_at)
+
+
+def test_same_head_sha_is_coalesced_onto_pending_job(queue_redis):
+    async def scenario():
+        first = await _enqueue("sha-1", "2024-05-01T10:00:00Z")
+        second = await _enqueue("sha-1", "2024-05-01T10:00:00Z")
+        return first, second, await queue_redis.lrange(review_queue.REVIEW_QUEUE_KEY, 0, -1)
+
+    (first_job_id, first_created), (second_job_id, second_created), queued = asyncio.run(scenario())
+
+    assert first_created is True
+    assert second_created is False
+    assert second_job_id == first_job_id
+    assert queued == [first_job_id]
+
+
+def test_newer_head_sha_supersedes_pending_job_and_cancels_it(queue_redis, monkeypatch):
+    monkeypatch.setattr(review_queue, "REVIEW_JOB_HEARTBEAT_SECONDS", 0)
+
+    async def scenario():
+        old_job_id, _ = await _enqueue("sha-1", "2024-05-01T10:00:00Z")
+        new_job_id, created = await _enqueue("sha-2", "2024-05-01T10:05:00Z")
+        old_job = await review_queue.get_review_job(old_job_id)
+
+        cancel_event = threading.Event()
+        pool = review_queue.ReviewWorkerPool(concurrency=1)
+        watch_task = asyncio.create_task(pool._watch_job(old_job_id, "octo/repo", 7, "sha-1", cancel_event))
+        try:
+            for _ in range(100):
+                if cancel_event.is_set():
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            watch_task.cancel()
+        return old_job_id, old_job, new_job_id, created, cancel_event.is_set()
+
+    old_job_id, old_job, new_job_id, created, cancelled = asyncio.run(scenario())
+
+    assert created is True
+    assert new_job_id != old_job_id
+    assert old_job["superseded_by"] == new_job_id
+    assert cancelled is True
+
+
+def test_delivery_with_older_updated_at_is_rejected(queue_redis):
+    async def scenario():
+        await _enqueue("sha-2", "2024-05-01T10:05:00Z")
+        stale = await _enqueue("sha-1", "2024-05-01T10:00:00Z")
+        superseded = await review_queue.is_job_superseded("octo/repo", 7, "sha-1")
+        return stale, superseded
+
+    (stale_job_id, stale_created), sha_1_superseded = asyncio.run(scenario())
+
+    assert stale_job_id == ""
+    assert stale_created is False
+    assert sha_1_superseded is True
@@ -193,15 +193,59 @@ const ChatInterface = ({ user, onLogout }) => {
   }, [selectedChatId, fetchChatMessages, chatHistoryItems, user?.name]); // Added dependencies
 
 
+  // --- Streaming Reply (SSE from /mergechat/stream) ---
+  // Shows the review while it is generated and records the time to first token on the message.
+  const streamAssistantReply = async (msg) => {
+    const asstId=`asst_${Date.now()}_${Math.random().toString(16).slice(2,8)}`;
+    const startedAt=performance.now();
+    let content=""; let ttftMs=null; let totalMs=null;
+    const updateAssistant=(fields)=>setMessages(p=>p.map(m=>m.id===asstId?{...m,...fields}:m));
+    setMessages(p=>[...p,{id:asstId,content:"",sender:"assistant",streaming:true,timestamp:new Date().toISOString()}]);
+    setIsLoading(false);
+
+    const res=await fetch(`${BASE_URL}/mergechat/stream`,{
+      method:'POST',
+      headers:{'Content-Type':'application/json'},
+      body:JSON.stringify({changes:msg,request_type:'ONLY_SOURCE_FILE',file_name:'chat_snippet'})
+    });
+    if(!res.ok||!res.body){ setMessages(p=>p.filter(m=>m.id!==asstId)); throw new Error(`Stream request failed (Status: ${res.status})`); }
+
+    const reader=res.body.getReader(); const decoder=new TextDecoder(); let buffer="";
+    const handleEvent=(rawEvent)=>{
+      let eventName="message"; let dataText="";
+      rawEvent.split('\n').forEach(line=>{ if(line.startsWith('event:'))eventName=line.slice(6).trim(); else if(line.startsWith('data:'))dataText+=line.slice(5).trim(); });
+      if(!dataText)return;
+      const data=JSON.parse(dataText);
+      if(eventName==='first_token'){ ttftMs=Math.round(performance.now()-startedAt); updateAssistant({ttftMs}); }
+      else if(eventName==='delta'){ content+=data.text; updateAssistant({content}); }
+      else if(eventName==='result'){ content="```json\n"+JSON.stringify(data,null,2)+"\n```"; updateAssistant({content}); }
+      else if(eventName==='done'){ totalMs=data.total_ms; }
+      else if(eventName==='error'){ throw new Error(data.detail||'Streaming failed.'); }
+    };
+    try {
+      while(true){
+        const {value,done}=await reader.read(); if(done)break;
+        buffer+=decoder.decode(value,{stream:true});
+        const events=buffer.split('\n\n'); buffer=events.pop(); events.forEach(handleEvent);
+      }
+      if(buffer.trim())handleEvent(buffer);
+    } catch (streamError) {
+      if(!content){ setMessages(p=>p.filter(m=>m.id!==asstId)); throw streamError; }
+      content+="\n\n_[Response interrupted.]_";
+    }
+    const finalMsg={id:asstId,content:content||"[No response]",sender:"assistant",timestamp:new Date().toISOString()};
+    updateAssistant({...finalMsg,streaming:false,ttftMs,totalMs});
+    return finalMsg;
+  };
+
+
   // --- Sending a Message ---
   const handleSendMessage = async (e) => {
     e.preventDefault(); if (!selectedChatId) { alert("Select chat."); return; } const msg=input.trim(); if (!msg) return;
     console.log(`Sending to ${selectedChatId}:`, msg); const userMsg={id:`user_${Date.now()}_${Math.random().toString(16).slice(2,8)}`,content:msg,sender:"user",timestamp:new Date().toISOString()};
     setMessages(p=>[...p,userMsg]); setInput(""); setIsLoading(true); setError(null); let assistantMsg=null;
     try { /* ... API call, Redis update ... */
-      const modelRes=await axios.post(`${BASE_URL}/model`,{code_snippet:msg}); const assistantContent=modelRes.data.review||"[No response]";
-      assistantMsg={id:`asst_${Date.now()}_${Math.random().toString(16).slice(2,8)}`,content:assistantContent,sender:"assistant",timestamp:new Date().toISOString()};
-      setMessages(p=>[...p,assistantMsg]);
+      assistantMsg=await streamAssistantReply(msg);
       try { const chatRes=await axios.get(`${BASE_URL}/redis_db/chat/get/${selectedChatId}`); const currentData=chatRes.data; let currentMsgs=currentData.messages||{}; if(typeof currentMsgs!=='object'||currentMsgs===null||Array.isArray(currentMsgs))currentMsgs={}; const updatedMsgs={...currentMsgs,[userMsg.id]:{sender:userMsg.sender,content:userMsg.content,timestamp:userMsg.timestamp},[assistantMsg.id]:{sender:assistantMsg.sender,content:assistantMsg.content,timestamp:assistantMsg.timestamp}}; const payload={...currentData,messages:updatedMsgs,chat_id:selectedChatId}; await axios.put(`${BASE_URL}/redis_db/chat/update/${selectedChatId}`,payload); console.log(`Chat ${selectedChatId} updated.`); }
       catch (updateError) { console.error("Redis update error:",updateError); setMessages(p=>[...p,{id:`err_save_${Date.now()}`,content:"[Save failed.]",sender:"assistant",timestamp:new Date().toISOString()}]); }
     } catch (error) { /* ... Error Handling including saving user message ... */
@@ -151,6 +151,12 @@ const ChatMessage = ({ message, user, darkMode }) => {
                   </SyntaxHighlighter>
                 )}
               </>
+            ) : message.streaming ? (
+              // AI Message still being generated: show the text as it arrives
+              <div className="px-3.5 py-2.5">
+                {message.content ? formatText(message.content) : <span className="opacity-70">Thinking...</span>}
+                {message.ttftMs != null && <span className="text-xs block opacity-60 mt-1">First token in {message.ttftMs} ms</span>}
+              </div>
             ) : (
               // AI Message: Show a button to open modal
               <button
@@ -159,6 +165,11 @@ const ChatMessage = ({ message, user, darkMode }) => {
               >
                 View Response
                 {message.codeSnippet && <span className="text-xs block opacity-70">(Contains code review)</span>}
+                {message.ttftMs != null && (
+                  <span className="text-xs block opacity-60">
+                    First token in {message.ttftMs} ms{message.totalMs != null ? ` · done in ${Math.round(message.totalMs)} ms` : ''}
+                  </span>
+                )}
               </button>
             )}
           </div>
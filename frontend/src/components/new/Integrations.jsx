@@ -46,6 +46,8 @@ const Integrations = ({ darkMode: initialDarkMode }) => {
   const [view, setView] = useState('dashboard');
   const [loadingStatus, setLoadingStatus] = useState(true); // For initial page load status
   const [loadingProjects, setLoadingProjects] = useState(false);
+  const [loadingMoreProjects, setLoadingMoreProjects] = useState(false);
+  const [nextProjectsCursor, setNextProjectsCursor] = useState(null);
   const [loadingProjectDetails, setLoadingProjectDetails] = useState(false);
   const [addingBotStates, setAddingBotStates] = useState({});
   const [navigatingToDetails, setNavigatingToDetails] = useState(null);
@@ -68,7 +70,7 @@ const Integrations = ({ darkMode: initialDarkMode }) => {
     }
   }, [darkMode]);
 
-  const fetchUserProjects = useCallback(async (showLoading = true) => {
+  const fetchUserProjects = useCallback(async (showLoading = true, cursor = 1) => {
     const token = getCookie("access_token"); // This should be the GitHub PAT if that's what your backend expects
     if (!token) {
         setIsLoggedIn(false);
@@ -79,43 +81,84 @@ const Integrations = ({ darkMode: initialDarkMode }) => {
         return;
     }
 
-    if (showLoading) setLoadingProjects(true);
+    const isFirstPage = cursor === 1;
+    if (showLoading && isFirstPage) setLoadingProjects(true);
+    if (!isFirstPage) setLoadingMoreProjects(true);
     setErrorMessage('');
 
     try {
-        // The /users/projects endpoint in users.py expects the GitHub access token
-        // to be passed via an HttpOnly cookie named "access_token".
-        // The 'credentials: include' ensures this cookie is sent.
-        const response = await fetch(`${API_BASE_URL}/users/projects`, {
-            method: 'POST', // As per users.py
+        // /users/projects/stream sends one NDJSON line per GitHub listing page, so the first
+        // projects show up before the whole account has been listed. The access token is
+        // passed via the HttpOnly "access_token" cookie ('credentials: include').
+        const response = await fetch(`${API_BASE_URL}/users/projects/stream?cursor=${cursor}`, {
+            method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({}), // Empty body as per users.py
+            body: JSON.stringify({}),
             credentials: 'include' // Crucial for sending HttpOnly cookies
         });
-        const data = await response.json();
 
-        if (response.ok && data.status === 'success') {
-            setIsLoggedIn(true); // Successfully fetched projects, so user is "logged in" in the context of this page
-            setProjects(data.projects || []);
-        } else {
+        if (!response.ok) {
+            const data = await response.json().catch(() => null);
             if (response.status === 401) { // Unauthorized - token might be invalid or expired
                 deleteCookie('access_token'); // Clear the potentially invalid token
                 setIsLoggedIn(false);
                 setProjects([]);
-                setErrorMessage(data?.message || 'Authentication failed. Your session may have expired. Please login again via GitHub.');
-                // Consider navigating to a page that allows re-initiating GitHub login,
-                // or rely on the "Login with GitHub" button if it becomes visible.
-                // navigate('/login'); // This depends on your app's login flow for GitHub
+                setNextProjectsCursor(null);
+                setErrorMessage(data?.detail || 'Authentication failed. Your session may have expired. Please login again via GitHub.');
             } else {
-                setErrorMessage(data?.message || `Failed to fetch projects (Status: ${response.status})`);
+                setErrorMessage(data?.detail || `Failed to fetch projects (Status: ${response.status})`);
             }
+            return;
         }
+
+        setIsLoggedIn(true); // Successfully started streaming projects, so user is "logged in" in the context of this page
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let replaceExisting = isFirstPage;
+
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const message = JSON.parse(line);
+            if (message.type === 'page') {
+                const pageProjects = message.projects || [];
+                if (replaceExisting) {
+                    setProjects(pageProjects);
+                    replaceExisting = false;
+                } else {
+                    setProjects(prev => {
+                        const seen = new Set(prev.map(project => project.id));
+                        return [...prev, ...pageProjects.filter(project => !seen.has(project.id))];
+                    });
+                }
+                setNextProjectsCursor(message.next_cursor ?? null);
+                if (showLoading && isFirstPage) setLoadingProjects(false);
+            } else if (message.type === 'end') {
+                setNextProjectsCursor(message.next_cursor ?? null);
+            } else if (message.type === 'error') {
+                setNextProjectsCursor(message.next_cursor ?? null);
+                setErrorMessage(message.message || 'Failed to load some projects.');
+            }
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffer + decoder.decode());
     } catch (error) {
         setErrorMessage(`Error fetching projects: ${error.message}. Ensure backend is running and reachable.`);
-        setIsLoggedIn(false); 
-        setProjects([]);
+        if (isFirstPage) {
+            setIsLoggedIn(false); 
+            setProjects([]);
+        }
     } finally {
-        if (showLoading) setLoadingProjects(false);
+        if (showLoading && isFirstPage) setLoadingProjects(false);
+        if (!isFirstPage) setLoadingMoreProjects(false);
         setLoadingStatus(false); 
     }
   }, [navigate]); // navigate is a dependency of fetchUserProjects
@@ -497,6 +540,22 @@ const Integrations = ({ darkMode: initialDarkMode }) => {
                 { projects.length === 0 && !loadingProjects ? "No projects found with Admin permissions, or failed to load." : "No projects match the current filter."}
               </p>
             )}
+            {!loadingProjects && nextProjectsCursor && (
+              <div className="flex justify-center mt-6">
+                <button
+                  onClick={() => fetchUserProjects(false, nextProjectsCursor)}
+                  disabled={loadingMoreProjects}
+                  className={`flex items-center text-sm py-2 px-4 rounded-md font-medium transition duration-150 focus:outline-none focus:ring-2 focus:ring-offset-2 disabled:opacity-70 ${
+                    darkMode
+                    ? 'bg-gray-700 hover:bg-gray-600 text-gray-200 focus:ring-gray-500 focus:ring-offset-gray-800'
+                    : 'bg-gray-200 hover:bg-gray-300 text-gray-700 focus:ring-gray-400 focus:ring-offset-white'
+                  }`}
+                >
+                  {loadingMoreProjects && <Loader2 className="animate-spin h-4 w-4 mr-2" />}
+                  {loadingMoreProjects ? 'Loading more projects...' : 'Load more projects'}
+                </button>
+              </div>
+            )}
           </div>
         ) : view === 'projectDetails' && selectedProjectForDetails ? (
           <div className={`p-6 md:p-8 rounded-lg shadow-xl ${darkMode ? 'bg-gray-800' : 'bg-white'}`}>